@@ -2,15 +2,18 @@ from dotenv import load_dotenv
 load_dotenv()
 
 from flask import Flask, jsonify
-from flask_session import Session
 from flask_cors import CORS
-from flask_mail import Mail
+from werkzeug.middleware.proxy_fix import ProxyFix
 import os
 
 # Import du système de monitoring
 from helpers.monitoring import setup_logging, setup_error_handling, setup_request_monitoring, health_check, log_user_action
 from helpers.sentry_simple import init_sentry
-from helpers.core import initialize_db_pool
+from helpers.core import initialize_db_pool, setup_request_connection
+from helpers.sessions import setup_sessions
+from helpers.mail_outbox import setup_mail_outbox
+from helpers.smtp import PooledMail
+from helpers.metrics_export import metrics_response
 
 print("=== DÉMARRAGE DE L'APPLICATION ===")
 print(f"DATABASE_URL is {'set' if os.environ.get('DATABASE_URL') else 'NOT SET'}")
@@ -25,6 +28,15 @@ from quiz.routes import quiz_bp
 app = Flask(__name__)
 CORS(app)
 
+# Derrière le proxy de Render, remote_addr serait l'adresse du proxy pour tous les clients :
+# l'adresse du client (limitation de débit par IP, logs) et le schéma sont lus dans les
+# en-têtes X-Forwarded-* ajoutés par les TRUSTED_PROXY_HOPS derniers proxys.
+# Désactivé par défaut : sans proxy devant l'app, un client pourrait choisir son adresse.
+# À définir en production derrière un proxy (1 sur Render)
+TRUSTED_PROXY_HOPS = int(os.environ.get('TRUSTED_PROXY_HOPS', 0))
+if TRUSTED_PROXY_HOPS > 0:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_HOPS, x_proto=TRUSTED_PROXY_HOPS)
+
 # Configurer le monitoring dès que possible
 app_logger = setup_logging(app)
 app_logger.info("Application Flask initialisée")
@@ -38,7 +50,6 @@ app_logger.info("Configuration de la clé secrète terminée")
 
 # Configure session
 app.config["SESSION_PERMANENT"] = False
-app.config["SESSION_TYPE"] = "filesystem"
 app.config["ADMIN_USER_ID"] = os.environ.get('ADMIN_USER_ID')
 
 # Configure Flask-Mail
@@ -59,19 +70,27 @@ print(f"MAIL_USERNAME: {app.config['MAIL_USERNAME']}")
 print(f"MAIL_PASSWORD: {'***set***' if app.config['MAIL_PASSWORD'] else 'NOT SET'}")
 print(f"MAIL_DEFAULT_SENDER: {app.config['MAIL_DEFAULT_SENDER']}")
 
-Session(app)
-mail = Mail(app)
+# Stockage des sessions : cookie signé, Redis ou PostgreSQL (SESSION_BACKEND)
+setup_sessions(app)
+# Flask-Mail avec connexions SMTP réutilisées (MAIL_POOL_SIZE par worker)
+mail = PooledMail(app)
 
 # Make mail available to blueprints
 app.mail = mail
 
+# Envoi des emails en arrière-plan depuis la boîte d'envoi (MAIL_OUTBOX)
+setup_mail_outbox(app)
+
 # Initialiser le pool de connexions base de données
 try:
-    initialize_db_pool()
+    initialize_db_pool(app.config)
     app_logger.info("Pool de connexions base de données initialisé")
 except Exception as e:
     app_logger.error(f"Erreur lors de l'initialisation du pool DB: {e}", exc_info=True)
 
+# Une connexion du pool par requête HTTP, rendue à la fin de la requête
+setup_request_connection(app)
+
 # Configurer le monitoring des erreurs et requêtes
 setup_error_handling(app)
 setup_request_monitoring(app)
@@ -81,6 +100,11 @@ setup_request_monitoring(app)
 def health():
     return jsonify(health_check())
 
+# Métriques au format OpenMetrics, tous workers confondus (METRICS_MULTIPROC_DIR)
+@app.route('/metrics')
+def metrics_endpoint():
+    return metrics_response()
+
 # Register blueprints
 app.register_blueprint(admin_bp)
 app.register_blueprint(auth_bp)
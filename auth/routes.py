@@ -1,24 +1,23 @@
 from flask import Blueprint, render_template, request, session, redirect, url_for, flash, current_app
-from werkzeug.security import check_password_hash, generate_password_hash
-from helpers import login_required, apology, db_request, arg_is_present, generate_reset_token, send_reset_email, is_valid_email, log_user_action, log_security_event, capitalize_first_letter
+from helpers import login_required, apology, db_request, db_transaction, DatabaseError, arg_is_present, generate_reset_token, send_reset_email, is_valid_email, log_user_action, log_security_event, capitalize_first_letter, fetch_login_state, record_login_failure, record_login_success, store_password_hash, LoginState, hash_password, verify_password, needs_rehash, check_login_rate
 from helpers.sentry_simple import capture_user_context, capture_custom_event
 import re
 from urllib.parse import urlparse
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timedelta
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/auth')
 
-
 @auth_bp.route("/login", methods=["GET", "POST"]) # Route pour la connexion de l'utilisateur
 def login():
 
     """Log user in"""
 
-    # Forget any user_id
-    session.clear()
-
     # Soumission des infomations de connexion
     if request.method == "POST":
+        # Forget any user_id (seulement si une session existe : un visiteur anonyme n'en crée pas)
+        if session:
+            session.clear()
+
          # Get the next URL to redirect after login, if provided
         next_url = request.form.get("next") or request.args.get("next") or "/"
 
@@ -35,45 +34,40 @@ def login():
             return render_template("login.html", special_error_feedback=special_error_feedback, next=next_url,
             username=username), 403
 
-        # Ensure username exists and password is correct
-        rows = db_request("SELECT * FROM users WHERE username = %s", (username,))
-        if rows and rows[0][6] == True:
+        # Limitation de débit par IP et par nom d'utilisateur, avant toute requête en base
+        limited_by, retry_after = check_login_rate(request.remote_addr, username)
+        if limited_by:
+            log_security_event('login_rate_limited', {
+                'attempted_username': username,
+                'limited_by': limited_by,
+                'retry_after': retry_after
+            })
+            special_error_feedback = "Trop de tentatives de connexion, réessayez dans " + str(retry_after) + " seconde(s)"
+            return render_template("login.html", special_error_feedback=special_error_feedback, next=next_url,
+                                   username=username), 429, {'Retry-After': str(retry_after)}
+
+        # Compte et état de blocage en une requête (helpers/accounts.py)
+        account = fetch_login_state(username)
+        if account is not None and not isinstance(account, LoginState):
+            return account  # la requête a échoué : page d'erreur de db_request
+        if account and account.disabled == True:
             special_error_feedback = "Votre compte est désactivé"
             return render_template("login.html", special_error_feedback=special_error_feedback, next=next_url,
                                    username=username), 403
-        if not rows:
+        if not account:
             special_error_feedback = "Mot de passe ou nom d'utilisateur incorrect"
             return render_template("login.html", special_error_feedback=special_error_feedback, next=next_url, 
                                    username=username), 403
 
-        provided_username_id = rows[0][0] # id potentiel de l'utilisateur qui essaie de se connecter (suivant le nom fourni)
         # Vérifier si l'utilisateur a encore le droit d'essayer de se connecter
+        # (la durée du blocage est calculée par la base)
+        if account.ban_minutes_left is not None:
+            special_error_feedback = "Vous avez épuisé toutes vos tentatives de connexion, réessayez dans " + str(round(float(account.ban_minutes_left), 2)) + " minute(s)"
+            return render_template("login.html", special_error_feedback=special_error_feedback, next=next_url, 
+                                   username=username), 403
 
-        most_recent_fail, left_attempts, bans_number = db_request(
-            "SELECT last_fail, attempts_left, bans_number FROM login_attempts WHERE user_id = %s", 
-            (provided_username_id,), fetch=True)[0]
-        if most_recent_fail: #most_recent_fail est NULL jusqu'au tout premier échec de l'utilisateur depuis création du compte  
-            now = datetime.now(timezone.utc)
-            diff = now - most_recent_fail
-            # en minutes
-            minutes = diff.total_seconds() / 60
-            ban_duration = 5 # Première durée d'interdiction de connexion
-            if bans_number > 1:
-                for i in range(1, int(bans_number)):
-                    ban_duration = ban_duration * 2
-
-            #print(f"Différence en minutes : {now} - {most_recent_fail} = {minutes}")
-            if minutes > ban_duration and left_attempts == 0:
-                db_request("UPDATE login_attempts SET attempts_left = 5 WHERE user_id = %s", (provided_username_id,), fetch=False)     
-            elif minutes < ban_duration and left_attempts == 0:
-                    special_error_feedback = "Vous avez épuisé toutes vos tentatives de connexion, réessayez dans " + str(round((ban_duration - minutes), 2)) + " minute(s)"
-                    return render_template("login.html", special_error_feedback=special_error_feedback, next=next_url, 
-                                    username=username), 403
-
-        # Si l'utilisateur n'existe pas dans la base de données ou que le mot de passe est incorrect
-        if len(rows) != 1 or not check_password_hash(
-            rows[0][2], request.form.get("password")
-        ):
+        # Si le mot de passe est incorrect
+        if not verify_password(account.hash, request.form.get("password")):
             special_error_feedback = "Mot de passe ou nom d'utilisateur incorrect"
             
             # Log failed login attempt
@@ -89,24 +83,15 @@ def login():
                 extra={'attempted_username': username, 'ip': request.remote_addr}
             )
 
-            # Actualiser le nombre de tentatives de connexion infructueuses dans la base de données
-            results = db_request(
-                "UPDATE login_attempts SET attempts_left = attempts_left - 1 WHERE user_id = %s AND attempts_left > 0 RETURNING attempts_left",
-            (provided_username_id,), fetch=True)
-            if results:
-                # Si l'utilisateur a épuisé toutes ses tentatives
-                if results[0][0] == 0:
-                    special_error_feedback = "Vous avez épuisé toutes vos tentatives de connexion, réessayez plus tard"
-                    db_request("UPDATE login_attempts SET bans_number = bans_number + 1, last_fail = %s WHERE user_id = %s",
-                    (datetime.now(timezone.utc), provided_username_id,), fetch=False)
-                    return render_template("login.html", special_error_feedback=special_error_feedback, next=next_url, 
-                                    username=username), 403
+            # Décompter la tentative (et bloquer l'utilisateur à la dernière) en une requête
+            if record_login_failure(account.user_id) == 0:
+                special_error_feedback = "Vous avez épuisé toutes vos tentatives de connexion, réessayez plus tard"
         
             return render_template("login.html", special_error_feedback=special_error_feedback, next=next_url, 
                                    username=username), 403
 
         # Remember which user has logged in
-        session["user_id"] = rows[0][0]
+        session["user_id"] = account.user_id
         session["username"] = username  # Store username in session
         session.modified = True
         
@@ -118,14 +103,17 @@ def login():
         
         # Définir le contexte utilisateur pour Sentry
         capture_user_context(
-            user_id=rows[0][0],
+            user_id=account.user_id,
             username=username,
-            email=rows[0][3] if len(rows[0]) > 3 else None
+            email=account.email
         )
         
         # Remettre le nombre d'interdiction de connexions à zéro
-        db_request("UPDATE login_attempts SET bans_number = 0, attempts_left = 5 WHERE user_id = %s", 
-        (session.get("user_id"),), fetch=False)
+        record_login_success(account.user_id)
+
+        # Refaire le hachage si la méthode ou le coût configurés ont changé depuis
+        if needs_rehash(account.hash):
+            store_password_hash(account.user_id, hash_password(request.form.get("password")))
         # Vérifier s'il y a une url où rediriger l'utilisateur
         if next_url and next_url != "/":
                 # Si next_url est absolue, récupère juste le chemin
@@ -194,15 +182,20 @@ def register():
         # Enregistrer l'utilisateur dans la base de données
         else:
             email = email if email else None  # email est NULL s'il n'est pas fourni
-            db_request("INSERT INTO users (username, hash, email, authentication_token) VALUES (%s, %s, %s, %s)",
-                      (username, generate_password_hash(password), email,
-                       generate_reset_token()), fetch=False)
-            # Connecter l'utilisateur nouvellement créé
-            rows = db_request("SELECT id FROM users WHERE username = %s", (username,))
-            user_id = rows[0][0]
-            # Créer une nouvelle ligne pour le nouvel utilisateur dans la table des tentatives de connexion
-            db_request("INSERT INTO login_attempts (user_id) VALUES (%s)",
-                      (user_id,), fetch=False)
+            # Le compte et sa ligne de tentatives de connexion sont créés ensemble (ou pas du tout)
+            try:
+                with db_transaction():
+                    rows = db_request("INSERT INTO users (username, hash, email, authentication_token) VALUES (%s, %s, %s, %s) RETURNING id",
+                                      (username, hash_password(password), email,
+                                       generate_reset_token()))
+                    # Connecter l'utilisateur nouvellement créé
+                    user_id = rows[0][0]
+                    # Créer une nouvelle ligne pour le nouvel utilisateur dans la table des tentatives de connexion
+                    db_request("INSERT INTO login_attempts (user_id) VALUES (%s)",
+                              (user_id,), fetch=False)
+            except DatabaseError:
+                # Compte non créé (ex. même nom d'utilisateur enregistré entre-temps) : rien n'a été validé
+                return apology("L'inscription a échoué, veuillez réessayer.")
             # Log successful registration
             log_user_action('user_registered', {
                 'username': username,
@@ -220,7 +213,8 @@ def register():
 def logout():
 
     # Forget any user_id
-    session.clear()
+    if session:
+        session.clear()
 
     return render_template("index.html", message="Vous êtes déconnecté !")
 
@@ -295,11 +289,14 @@ def update_email():
         message = "Cette adresse email est déjà configurée sur votre compte"
         return redirect(url_for('main.profile', message=message))
 
-    # Mettre à jour l'email
-    db_request("UPDATE users SET email = %s WHERE id = %s", (email, user_id), fetch=False)
-    
-    # Supprimer les tokens de réinitialisation existants (sécurité)
-    db_request("DELETE FROM password_reset_tokens WHERE user_id = %s", (user_id,), fetch=False)
+    # Mettre à jour l'email et supprimer les tokens de réinitialisation existants (sécurité),
+    # ensemble ou pas du tout
+    try:
+        with db_transaction():
+            db_request("UPDATE users SET email = %s WHERE id = %s", (email, user_id), fetch=False)
+            db_request("DELETE FROM password_reset_tokens WHERE user_id = %s", (user_id,), fetch=False)
+    except DatabaseError:
+        return apology("La modification de l'adresse email a échoué, veuillez réessayer.")
 
     message = "Adresse email modifiée avec succès !"
     return redirect(url_for('main.profile', message=message))
@@ -332,11 +329,13 @@ def remove_email():
         message = "Aucune adresse email n'est configurée sur votre compte"
         return redirect(url_for('main.profile', message=message))
 
-    # Supprimer l'email (mettre à NULL)
-    db_request("UPDATE users SET email = NULL WHERE id = %s", (user_id,), fetch=False)
-    
-    # Supprimer tous les tokens de réinitialisation associés (sécurité)
-    db_request("DELETE FROM password_reset_tokens WHERE user_id = %s", (user_id,), fetch=False)
+    # Supprimer l'email (mettre à NULL) et tous les tokens de réinitialisation associés (sécurité)
+    try:
+        with db_transaction():
+            db_request("UPDATE users SET email = NULL WHERE id = %s", (user_id,), fetch=False)
+            db_request("DELETE FROM password_reset_tokens WHERE user_id = %s", (user_id,), fetch=False)
+    except DatabaseError:
+        return apology("La suppression de l'adresse email a échoué, veuillez réessayer.")
 
     message = "Adresse email supprimée avec succès. Vous ne pourrez plus récupérer votre mot de passe par email."
     return redirect(url_for('main.profile', message=message))
@@ -369,7 +368,7 @@ def delete_account():
     
     stored_password_hash = user_data[0][0]
     
-    if not check_password_hash(stored_password_hash, confirmation_password):
+    if not verify_password(stored_password_hash, confirmation_password):
         # Log de tentative de suppression avec mauvais mot de passe
         log_security_event('delete_account_failed', {
             'user_id': user_id,
@@ -437,15 +436,18 @@ def forgot_password():
         token = generate_reset_token()
         expires_at = datetime.now() + timedelta(hours=1)  # Expire dans 1 heure
         
-        # Supprimer tout token préexistant pour l'utilisateur 
-        db_request("DELETE FROM password_reset_tokens WHERE user_id = %s", (user_id,), fetch=False)
-
-        # Sauvegarder le token dans la base de données
-        db_request(
-            "INSERT INTO password_reset_tokens (user_id, token, expires_at) VALUES (%s, %s, %s)",
-            (user_id, token, expires_at),
-            fetch=False
-        )
+        # Remplacer tout token préexistant de l'utilisateur par le nouveau
+        try:
+            with db_transaction():
+                db_request("DELETE FROM password_reset_tokens WHERE user_id = %s", (user_id,), fetch=False)
+                db_request(
+                    "INSERT INTO password_reset_tokens (user_id, token, expires_at) VALUES (%s, %s, %s)",
+                    (user_id, token, expires_at),
+                    fetch=False
+                )
+        except DatabaseError:
+            special_error_feedback = "Erreur lors de la création du lien de réinitialisation. Veuillez réessayer plus tard."
+            return render_template("forgot_password.html", special_error_feedback=special_error_feedback), 500
         
         # Envoyer l'email
         if send_reset_email(user_email, username, token):
@@ -502,20 +504,27 @@ def reset_password(token):
             special_error_feedback = "Le mot de passe est trop long, il doit faire moins de 64 caractères"
             return render_template("reset_password.html", special_error_feedback=special_error_feedback, token=token, username=username), 400
         
-        # Mettre à jour le mot de passe
-        hashed_password = generate_password_hash(password)
-        db_request("UPDATE users SET hash = %s WHERE id = %s", (hashed_password, user_id), fetch=False)
-        
-        # Marquer le token comme utilisé
-        results = db_request("UPDATE password_reset_tokens SET used = TRUE WHERE id = %s AND used = FALSE RETURNING user_id;", 
-        (token_id,), fetch=True)
-        
+        # Hacher hors de la transaction pour ne pas garder la connexion pendant le calcul
+        hashed_password = hash_password(password)
+
+        # Consommer le token, mettre à jour le mot de passe et nettoyer les anciens tokens,
+        # ensemble ou pas du tout
+        try:
+            with db_transaction():
+                # Marquer le token comme utilisé
+                results = db_request("UPDATE password_reset_tokens SET used = TRUE WHERE id = %s AND used = FALSE RETURNING user_id;",
+                (token_id,), fetch=True)
+
+                if results:
+                    db_request("UPDATE users SET hash = %s WHERE id = %s", (hashed_password, user_id), fetch=False)
+                    db_request("DELETE FROM password_reset_tokens WHERE user_id = %s AND used = TRUE", (user_id,), fetch=False)
+        except DatabaseError:
+            special_error_feedback = "La réinitialisation du mot de passe a échoué, veuillez réessayer."
+            return render_template("reset_password.html", special_error_feedback=special_error_feedback, token=token, username=username), 500
+
         if not results: # L'update du token a échoué, c'est qu'il avait déjà été utilisé
             special_error_feedback = "Token déjà utilisé"
             return render_template("reset_password.html", special_error_feedback=special_error_feedback, token=token, username=username), 400
-
-        # Nettoyer les anciens tokens de cet utilisateur
-        db_request("DELETE FROM password_reset_tokens WHERE user_id = %s AND used = TRUE", (user_id,), fetch=False)
         
         success_message = "Votre mot de passe a été réinitialisé avec succès ! Vous pouvez maintenant vous connecter."
         return render_template("login.html", message=success_message)
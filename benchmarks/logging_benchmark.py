@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Test de charge : coût des logs JSON de production par requête
+Usage: python benchmarks/logging_benchmark.py --requests 5000 --threads 8 --logs-per-request 3
+
+Application minimale (une route qui écrit --logs-per-request logs INFO) avec le monitoring
+des requêtes, servie par --threads threads en parallèle, dans trois configurations :
+
+- sans logs (niveau WARNING, rien n'est formaté ni écrit) ;
+- écriture directe : JSON formaté et écrit dans logs/app.log par le thread de la requête ;
+- file (LOG_ASYNC=1) : le thread de la requête met le log en file, un thread dédié l'écrit.
+
+Affiche la latence moyenne, p50 et p99 par requête et, pour la file, les logs abandonnés.
+--sync-write ajoute un fsync() après chaque écriture pour simuler un disque lent.
+"""
+import os
+import sys
+import time
+import argparse
+import logging
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+
+from helpers.monitoring import (
+    Histogram, RotatingLogFileHandler, TimedRotatingLogFileHandler, logging_status, setup_logging,
+    setup_request_monitoring, stop_logging
+)
+
+
+def slow_disk():
+    """fsync() après chaque log, comme sur un disque réseau ou saturé"""
+    for cls in (RotatingLogFileHandler, TimedRotatingLogFileHandler):
+        original = cls.emit
+
+        def emit(self, record, original=original):
+            original(self, record)
+            if self.stream is not None:
+                os.fsync(self.stream.fileno())
+        cls.emit = emit
+
+
+def make_app(root, mode, logs_per_request):
+    app = Flask(__name__, root_path=root)
+    app.secret_key = 'benchmark'
+    setup_logging(app, queued=(mode == 'file'))
+    if mode == 'sans logs':
+        logging.getLogger().setLevel(logging.WARNING)
+        logging.getLogger('law_quiz_app').setLevel(logging.WARNING)
+    logger = logging.getLogger('law_quiz_app.benchmark')
+
+    @app.route('/')
+    def index():
+        for i in range(logs_per_request):
+            logger.info("Quiz %d affiché", i)
+        return 'ok'
+
+    setup_request_monitoring(app)
+    return app
+
+
+def bench(app, requests, threads):
+    latencies = Histogram()
+    lock = threading.Lock()
+    per_thread = requests // threads
+
+    def work():
+        client = app.test_client()
+        local = Histogram()
+        for _ in range(per_thread):
+            start = time.perf_counter()
+            client.get('/')
+            local.observe(time.perf_counter() - start)
+        with lock:
+            latencies.merge(local)
+
+    app.test_client().get('/')  # échauffement
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return latencies, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Coût des logs JSON de production par requête')
+    parser.add_argument('--requests', type=int, default=5000, help='Nombre de requêtes')
+    parser.add_argument('--threads', type=int, default=8, help='Requêtes servies en parallèle')
+    parser.add_argument('--logs-per-request', type=int, default=3, help='Logs INFO écrits par requête')
+    parser.add_argument('--sync-write', action='store_true', help='fsync() après chaque log (disque lent)')
+    args = parser.parse_args()
+
+    if args.sync_write:
+        slow_disk()
+
+    print(f"{args.requests} requêtes, {args.threads} threads, {args.logs_per_request} logs/requête")
+    for mode in ('sans logs', 'écriture directe', 'file'):
+        with tempfile.TemporaryDirectory() as root:
+            app = make_app(root, mode, args.logs_per_request)
+            latencies, elapsed = bench(app, args.requests, args.threads)
+            status = logging_status()
+            stop_logging()
+            summary = latencies.summary()
+            line = (f"  {mode:17s} {summary['mean'] * 1e6:7.0f} µs/requête  p50 {summary['p50'] * 1e6:7.0f} µs"
+                    f"  p99 {summary['p99'] * 1e6:7.0f} µs  {latencies.count / elapsed:7.0f} requêtes/s")
+            if status is not None:
+                line += f"  abandonnés {sum(status['dropped'].values())}"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
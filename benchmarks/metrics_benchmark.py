@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Test de charge : coût des métriques de requête
+Usage: python benchmarks/metrics_benchmark.py --requests 20000 --observations 1000000
+
+1. Coût de metrics.timer() et mémoire occupée après --observations durées, pour le
+   collecteur à histogrammes (helpers.monitoring) et pour l'ancien collecteur qui gardait
+   chaque durée dans une liste (reproduit ici comme référence).
+2. Surcoût par requête des hooks before_request/after_request de setup_request_monitoring,
+   mesuré sur une application minimale (une route qui renvoie une chaîne) avec et sans
+   monitoring.
+"""
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+
+from helpers.monitoring import MetricsCollector, setup_request_monitoring
+
+
+class ListMetricsCollector:
+    """Ancien collecteur : une liste de durées par timer, sans verrou"""
+
+    def __init__(self):
+        self.metrics = {}
+
+    def timer(self, metric_name, duration, tags=None):
+        key = f"{metric_name}_duration:{tags or ''}"
+        if key not in self.metrics:
+            self.metrics[key] = []
+        self.metrics[key].append(duration)
+
+
+def bench_timer(collector, observations):
+    durations = [0.001 + (i % 997) / 10000 for i in range(observations)]
+    start = time.perf_counter()
+    for duration in durations:
+        collector.timer('request', duration)
+    elapsed = time.perf_counter() - start
+
+    # Mémoire mesurée sur un second collecteur (tracemalloc ralentit les appels)
+    collector = type(collector)()
+    tracemalloc.start()
+    for duration in durations:
+        collector.timer('request', duration)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return elapsed * 1e9 / observations, memory
+
+
+def make_app(monitored):
+    app = Flask(__name__)
+    app.secret_key = 'benchmark'
+
+    @app.route('/')
+    def index():
+        return 'ok'
+
+    if monitored:
+        setup_request_monitoring(app)
+    return app
+
+
+def bench_requests(app, requests):
+    client = app.test_client()
+    for _ in range(200):  # échauffement
+        client.get('/')
+    start = time.perf_counter()
+    for _ in range(requests):
+        client.get('/')
+    return (time.perf_counter() - start) * 1e6 / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Coût des métriques de requête')
+    parser.add_argument('--requests', type=int, default=20000, help='Nombre de requêtes')
+    parser.add_argument('--observations', type=int, default=1000000, help='Durées enregistrées par collecteur')
+    args = parser.parse_args()
+
+    print(f"metrics.timer() x {args.observations}")
+    for label, collector in (('liste (ancien)', ListMetricsCollector()), ('histogramme', MetricsCollector())):
+        per_call, memory = bench_timer(collector, args.observations)
+        print(f"  {label:15s} {per_call:7.0f} ns/appel  {memory / 1024:10.0f} Kio")
+
+    bare = bench_requests(make_app(False), args.requests)
+    monitored = bench_requests(make_app(True), args.requests)
+    print(f"Requêtes ({args.requests})")
+    print(f"  sans monitoring {bare:7.1f} µs/requête")
+    print(f"  avec monitoring {monitored:7.1f} µs/requête  (surcoût {monitored - bare:.1f} µs)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Benchmark du hachage des mots de passe : connexions par seconde, au total et par cœur
+Usage: python benchmarks/password_benchmark.py --method scrypt --logins 200 --concurrency 8
+
+Chaque connexion est une vérification de mot de passe (check_password_hash), la part
+coûteuse de /auth/login. Les vérifications sont lancées par --concurrency threads, comme
+des requêtes simultanées, d'abord dans le thread appelant (PASSWORD_HASH_WORKERS=0) puis
+avec des pools de 1 à N processus (N = nombre de cœurs).
+"""
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from helpers.passwords import PasswordHasher
+
+
+def measure(hasher, password_hash, logins, concurrency):
+    """Renvoie le nombre de vérifications par seconde"""
+    hasher.verify(password_hash, 'Secret123!')  # démarrage du pool hors mesure
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as threads:
+        results = list(threads.map(lambda _: hasher.verify(password_hash, 'Secret123!'), range(logins)))
+    elapsed = time.perf_counter() - start
+    assert all(results)
+    return logins / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark du hachage des mots de passe')
+    parser.add_argument('--method', default='scrypt', help='Méthode werkzeug (ex. scrypt, pbkdf2:sha256:600000)')
+    parser.add_argument('--logins', type=int, default=200, help='Vérifications par configuration')
+    parser.add_argument('--concurrency', type=int, default=8, help='Requêtes simultanées')
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    print(f"méthode {args.method}, {cores} cœur(s), {args.concurrency} requêtes simultanées")
+    print(f"{'processus':>9} | {'connexions/s':>12} | {'par cœur':>9}")
+    for workers in [0] + list(range(1, cores + 1)):
+        hasher = PasswordHasher(method=args.method, workers=workers, max_pending=args.concurrency, timeout=60)
+        password_hash = hasher.hash('Secret123!')
+        try:
+            rate = measure(hasher, password_hash, args.logins, args.concurrency)
+        finally:
+            hasher.shutdown()
+        used = max(workers, 1)
+        label = 'aucun' if workers == 0 else str(workers)
+        print(f"{label:>9} | {rate:>12.1f} | {rate / used:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Benchmark des requêtes les plus fréquentes : exécution simple contre requête préparée
+Usage: DATABASE_URL=postgresql://... python benchmarks/prepared_benchmark.py --quizzes 5000 --calls 2000
+
+Le script crée dans un schéma temporaire (supprimé à la fin) des tables reprenant les
+colonnes utilisées par les requêtes préparées de quiz/routes.py et helpers/accounts.py, puis
+mesure la latence médiane et p95 de chaque requête exécutée directement (analyse et
+planification à chaque appel) et via PREPARE/EXECUTE.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+
+import psycopg2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from helpers.core import PreparedStatement
+from helpers.accounts import LOGIN_STATE
+
+SCHEMA = "bench_prepared"
+
+# Mêmes requêtes que les déclarations prepared_statement() de l'application
+REQUETES = {
+    "quiz_id_by_title": ("SELECT quiz_id FROM quiz_infos WHERE titre = %s AND user_id = %s",
+                         lambda n: (f"Quiz {random.randint(1, n)}", random.randint(1, 100))),
+    "quiz_questions": ("""SELECT qi.content_version, qq.réponse, qq.question, qq.explication
+        FROM quiz_questions qq
+        JOIN quiz_infos qi ON qq.quiz_id = qi.quiz_id
+        WHERE qq.quiz_id = %s ORDER BY qq.id""",
+                       lambda n: (random.randint(1, n),)),
+    "login_state": (str(LOGIN_STATE), lambda n: (f"User{random.randint(1, 100)}",)),
+}
+
+
+def setup_schema(cursor, quizzes):
+    """Crée et remplit des tables réduites aux colonnes utilisées par les requêtes mesurées"""
+    cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cursor.execute(f"CREATE SCHEMA {SCHEMA}")
+    cursor.execute(f"SET search_path TO {SCHEMA}")
+    cursor.execute("""CREATE TABLE users (id SERIAL PRIMARY KEY, username TEXT UNIQUE, hash TEXT,
+                      email TEXT, authentication_token TEXT, disabled BOOLEAN DEFAULT FALSE)""")
+    cursor.execute("""CREATE TABLE login_attempts (user_id INTEGER PRIMARY KEY, last_fail TIMESTAMPTZ,
+                      attempts_left INTEGER DEFAULT 5, bans_number INTEGER DEFAULT 0)""")
+    cursor.execute("""CREATE TABLE quiz_infos (quiz_id SERIAL PRIMARY KEY, titre TEXT, user_id INTEGER,
+                      content_version INTEGER DEFAULT 1, UNIQUE (titre, user_id))""")
+    cursor.execute("""CREATE TABLE quiz_questions (id SERIAL PRIMARY KEY, quiz_id INTEGER,
+                      question TEXT, réponse TEXT, explication TEXT)""")
+    cursor.execute("CREATE INDEX ON quiz_questions (quiz_id)")
+    cursor.executemany("INSERT INTO users (username, hash) VALUES (%s, 'x')",
+                       [(f"User{i}",) for i in range(1, 101)])
+    cursor.execute("INSERT INTO login_attempts (user_id) SELECT id FROM users")
+    cursor.executemany("INSERT INTO quiz_infos (titre, user_id) VALUES (%s, %s)",
+                       [(f"Quiz {i}", random.randint(1, 100)) for i in range(1, quizzes + 1)])
+    cursor.execute("""INSERT INTO quiz_questions (quiz_id, question, réponse, explication)
+                      SELECT q, 'Question ' || i, 'Vrai', 'Explication' FROM generate_series(1, %s) q,
+                      generate_series(1, 10) i""", (quizzes,))
+    cursor.execute("ANALYZE")
+
+
+def measure(cursor, run, params, calls, quizzes):
+    """Renvoie les durées (ms) de chaque exécution"""
+    durations = []
+    for _ in range(calls):
+        args = params(quizzes)
+        start = time.perf_counter()
+        run(args)
+        cursor.fetchall()
+        durations.append((time.perf_counter() - start) * 1000)
+    return sorted(durations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark des requêtes préparées')
+    parser.add_argument('--quizzes', type=int, default=5000, help='Nombre de quiz générés')
+    parser.add_argument('--calls', type=int, default=2000, help='Exécutions par requête et par mode')
+    args = parser.parse_args()
+
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        sys.exit("DATABASE_URL doit pointer vers une base PostgreSQL de test")
+
+    conn = psycopg2.connect(database_url)
+    conn.autocommit = True
+    cursor = conn.cursor()
+    try:
+        setup_schema(cursor, args.quizzes)
+        print(f"{'requête':<18} | {'mode':<8} | {'médiane (ms)':>12} | {'p95 (ms)':>9}")
+        for name, (text, params) in REQUETES.items():
+            statement = PreparedStatement(f"bench_{name}", text)
+            cursor.execute(statement.prepare_text)
+            modes = (
+                ("simple", lambda values: cursor.execute(text, values)),
+                ("préparée", lambda values: cursor.execute(statement.execute_text, values)),
+            )
+            for mode, run in modes:
+                durations = measure(cursor, run, params, args.calls, args.quizzes)
+                p95 = durations[int(len(durations) * 0.95) - 1]
+                print(f"{name:<18} | {mode:<8} | {statistics.median(durations):>12.3f} | {p95:>9.3f}")
+    finally:
+        cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
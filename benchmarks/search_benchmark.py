@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la recherche de quiz : ILIKE '%terme%' contre recherche plein texte
+Usage: DATABASE_URL=postgresql://... python benchmarks/search_benchmark.py --sizes 1000 10000 100000
+
+Le script travaille dans un schéma temporaire (supprimé à la fin) et mesure, pour chaque
+taille de corpus, la latence médiane et p95 des deux stratégies de recherche.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+
+import psycopg2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from helpers.search import build_tsquery
+
+SCHEMA = "bench_search"
+
+MOTS = ["contrat", "responsabilité", "société", "propriété", "obligation", "preuve",
+        "mariage", "succession", "bail", "vente", "travail", "licenciement", "pénal",
+        "infraction", "procédure", "recours", "administratif", "constitution", "impôt",
+        "concurrence", "consommateur", "assurance", "transport", "données", "brevet"]
+MATIERES = ["Droit Civil", "Droit Pénal", "Droit Administratif", "Droit des Sociétés",
+            "Droit Fiscal", "Droit du Travail", "Droit Constitutionnel", "Procédure Civile"]
+NIVEAUX = ["L1", "L2", "L3", "M1", "M2"]
+RECHERCHES = ["civil", "contrat", "penal", "M1", "responsabilite", "travail licenciement"]
+
+
+def setup_schema(cursor):
+    """Crée un catalogue isolé avec la même colonne de recherche que la migration 003"""
+    cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cursor.execute(f"CREATE SCHEMA {SCHEMA}")
+    cursor.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+    cursor.execute(f"CREATE TEXT SEARCH CONFIGURATION {SCHEMA}.french_unaccent (COPY = french)")
+    cursor.execute(f"""ALTER TEXT SEARCH CONFIGURATION {SCHEMA}.french_unaccent
+                       ALTER MAPPING FOR hword, hword_part, word WITH unaccent, french_stem""")
+    cursor.execute(f"""
+        CREATE TABLE {SCHEMA}.quiz_catalog (
+            quiz_id INTEGER PRIMARY KEY,
+            titre TEXT, username TEXT, matiere TEXT, niveau TEXT,
+            type TEXT, likes INTEGER, question_count INTEGER,
+            search_vector tsvector GENERATED ALWAYS AS (
+                setweight(to_tsvector('{SCHEMA}.french_unaccent', coalesce(titre, '')), 'A') ||
+                setweight(to_tsvector('{SCHEMA}.french_unaccent', coalesce(username, '')), 'B') ||
+                setweight(to_tsvector('{SCHEMA}.french_unaccent', coalesce(matiere, '')), 'B') ||
+                setweight(to_tsvector('{SCHEMA}.french_unaccent', coalesce(niveau, '')), 'C')
+            ) STORED
+        )""")
+    cursor.execute(f"CREATE INDEX ON {SCHEMA}.quiz_catalog USING GIN (search_vector)")
+
+
+def load_corpus(cursor, size):
+    """Remplit le catalogue avec des quiz synthétiques"""
+    cursor.execute(f"TRUNCATE {SCHEMA}.quiz_catalog")
+    rows = [(i, " ".join(random.sample(MOTS, 3)).capitalize(), f"Auteur{i % 500}",
+             random.choice(MATIERES), random.choice(NIVEAUX), "public",
+             random.randint(0, 200), random.randint(4, 40)) for i in range(1, size + 1)]
+    cursor.executemany(f"""INSERT INTO {SCHEMA}.quiz_catalog
+        (quiz_id, titre, username, matiere, niveau, type, likes, question_count)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)""", rows)
+    cursor.execute(f"ANALYZE {SCHEMA}.quiz_catalog")
+
+
+def run_ilike(cursor, text):
+    param = f"%{text}%"
+    cursor.execute(f"""SELECT titre, likes, quiz_id FROM {SCHEMA}.quiz_catalog
+        WHERE type = 'public' AND question_count > 3
+        AND (titre ILIKE %s OR username ILIKE %s OR matiere ILIKE %s OR niveau ILIKE %s)
+        ORDER BY likes DESC LIMIT 11""", (param, param, param, param))
+    cursor.fetchall()
+    cursor.execute(f"""SELECT COUNT(*) FROM {SCHEMA}.quiz_catalog
+        WHERE type = 'public' AND question_count > 3
+        AND (titre ILIKE %s OR username ILIKE %s OR matiere ILIKE %s OR niveau ILIKE %s)""",
+        (param, param, param, param))
+    cursor.fetchall()
+
+
+def run_fulltext(cursor, text):
+    cursor.execute(f"""
+        WITH matches AS (
+            SELECT titre, likes, quiz_id, ts_rank(search_vector, query) AS rank
+            FROM {SCHEMA}.quiz_catalog, to_tsquery('{SCHEMA}.french_unaccent', %s) AS query
+            WHERE type = 'public' AND question_count > 3 AND search_vector @@ query
+        )
+        SELECT titre, likes, quiz_id, rank, (SELECT COUNT(*) FROM matches)
+        FROM matches ORDER BY rank DESC, likes DESC, quiz_id DESC LIMIT 11""",
+        (build_tsquery(text),))
+    cursor.fetchall()
+
+
+def measure(cursor, strategy, repeats):
+    """Renvoie les durées (ms) de toutes les recherches"""
+    durations = []
+    for _ in range(repeats):
+        for text in RECHERCHES:
+            start = time.perf_counter()
+            strategy(cursor, text)
+            durations.append((time.perf_counter() - start) * 1000)
+    return durations
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de la recherche de quiz')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help='Tailles de corpus à mesurer')
+    parser.add_argument('--repeats', type=int, default=20,
+                        help='Nombre de passages sur la liste de recherches')
+    args = parser.parse_args()
+
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        sys.exit("DATABASE_URL doit pointer vers une base PostgreSQL de test")
+
+    conn = psycopg2.connect(database_url)
+    conn.autocommit = True
+    cursor = conn.cursor()
+    try:
+        setup_schema(cursor)
+        print(f"{'corpus':>8} | {'stratégie':<10} | {'médiane (ms)':>12} | {'p95 (ms)':>9}")
+        for size in args.sizes:
+            load_corpus(cursor, size)
+            for name, strategy in (("ilike", run_ilike), ("plein_texte", run_fulltext)):
+                durations = sorted(measure(cursor, strategy, args.repeats))
+                p95 = durations[int(len(durations) * 0.95) - 1]
+                print(f"{size:>8} | {name:<10} | {statistics.median(durations):>12.2f} | {p95:>9.2f}")
+    finally:
+        cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Benchmark du coût des sessions par requête, pour chaque stockage
+Usage: python benchmarks/session_benchmark.py --requests 2000 [--redis redis://...] [--postgres]
+
+Une application minimale sert deux routes : l'une lit la session (cas le plus courant),
+l'autre la modifie. Le surcoût est mesuré par rapport à la même application sans session
+(Flask ouvre la session à chaque requête, même si la route ne s'en sert pas). Stockages mesurés : cookie signé, Redis simulé en mémoire, Redis réel (--redis),
+PostgreSQL (--postgres, DATABASE_URL et migrations/007_sessions.sql appliquée) et l'ancien
+stockage filesystem de Flask-Session.
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+
+from flask import Flask, session
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from helpers.cache import InMemoryStore
+from helpers.sessions import StoreSessionInterface, RedisSessionStore, PostgresSessionStore
+from flask.sessions import SecureCookieSessionInterface, SessionInterface
+
+
+class NoSessionInterface(SessionInterface):
+    """Référence : aucune session n'est lue ni écrite"""
+
+    def open_session(self, app, request):
+        return self.make_null_session(app)
+
+    def save_session(self, app, session, response):
+        pass
+
+
+def build_app(configure):
+    app = Flask(__name__)
+    app.secret_key = 'benchmark'
+    configure(app)
+
+    @app.route('/read')
+    def read():
+        return str(session.get('user_id'))
+
+    @app.route('/write')
+    def write():
+        session['visits'] = session.get('visits', 0) + 1
+        return 'ok'
+
+    return app
+
+
+def measure(client, path, requests):
+    """Durée médiane (ms) d'une requête"""
+    durations = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        client.get(path)
+        durations.append((time.perf_counter() - start) * 1000)
+    return statistics.median(durations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark des stockages de session')
+    parser.add_argument('--requests', type=int, default=2000, help='Requêtes par route et par stockage')
+    parser.add_argument('--redis', help='URL d\'un Redis réel à mesurer en plus du Redis simulé')
+    parser.add_argument('--postgres', action='store_true', help='Mesurer aussi PostgreSQL (DATABASE_URL)')
+    args = parser.parse_args()
+
+    session_dir = tempfile.mkdtemp(prefix='bench_sessions_')
+
+    def filesystem(app):
+        from flask_session import Session
+        app.config.update(SESSION_TYPE='filesystem', SESSION_FILE_DIR=session_dir, SESSION_PERMANENT=False)
+        Session(app)
+
+    backends = {
+        'cookie': lambda app: setattr(app, 'session_interface', SecureCookieSessionInterface()),
+        'redis (mémoire)': lambda app: setattr(
+            app, 'session_interface', StoreSessionInterface(RedisSessionStore(InMemoryStore()))),
+        'filesystem': filesystem,
+    }
+    if args.redis:
+        import redis
+        client = redis.Redis.from_url(args.redis)
+        backends['redis'] = lambda app: setattr(
+            app, 'session_interface', StoreSessionInterface(RedisSessionStore(client, prefix='bench_session:')))
+    if args.postgres:
+        backends['postgres'] = lambda app: setattr(
+            app, 'session_interface', StoreSessionInterface(PostgresSessionStore()))
+
+    with build_app(lambda app: setattr(app, 'session_interface', NoSessionInterface())).test_client() as client:
+        baseline = measure(client, '/read', args.requests)
+    print(f"sans session : {baseline:.3f} ms par requête")
+    print(f"{'stockage':<16} | {'lecture (ms)':>12} | {'écriture (ms)':>13} | {'surcoût lecture':>15} | {'surcoût écriture':>16}")
+    try:
+        for name, configure in backends.items():
+            app = build_app(configure)
+            with app.test_client() as client:
+                client.get('/write')  # session existante pour les lectures
+                read = measure(client, '/read', args.requests)
+                write = measure(client, '/write', args.requests)
+            print(f"{name:<16} | {read:>12.3f} | {write:>13.3f} | {read - baseline:>15.3f} | {write - baseline:>16.3f}")
+    finally:
+        shutil.rmtree(session_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Test de charge : écritures de session pour 1000 requêtes
+Usage: python benchmarks/session_writes.py --requests 1000 --backend cookie
+
+Rejoue sur l'application un mélange de requêtes de lecture (page d'accueil, à propos,
+page de connexion, inscription), pour moitié anonymes et pour moitié avec une session
+connectée, et compte les réponses qui écrivent la session (en-tête Set-Cookie du cookie de
+session : toute écriture côté serveur s'accompagne de ce cookie). Aucune de ces requêtes
+ne modifie la session : le résultat attendu est 0.
+"""
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+
+PAGES = ['/', '/about', '/auth/login', '/auth/register']
+
+
+def count_writes(app, requests):
+    cookie_name = app.config['SESSION_COOKIE_NAME']
+    anonymous = app.test_client()
+    connected = app.test_client()
+    with connected.session_transaction() as sess:
+        sess['user_id'] = 1
+        sess['username'] = 'Benchmark'
+
+    writes = 0
+    for i in range(requests):
+        client = connected if i % 2 else anonymous
+        response = client.get(PAGES[(i // 2) % len(PAGES)])
+        writes += sum(1 for header in response.headers.getlist('Set-Cookie') if header.startswith(cookie_name + '='))
+    return writes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Écritures de session par requête de lecture')
+    parser.add_argument('--requests', type=int, default=1000, help='Nombre de requêtes')
+    parser.add_argument('--backend', default='cookie', choices=['cookie', 'redis', 'filesystem'],
+                        help='Stockage des sessions (redis : REDIS_URL, ou memory:// par défaut)')
+    args = parser.parse_args()
+
+    os.environ.setdefault('REDIS_URL', 'memory://')
+    os.environ['SESSION_BACKEND'] = args.backend
+    session_dir = tempfile.mkdtemp(prefix='bench_sessions_')
+    try:
+        from app import app
+        if args.backend == 'filesystem':
+            from flask_session import Session
+            app.config['SESSION_FILE_DIR'] = session_dir
+            Session(app)
+        writes = count_writes(app, args.requests)
+    finally:
+        shutil.rmtree(session_dir, ignore_errors=True)
+
+    print(f"{args.backend} : {writes} écriture(s) de session pour {args.requests} requêtes "
+          f"({writes * 1000 / args.requests:.1f} pour 1000)")
+
+
+if __name__ == "__main__":
+    main()
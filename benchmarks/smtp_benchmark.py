@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Test de charge : envoi d'emails par Flask-Mail, une connexion par email ou connexions du pool
+Usage: python benchmarks/smtp_benchmark.py --messages 200 --rtt 20
+
+Lance un serveur SMTP local (aiosmtpd) et envoie les mêmes messages avec flask_mail.Mail
+(connexion, EHLO, QUIT pour chaque email) puis avec PooledMail (helpers/smtp.py). --rtt
+simule la latence réseau d'un serveur distant : chaque commande SMTP attend --rtt
+millisecondes avant sa réponse. Sans TLS ni AUTH ici : avec un vrai fournisseur (STARTTLS,
+second EHLO, AUTH), chaque connexion évitée économise encore plusieurs allers-retours.
+"""
+import os
+import sys
+import time
+import socket
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiosmtpd.controller import Controller
+from flask import Flask
+from flask_mail import Mail, Message
+
+from helpers.smtp import PooledMail
+
+
+class LatencyHandler:
+    """Serveur SMTP de test : accepte tout, après --rtt ms pour chaque commande"""
+
+    def __init__(self, rtt):
+        self.rtt = rtt
+        self.connections = 0
+        self.messages = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.connections += 1
+        session.host_name = hostname
+        await asyncio.sleep(self.rtt)
+        return responses
+
+    async def handle_MAIL(self, server, session, envelope, address, mail_options):
+        await asyncio.sleep(self.rtt)
+        envelope.mail_from = address
+        return '250 OK'
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        await asyncio.sleep(self.rtt)
+        envelope.rcpt_tos.append(address)
+        return '250 OK'
+
+    async def handle_DATA(self, server, session, envelope):
+        await asyncio.sleep(self.rtt)
+        self.messages += 1
+        return '250 Message accepted for delivery'
+
+    async def handle_QUIT(self, server, session, envelope):
+        await asyncio.sleep(self.rtt)
+        return '221 Bye'
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def run(mail_class, port, handler, messages):
+    app = Flask(__name__)
+    app.config.update(MAIL_SERVER='127.0.0.1', MAIL_PORT=port, MAIL_USE_TLS=False,
+                      MAIL_DEFAULT_SENDER='noreply@lawandcode.fr')
+    mail = mail_class(app)
+    handler.connections = handler.messages = 0
+
+    with app.app_context():
+        start = time.perf_counter()
+        for i in range(messages):
+            mail.send(Message(subject='Réinitialisation de votre mot de passe - Law Quiz',
+                              recipients=[f'user{i}@example.com'], body='Lien de réinitialisation'))
+        duration = time.perf_counter() - start
+    pool = getattr(app.extensions['mail'], 'pool', None)
+    if pool is not None:
+        pool.close()
+    return duration, handler.connections
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Envoi d'emails avec et sans réutilisation des connexions SMTP")
+    parser.add_argument('--messages', type=int, default=200, help="Nombre d'emails")
+    parser.add_argument('--rtt', type=float, default=0, help='Latence simulée par commande SMTP (ms)')
+    args = parser.parse_args()
+
+    handler = LatencyHandler(args.rtt / 1000)
+    controller = Controller(handler, hostname='127.0.0.1', port=free_port())
+    controller.start()
+    try:
+        results = [
+            ('une connexion par email (flask_mail.Mail)', run(Mail, controller.port, handler, args.messages)),
+            ('connexions du pool (PooledMail)', run(PooledMail, controller.port, handler, args.messages)),
+        ]
+    finally:
+        controller.stop()
+
+    print(f"{args.messages} emails, latence simulée {args.rtt:g} ms par commande")
+    for label, (duration, connections) in results:
+        print(f"  {label:45s} {duration:7.2f}s  {args.messages / duration:8.1f} emails/s  "
+              f"{duration * 1000 / args.messages:6.2f} ms/email  {connections} connexion(s)")
+
+
+if __name__ == "__main__":
+    main()
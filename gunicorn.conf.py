@@ -0,0 +1,37 @@
+"""
+Configuration gunicorn, chargée automatiquement depuis le répertoire de lancement.
+
+Les options de la ligne de commande (Dockerfile, Procfile) restent prioritaires.
+"""
+
+
+def on_starting(server):
+    """Repartir de métriques vides à chaque démarrage (METRICS_MULTIPROC_DIR)"""
+    from helpers.metrics_export import clear_multiproc_dir
+    clear_multiproc_dir()
+
+
+def post_worker_init(worker):
+    """Recopier périodiquement les métriques du worker pour /metrics"""
+    from helpers.metrics_export import start_metrics_flusher
+    start_metrics_flusher()
+
+
+def child_exit(server, worker):
+    """Retirer les jauges d'un worker terminé (ses compteurs restent comptés)"""
+    from helpers.metrics_export import mark_process_dead
+    mark_process_dead(worker.pid)
+
+
+def worker_exit(server, worker):
+    """Écrire les résultats de quiz encore en file, terminer le lot d'emails en cours, arrêter les processus de hachage, écrire les dernières métriques et les logs encore en file avant la fin du worker"""
+    from helpers.stats_queue import drain_stats_queue
+    from helpers.mail_outbox import drain_mail_outbox
+    from helpers.passwords import password_hasher
+    from helpers.metrics_export import stop_metrics_flusher
+    from helpers.monitoring import stop_logging
+    drain_stats_queue()
+    drain_mail_outbox()
+    password_hasher.shutdown()
+    stop_metrics_flusher()
+    stop_logging()
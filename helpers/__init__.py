@@ -7,6 +7,9 @@ from .core import (
     get_connection,
     arg_is_present,
     db_request,
+    db_transaction,
+    DatabaseError,
+    prepared_statement,
     generate_reset_token,
     send_reset_email,
     is_valid_email
@@ -18,3 +21,55 @@ from .monitoring import (
     log_performance,
     metrics
 )
+
+from .catalog import (
+    refresh_quiz_catalog,
+    fetch_catalog_page,
+    fetch_public_page,
+    PUBLIC_LISTING,
+    encode_cursor,
+    decode_cursor,
+    PAGE_SIZE
+)
+
+from .search import (
+    search_catalog,
+    build_tsquery
+)
+
+from .cache import (
+    quiz_questions_cache,
+    invalidate_quiz_questions,
+    cache_status
+)
+
+from .stats_queue import (
+    stats_write_behind,
+    drain_stats_queue
+)
+
+from .likes import (
+    record_like,
+    roll_up_likes,
+    reconcile_likes
+)
+
+from .accounts import (
+    LoginState,
+    fetch_login_state,
+    record_login_failure,
+    record_login_success,
+    store_password_hash
+)
+
+from .passwords import (
+    password_hasher,
+    hash_password,
+    verify_password,
+    needs_rehash
+)
+
+from .ratelimit import (
+    check_login_rate,
+    login_rate_status
+)
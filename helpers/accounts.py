@@ -0,0 +1,90 @@
+"""
+Accès aux données de connexion (auth.login).
+
+La connexion lisait tout le compte (SELECT * indexé par position), puis les tentatives de
+connexion, calculait la durée de blocage en Python et enchaînait jusqu'à trois UPDATE.
+Ici :
+- fetch_login_state() lit le compte et l'état de blocage en une jointure, colonnes nommées ;
+- la durée de blocage est calculée par la base : 5 minutes, doublées à chaque
+  bannissement au-delà du premier ;
+- record_login_failure() et record_login_success() enregistrent l'issue en une requête,
+  conditions comprises : deux tentatives simultanées ne peuvent pas décompter la même.
+"""
+from collections import namedtuple
+
+from .core import db_request, prepared_statement
+
+# Nombre de tentatives avant blocage
+MAX_LOGIN_ATTEMPTS = 5
+
+# Fin du blocage courant : dernier échec + 5 min × 2^(bannissements - 1), exposant borné
+BAN_END = "la.last_fail + interval '5 minutes' * power(2, LEAST(GREATEST(la.bans_number - 1, 0), 16))"
+
+LoginState = namedtuple('LoginState', 'user_id hash email disabled attempts_left ban_minutes_left')
+
+LOGIN_STATE = prepared_statement('login_state', f"""
+    SELECT u.id, u.hash, u.email, u.disabled, la.attempts_left,
+           CASE WHEN la.attempts_left = 0 AND {BAN_END} > now()
+                THEN EXTRACT(EPOCH FROM {BAN_END} - now()) / 60
+           END AS ban_minutes_left
+    FROM users u
+    LEFT JOIN login_attempts la ON la.user_id = u.id
+    WHERE u.username = %s
+""")
+
+# Un échec décompte une tentative ; si le blocage précédent est terminé, le compteur repart
+# de {MAX_LOGIN_ATTEMPTS} avant le décompte. La dernière tentative déclenche un nouveau blocage.
+# Aucune ligne n'est modifiée (ni renvoyée) si l'utilisateur est encore bloqué.
+LOGIN_FAILURE = prepared_statement('login_failure', f"""
+    UPDATE login_attempts la SET
+        attempts_left = CASE WHEN la.attempts_left = 0 THEN {MAX_LOGIN_ATTEMPTS - 1} ELSE la.attempts_left - 1 END,
+        bans_number = la.bans_number + CASE WHEN la.attempts_left = 1 THEN 1 ELSE 0 END,
+        last_fail = CASE WHEN la.attempts_left = 1 THEN now() ELSE la.last_fail END
+    WHERE la.user_id = %s AND (la.attempts_left > 0 OR {BAN_END} <= now())
+    RETURNING la.attempts_left
+""")
+
+LOGIN_SUCCESS = prepared_statement('login_success', f"""
+    UPDATE login_attempts SET bans_number = 0, attempts_left = {MAX_LOGIN_ATTEMPTS} WHERE user_id = %s
+""")
+
+
+def fetch_login_state(username):
+    """
+    Compte et état de blocage d'un utilisateur, en une requête.
+
+    Returns:
+        LoginState or None: None si le nom d'utilisateur est inconnu. ban_minutes_left n'est
+        renseigné que si l'utilisateur est bloqué. Renvoie la page d'erreur de db_request
+        si la requête échoue.
+    """
+    rows = db_request(LOGIN_STATE, (username,))
+    if not isinstance(rows, list):
+        return rows
+    if not rows:
+        return None
+    return LoginState(*rows[0])
+
+
+def record_login_failure(user_id):
+    """
+    Enregistre un mot de passe incorrect.
+
+    Returns:
+        int or None: Tentatives restantes (0 : l'utilisateur vient d'être bloqué),
+        None si rien n'a été décompté (déjà bloqué, ou erreur).
+    """
+    rows = db_request(LOGIN_FAILURE, (user_id,))
+    if not isinstance(rows, list) or not rows:
+        return None
+    return rows[0][0]
+
+
+def record_login_success(user_id):
+    """Remet à zéro les tentatives et les bannissements après une connexion réussie"""
+    db_request(LOGIN_SUCCESS, (user_id,), fetch=False)
+
+
+def store_password_hash(user_id, password_hash):
+    """Remplace le hachage du mot de passe (refait avec la méthode configurée)"""
+    db_request("UPDATE users SET hash = %s WHERE id = %s", (password_hash, user_id), fetch=False)
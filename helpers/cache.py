@@ -0,0 +1,275 @@
+"""
+Cache applicatif en lecture (read-through) pour les contenus de quiz.
+
+Deux niveaux :
+- un cache LRU en mémoire, propre à chaque processus, borné en nombre d'entrées et en durée (TTL) ;
+- un stockage partagé optionnel (Redis si REDIS_URL est défini) commun à tous les workers.
+
+Chaque clé possède un numéro de version, conservé dans le stockage partagé (ou dans le processus
+sans stockage partagé). Une invalidation incrémente ce numéro : les autres workers ne retrouvent
+plus leurs copies locales, indexées par version, et rechargent la donnée. Un chargement commencé
+avant une invalidation n'est pas mis en cache.
+
+Sans stockage partagé, l'invalidation ne touche que le processus courant : l'appelant passe alors
+is_current à get_or_load() pour écarter une copie dépassée (quiz/routes.py compare la version du
+contenu en base, quiz_infos.content_version, à celle de la copie en cache).
+
+Les routes d'écriture de quiz/routes.py appellent invalidate_quiz_questions() après chaque
+modification des questions ou des informations d'un quiz.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger('law_quiz_app.helpers.cache')
+
+# Valeur sentinelle : distingue une absence du cache d'une valeur None mise en cache
+MISSING = object()
+
+
+class LRUCache:
+    """Cache LRU en mémoire, thread-safe, avec une durée de vie par entrée"""
+
+    def __init__(self, max_entries=512, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Renvoie la valeur associée à key, ou MISSING si elle est absente ou expirée"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        """Ajoute une entrée et évince les moins récemment utilisées au-delà de max_entries"""
+        expires = time.monotonic() + (ttl if ttl is not None else self.ttl)
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+
+class InMemoryStore:
+    """
+    Remplaçant en mémoire du client Redis (get, set, delete, incr).
+
+    Utilisé par les tests, ou avec REDIS_URL=memory:// pour simuler un stockage partagé.
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        with self._lock:
+            entry = self._data.get(name)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires <= time.monotonic():
+                del self._data[name]
+                return None
+            return value
+
+    def set(self, name, value, ex=None):
+        if isinstance(value, str):
+            value = value.encode()
+        with self._lock:
+            self._data[name] = (value, time.monotonic() + ex if ex else None)
+        return True
+
+    def delete(self, *names):
+        with self._lock:
+            return sum(1 for name in names if self._data.pop(name, None) is not None)
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            entry = self._data.get(name)
+            value = int(entry[0]) + amount if entry else amount
+            self._data[name] = (str(value).encode(), None)
+            return value
+
+    def ping(self):
+        return True
+
+
+class ReadThroughCache:
+    """
+    Cache en lecture à deux niveaux pour un espace de noms donné.
+
+    Les valeurs doivent être sérialisables en JSON : ce qui est stocké est ce qui sera relu,
+    quel que soit le niveau qui répond.
+    """
+
+    def __init__(self, namespace, local, shared=None, ttl=60):
+        self.namespace = namespace
+        self.local = local
+        self.shared = shared
+        self.ttl = ttl
+        # Versions des clés invalidées dans ce processus, quand il n'y a pas de stockage partagé
+        self._local_versions = {}
+        self._lock = threading.Lock()
+
+    def _version(self, key):
+        """Numéro de version courant de la clé"""
+        if self.shared is None:
+            with self._lock:
+                return self._local_versions.get(key, 0)
+        try:
+            version = self.shared.get(f"{self.namespace}:{key}:version")
+            return int(version) if version else 0
+        except Exception as e:
+            logger.warning(f"Stockage partagé indisponible: {e}")
+            return 0
+
+    def _lookup(self, key, version):
+        """Copie en cache de la clé pour cette version (locale, puis partagée), ou MISSING"""
+        local_key = (self.namespace, key, version)
+
+        value = self.local.get(local_key)
+        if value is not MISSING or self.shared is None:
+            return value
+
+        try:
+            raw = self.shared.get(f"{self.namespace}:{key}:v{version}")
+            if raw is not None:
+                value = json.loads(raw)
+                self.local.set(local_key, value)
+                return value
+        except Exception as e:
+            logger.warning(f"Lecture du stockage partagé impossible: {e}")
+        return MISSING
+
+    def get_or_load(self, key, loader, is_current=None):
+        """
+        Renvoie la valeur en cache, sinon l'obtient via loader() et la met en cache.
+
+        Un résultat qui n'est pas une liste ou un dict (par ex. la page d'erreur renvoyée par
+        db_request) est renvoyé tel quel sans être mis en cache.
+
+        Args:
+            is_current (callable, optional): is_current(valeur) renvoie False si la copie en
+                cache est dépassée ; elle est alors invalidée et rechargée.
+        """
+        version = self._version(key)
+        value = self._lookup(key, version)
+        if value is not MISSING and is_current is not None and not is_current(value):
+            # Copie antérieure à une écriture dont l'invalidation n'a pas atteint ce processus
+            self.invalidate(key)
+            version = self._version(key)
+            value = MISSING
+        if value is not MISSING:
+            return value
+
+        value = loader()
+        if not isinstance(value, (list, dict)):
+            return value
+
+        # Relire la valeur sérialisée garantit le même type (listes plutôt que tuples) à chaque niveau
+        value = json.loads(json.dumps(value))
+
+        # Invalidée pendant le chargement : la valeur lue est peut-être antérieure à l'écriture
+        if self._version(key) != version:
+            return value
+
+        shared_key = f"{self.namespace}:{key}:v{version}"
+        self.local.set((self.namespace, key, version), value)
+        if self.shared is not None:
+            try:
+                self.shared.set(shared_key, json.dumps(value), ex=self.ttl)
+            except Exception as e:
+                logger.warning(f"Écriture dans le stockage partagé impossible: {e}")
+        return value
+
+    def invalidate(self, key):
+        """Rend obsolètes toutes les copies de la clé, locales et partagées"""
+        version = self._version(key)
+        self.local.delete((self.namespace, key, version))
+        if self.shared is None:
+            with self._lock:
+                self._local_versions[key] = self._local_versions.get(key, 0) + 1
+        else:
+            try:
+                self.shared.incr(f"{self.namespace}:{key}:version")
+                self.shared.delete(f"{self.namespace}:{key}:v{version}")
+            except Exception as e:
+                logger.warning(f"Invalidation dans le stockage partagé impossible: {e}")
+
+
+def _create_shared_store():
+    """Crée le stockage partagé à partir de REDIS_URL, ou renvoie None"""
+    redis_url = os.environ.get('REDIS_URL')
+    if not redis_url:
+        return None
+    if redis_url == 'memory://':
+        return InMemoryStore()
+    try:
+        import redis
+        store = redis.Redis.from_url(redis_url, socket_timeout=0.5)
+        store.ping()
+        logger.info("Cache partagé Redis activé")
+        return store
+    except ImportError:
+        logger.warning("Paquet redis non installé - cache partagé désactivé")
+    except Exception as e:
+        logger.warning(f"Redis injoignable - cache partagé désactivé: {e}")
+    return None
+
+
+CACHE_TTL = int(os.environ.get('CACHE_TTL', 60))
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 512))
+
+local_cache = LRUCache(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL)
+shared_store = _create_shared_store()
+
+# Questions des quiz, indexées par quiz_id
+quiz_questions_cache = ReadThroughCache('quiz_questions', local_cache, shared_store, ttl=CACHE_TTL)
+
+
+def invalidate_quiz_questions(quiz_id):
+    """À appeler après toute écriture sur les questions ou les informations d'un quiz"""
+    if quiz_id:
+        quiz_questions_cache.invalidate(str(quiz_id))
+
+
+def cache_status():
+    """État du cache pour /health"""
+    return {
+        'backend': 'local+shared' if shared_store is not None else 'local',
+        **local_cache.stats()
+    }
@@ -0,0 +1,196 @@
+"""
+Catalogue matérialisé des quiz (table quiz_catalog).
+
+La page /quiz/choix listait les quiz publics avec un GROUP BY sur toute la table
+quiz_questions à chaque affichage. Le catalogue garde une ligne par quiz avec le
+nombre de questions, les likes et le nom de l'auteur déjà calculés : la liste
+devient un simple parcours d'index sur (likes DESC, quiz_id).
+
+Le catalogue est maintenu par les routes d'écriture de quiz/routes.py qui appellent
+refresh_quiz_catalog() après chaque modification. La suppression d'un quiz est
+propagée par la clé étrangère ON DELETE CASCADE (voir migrations/001_quiz_catalog.sql).
+
+Les pages de la liste sont lues par curseur (fetch_catalog_page) plutôt que par OFFSET.
+"""
+import base64
+import logging
+import threading
+import time
+
+from .core import db_request
+
+logger = logging.getLogger('law_quiz_app.helpers.catalog')
+
+
+def refresh_quiz_catalog(quiz_id):
+    """
+    Recalcule la ligne du catalogue pour un quiz.
+
+    Le comptage ne porte que sur les questions de ce quiz (index sur quiz_questions.quiz_id),
+    le coût ne dépend donc pas de la taille totale de la table.
+
+    Args:
+        quiz_id (int): Identifiant du quiz modifié.
+    """
+    if not quiz_id:
+        return
+
+    db_request("""
+        INSERT INTO quiz_catalog (quiz_id, titre, user_id, username, matiere, niveau, type, likes, question_count)
+        SELECT qi.quiz_id, qi.titre, qi.user_id, u.username, qi.matiere, qi.niveau, qi.type, qi.likes,
+               (SELECT COUNT(*) FROM quiz_questions qq WHERE qq.quiz_id = qi.quiz_id)
+        FROM quiz_infos qi
+        JOIN users u ON qi.user_id = u.id
+        WHERE qi.quiz_id = %s
+        ON CONFLICT (quiz_id) DO UPDATE SET
+            titre = EXCLUDED.titre,
+            user_id = EXCLUDED.user_id,
+            username = EXCLUDED.username,
+            matiere = EXCLUDED.matiere,
+            niveau = EXCLUDED.niveau,
+            type = EXCLUDED.type,
+            likes = EXCLUDED.likes,
+            question_count = EXCLUDED.question_count
+    """, (quiz_id,), fetch=False)
+    invalidate_public_count()
+
+    logger.debug("Catalogue de quiz mis à jour", extra={'quiz_id': quiz_id})
+
+
+# Nombre de quiz par page sur /quiz/choix
+PAGE_SIZE = 10
+
+
+def encode_cursor(*values):
+    """Encode la position d'un quiz dans un tri, par ex. (likes, quiz_id), en curseur opaque pour l'URL"""
+    raw = ":".join(repr(value) for value in values).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Décode un curseur produit par encode_cursor.
+
+    Returns:
+        tuple or None: Les valeurs du curseur, par ex. (likes, quiz_id),
+        ou None si le curseur est absent ou invalide.
+    """
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        return tuple(float(value) if "." in value or "e" in value else int(value)
+                     for value in raw.split(":"))
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def fetch_catalog_page(where, params, after=None, before=None, with_total=True):
+    """
+    Lit une page du catalogue avec une pagination par curseur (keyset).
+
+    Les quiz sont triés par (likes DESC, quiz_id DESC). Au lieu d'un OFFSET, la page
+    suivante reprend strictement après le dernier quiz affiché : la page N coûte
+    autant que la page 1 et l'ordre reste stable si des likes changent entre deux pages.
+
+    Le nombre total de quiz correspondant à la condition est calculé dans la même requête
+    (une sous-requête scalaire : COUNT(*) OVER () ne compterait que les lignes après le curseur).
+
+    Args:
+        where (str): Condition SQL sur quiz_catalog (fragment interne, jamais une saisie utilisateur).
+        params (tuple): Paramètres de la condition.
+        after (tuple, optional): Curseur décodé, renvoie les quiz situés après.
+        before (tuple, optional): Curseur décodé, renvoie les quiz situés avant.
+        with_total (bool, optional): Calculer le nombre total de quiz. Defaults to True.
+
+    Returns:
+        tuple: (rows, next_cursor, prev_cursor, total_results). Chaque ligne contient
+        (titre, username, matiere, niveau, question_count, likes, quiz_id).
+        Les curseurs valent None s'il n'y a pas de page dans cette direction,
+        total_results vaut None si with_total est False.
+    """
+    if before and len(before) == 2:
+        keyset, order, position = "AND (likes, quiz_id) > (%s, %s)", "likes ASC, quiz_id ASC", before
+    elif after and len(after) == 2:
+        keyset, order, position = "AND (likes, quiz_id) < (%s, %s)", "likes DESC, quiz_id DESC", after
+    else:
+        keyset, order, position = "", "likes DESC, quiz_id DESC", ()
+
+    if with_total:
+        total_column, total_params = f"(SELECT COUNT(*) FROM quiz_catalog WHERE {where})", params
+    else:
+        total_column, total_params = "NULL", ()
+
+    rows = db_request(f"""
+        SELECT titre, username, matiere, niveau, question_count, likes, quiz_id,
+               {total_column} AS total_results
+        FROM quiz_catalog
+        WHERE {where} {keyset}
+        ORDER BY {order}
+        LIMIT %s
+    """, (*total_params, *params, *position, PAGE_SIZE + 1))
+
+    # db_request renvoie une page d'erreur (déjà journalisée) si la requête échoue
+    rows = list(rows) if isinstance(rows, list) else []
+    total_results = (rows[0][7] if rows else 0) if with_total else None
+
+    # Une ligne de plus que la taille de page indique qu'il reste des quiz dans cette direction
+    has_more = len(rows) > PAGE_SIZE
+    rows = rows[:PAGE_SIZE]
+
+    if keyset and before:
+        rows.reverse()
+        has_next, has_prev = True, has_more
+    else:
+        has_next, has_prev = has_more, bool(keyset)
+
+    next_cursor = encode_cursor(rows[-1][5], rows[-1][6]) if rows and has_next else None
+    prev_cursor = encode_cursor(rows[0][5], rows[0][6]) if rows and has_prev else None
+
+    return [row[:7] for row in rows], next_cursor, prev_cursor, total_results
+
+
+# Condition de la liste publique (un quiz public doit contenir au moins 4 questions)
+PUBLIC_LISTING = "type = 'public' AND question_count > 3"
+
+# Le nombre de quiz publics est approximé pendant PUBLIC_COUNT_TTL secondes
+PUBLIC_COUNT_TTL = 60
+_public_count = {'value': None, 'expires': 0.0}
+_public_count_lock = threading.Lock()
+
+
+def fetch_public_page(after=None, before=None):
+    """
+    Lit une page de la liste publique de /quiz/choix.
+
+    Le nombre total de quiz publics n'est recalculé (dans la requête de la page) qu'une fois
+    par PUBLIC_COUNT_TTL secondes et par processus ; entre-temps la valeur en mémoire est utilisée.
+    Seule une première page (sans curseur) non vide met le nombre en cache.
+    Les écritures faites par ce processus l'invalident immédiatement (voir refresh_quiz_catalog).
+
+    Returns:
+        tuple: (rows, next_cursor, prev_cursor, total_results), comme fetch_catalog_page.
+    """
+    with _public_count_lock:
+        cached = _public_count['value'] if _public_count['expires'] > time.monotonic() else None
+
+    rows, next_cursor, prev_cursor, total_results = fetch_catalog_page(
+        PUBLIC_LISTING, (), after, before, with_total=cached is None)
+
+    if cached is None:
+        # Nombre lu sur une ligne de la page : seule une première page non vide le donne
+        # sûrement (page vide = curseur au-delà de la fin ou requête en échec, total 0)
+        if rows and not after and not before:
+            with _public_count_lock:
+                _public_count['value'] = total_results
+                _public_count['expires'] = time.monotonic() + PUBLIC_COUNT_TTL
+        return rows, next_cursor, prev_cursor, total_results
+
+    return rows, next_cursor, prev_cursor, cached
+
+
+def invalidate_public_count():
+    """Oublie le nombre de quiz publics mis en cache"""
+    with _public_count_lock:
+        _public_count['value'] = None
+        _public_count['expires'] = 0.0
@@ -1,4 +1,4 @@
-from flask import redirect, request, render_template, session, url_for
+from flask import g, has_app_context, has_request_context, redirect, request, render_template, session, url_for
 from functools import wraps
 import psycopg2
 from psycopg2 import pool
@@ -8,7 +8,15 @@ from flask_mail import Message
 from flask import current_app
 import secrets
 from datetime import datetime, timedelta
+from contextlib import contextmanager
+from contextvars import ContextVar
 import logging
+import threading
+import time
+import weakref
+
+from .pool import BoundedConnectionPool, pool_settings
+from .slow_queries import slow_queries
 
 # Logger pour ce module
 logger = logging.getLogger('law_quiz_app.helpers')
@@ -16,23 +24,34 @@ logger = logging.getLogger('law_quiz_app.helpers')
 # Connection pool global
 _connection_pool = None
 
-def initialize_db_pool():
-    """Initialize the database connection pool"""
+def initialize_db_pool(config=None):
+    """
+    Initialize the database connection pool.
+
+    Sizing, checkout timeout and recycling come from config or the environment
+    (DB_POOL_MIN, DB_POOL_MAX, DB_POOL_TIMEOUT, DB_POOL_MAX_IDLE, DB_POOL_MAX_LIFETIME),
+    see helpers.pool.
+    """
     global _connection_pool
     if _connection_pool is None:
         database_url = os.environ.get('DATABASE_URL')
         if not database_url:
             raise Exception("DATABASE_URL environment variable is not set")
         
+        settings = pool_settings(config)
         try:
-            _connection_pool = psycopg2.pool.ThreadedConnectionPool(
-                minconn=2,  # Minimum 2 connections
-                maxconn=10, # Maximum 10 connections  
-                dsn=database_url
+            _connection_pool = BoundedConnectionPool(
+                psycopg2.pool.ThreadedConnectionPool(
+                    minconn=settings['minconn'],
+                    maxconn=settings['maxconn'],
+                    dsn=database_url
+                ),
+                **settings
             )
             logger.info("Database connection pool initialized successfully", extra={
-                'min_connections': 2,
-                'max_connections': 10
+                'min_connections': settings['minconn'],
+                'max_connections': settings['maxconn'],
+                'checkout_timeout': settings['checkout_timeout']
             })
         except Exception as e:
             logger.error(f"Failed to initialize connection pool: {e}", exc_info=True)
@@ -50,11 +69,100 @@ def get_connection():
         logger.error(f"Failed to get connection from pool: {e}", exc_info=True)
         raise
 
-def return_connection(conn):
-    """Return a connection to the pool"""
+def return_connection(conn, close=False):
+    """Return a connection to the pool (close=True closes it instead of keeping it)"""
     global _connection_pool
     if _connection_pool and conn:
-        _connection_pool.putconn(conn)
+        _connection_pool.putconn(conn, close=close)
+
+def pool_status():
+    """État du pool de connexions pour /health (None si le pool n'est pas initialisé)"""
+    if _connection_pool is None or not hasattr(_connection_pool, 'stats'):
+        return None
+    return _connection_pool.stats()
+
+def acquire_connection():
+    """
+    Connexion à utiliser pour une requête SQL.
+
+    Dans un contexte d'application Flask, la connexion est empruntée au pool à la
+    première requête puis conservée dans flask.g : toutes les requêtes SQL d'une même
+    requête HTTP la réutilisent. Elle est rendue par release_request_connection
+    (hook teardown_appcontext). Hors contexte (scripts, threads), une connexion du pool.
+
+    Returns:
+        tuple: (connexion, True si elle est liée au contexte et ne doit pas être rendue par l'appelant)
+    """
+    if not has_app_context():
+        return get_connection(), False
+    conn = g.get('_db_connection')
+    if conn is None:
+        conn = get_connection()
+        g._db_connection = conn
+    return conn, True
+
+def discard_request_connection(close=False):
+    """Rend au pool la connexion du contexte après une erreur (la suivante sera neuve) ; close=True la ferme"""
+    conn = g.pop('_db_connection', None)
+    if conn is None:
+        return
+    if close:
+        return_connection(conn, close=True)
+    else:
+        return_connection(conn)
+
+def release_request_connection(exception=None):
+    """Rend au pool la connexion liée au contexte d'application (teardown_appcontext)"""
+    conn = g.pop('_db_connection', None)
+    if conn is None:
+        return
+    try:
+        # Chaque requête SQL est déjà validée : on annule seulement ce qui resterait ouvert
+        conn.rollback()
+    except Exception as e:
+        logger.warning(f"Rollback impossible en fin de requête: {e}")
+    finally:
+        return_connection(conn)
+
+class RequestDBStats:
+    """Requêtes SQL d'une requête HTTP : nombre, temps passé en base et lignes lues"""
+
+    __slots__ = ('statements', 'time', 'rows')
+
+    def __init__(self):
+        self.statements = 0
+        self.time = 0.0
+        self.rows = 0
+
+    def as_dict(self):
+        return {'statements': self.statements, 'time': self.time, 'rows': self.rows}
+
+def _record_statement(duration, rows=0):
+    """Compte une requête SQL dans les statistiques du contexte d'application (flask.g)"""
+    if not has_app_context():
+        return
+    stats = g.get('_db_stats')
+    if stats is None:
+        stats = g._db_stats = RequestDBStats()
+    stats.statements += 1
+    stats.time += duration
+    stats.rows += rows
+
+def request_db_stats():
+    """
+    Requêtes SQL exécutées depuis le début de la requête HTTP (after_request, voir
+    setup_request_monitoring).
+
+    Returns:
+        RequestDBStats: Statistiques du contexte, vides s'il n'y a eu aucune requête.
+    """
+    if not has_app_context():
+        return RequestDBStats()
+    return g.get('_db_stats') or RequestDBStats()
+
+def setup_request_connection(app):
+    """Enregistre la libération de la connexion du contexte à la fin de chaque requête"""
+    app.teardown_appcontext(release_request_connection)
 
 """  FONCTIONS UTILITAIRES  """
 
@@ -125,43 +233,244 @@ def arg_is_present(args):
             return False
     return True
 
+# Requêtes préparées côté serveur (désactivables, par ex. derrière pgbouncer en mode transaction)
+PREPARED_STATEMENTS_ENABLED = os.environ.get('DB_PREPARED_STATEMENTS', '1') != '0'
+
+# Registre des requêtes préparées : nom -> PreparedStatement
+PREPARED_STATEMENTS = {}
+
+# Noms des requêtes déjà préparées sur chaque connexion (oubliées avec la connexion)
+_prepared_on = weakref.WeakKeyDictionary()
+_prepared_lock = threading.Lock()
+
+
+class PreparedStatement(str):
+    """
+    Requête SQL nommée, préparée (PREPARE) une fois par connexion puis exécutée (EXECUTE).
+
+    C'est une chaîne : elle s'utilise comme le texte de la requête, db_request(statement, params),
+    et reste lisible dans les logs et les tests. Les paramètres s'écrivent %s comme ailleurs.
+    """
+
+    def __new__(cls, name, text):
+        statement = super().__new__(cls, text)
+        statement.name = name
+        parts = text.split('%s')
+        # PREPARE est envoyé sans paramètres : psycopg2 ne remplace alors pas %% par %
+        statement.prepare_text = f"PREPARE {name} AS " + "".join(
+            part.replace('%%', '%') + (f"${i}" if i < len(parts) else "") for i, part in enumerate(parts, start=1))
+        placeholders = ", ".join(["%s"] * (len(parts) - 1))
+        statement.execute_text = f"EXECUTE {name} ({placeholders})" if placeholders else f"EXECUTE {name}"
+        return statement
+
+
+def prepared_statement(name, text):
+    """
+    Déclare une requête fréquente à préparer côté serveur.
+
+    Args:
+        name (str): Nom de la requête préparée (identifiant SQL, unique).
+        text (str): Requête avec des paramètres %s.
+
+    Returns:
+        PreparedStatement: À passer à db_request à la place du texte de la requête.
+    """
+    existing = PREPARED_STATEMENTS.get(name)
+    if existing is not None and str(existing) != text:
+        raise ValueError(f"Requête préparée déjà déclarée avec un autre texte: {name}")
+    statement = existing or PreparedStatement(name, text)
+    PREPARED_STATEMENTS[name] = statement
+    return statement
+
+
+def _execute(conn, cursor, text, params):
+    """Exécute la requête, en passant par PREPARE/EXECUTE pour une requête préparée"""
+    if not isinstance(text, PreparedStatement) or not PREPARED_STATEMENTS_ENABLED:
+        cursor.execute(text, params)
+        return
+    with _prepared_lock:
+        prepared = _prepared_on.setdefault(conn, set())
+    if text.name not in prepared:
+        cursor.execute(text.prepare_text)
+        prepared.add(text.name)
+    cursor.execute(text.execute_text, params)
+
+
+class DatabaseError(Exception):
+    """Requête en échec dans un bloc db_transaction (déjà journalisée, transaction annulée)"""
+
+
+# Transaction en cours dans le contexte d'exécution (thread ou requête), voir db_transaction
+_current_transaction = ContextVar('db_transaction', default=None)
+
+
+class Transaction:
+    """
+    Unité de travail : une seule connexion du pool et un seul commit pour plusieurs requêtes SQL.
+
+    La connexion n'est empruntée au pool qu'à la première requête exécutée.
+    """
+
+    def __init__(self):
+        self.conn = None
+        self.pinned = False
+        self.failed = False
+
+    def connection(self):
+        """Connexion de la transaction, obtenue à la première utilisation (voir acquire_connection)"""
+        if self.conn is None:
+            self.conn, self.pinned = acquire_connection()
+        return self.conn
+
+    def query(self, text, params=None, fetch=True):
+        """Exécute une requête dans la transaction (mêmes arguments et retour que db_request)"""
+        return db_request(text, params, fetch)
+
+    def close(self):
+        """Valide la transaction (ou l'annule après une erreur) et rend la connexion au pool"""
+        if self.conn is None:
+            return
+        conn, self.conn = self.conn, None
+        started = time.perf_counter()
+        try:
+            if self.failed:
+                conn.rollback()
+            else:
+                conn.commit()
+        except Exception as e:
+            broken = not self._rollback_after_error(conn)
+            # Connexion dans un état douteux : ni gardée pour la suite de la requête, ni
+            # rendue au pool si même le rollback a échoué
+            if self.pinned:
+                discard_request_connection(close=broken)
+            elif broken:
+                return_connection(conn, close=True)
+            else:
+                return_connection(conn)
+            if self.failed:
+                # L'exception du bloc est déjà en cours de propagation
+                logger.warning(f"Annulation de la transaction impossible: {e}")
+                return
+            logger.error(f"Échec de validation de la transaction: {e}", exc_info=True)
+            raise DatabaseError(str(e)) from e
+        _record_statement(time.perf_counter() - started)  # COMMIT ou ROLLBACK : un aller-retour de plus
+        # La connexion liée au contexte reste disponible pour la suite de la requête
+        if not self.pinned:
+            return_connection(conn)
+
+    @staticmethod
+    def _rollback_after_error(conn):
+        """Rollback après un COMMIT en échec ; False si la connexion est inutilisable"""
+        try:
+            conn.rollback()
+            return True
+        except Exception as e:
+            logger.warning(f"Rollback impossible, connexion fermée: {e}")
+            return False
+
+
+@contextmanager
+def db_transaction():
+    """
+    Regroupe plusieurs requêtes dans une seule transaction.
+
+    Usage:
+        with db_transaction() as tx:
+            tx.query("UPDATE ...", params, fetch=False)
+            db_request("SELECT ...", params)  # rejoint aussi la transaction
+
+    Tous les appels à db_request faits dans le bloc réutilisent la même connexion et ne
+    valident rien eux-mêmes : un seul commit a lieu à la sortie du bloc. Si une requête
+    échoue, db_request lève DatabaseError (au lieu de renvoyer une page d'erreur) : la suite
+    du bloc n'est pas exécutée, tout est annulé et l'exception est propagée, comme toute
+    exception levée dans le bloc. Un bloc imbriqué rejoint la transaction englobante.
+    """
+    current = _current_transaction.get()
+    if current is not None:
+        yield current
+        return
+
+    transaction = Transaction()
+    token = _current_transaction.set(transaction)
+    try:
+        yield transaction
+    except Exception:
+        transaction.failed = True
+        raise
+    finally:
+        _current_transaction.reset(token)
+        transaction.close()
+
+
 def db_request(text, params=None, fetch=True):
     """
     Execute a database request using connection pool.
 
+    Within a Flask app context, every call reuses the connection pinned to flask.g
+    (see acquire_connection). Inside a db_transaction() block, the request reuses the
+    transaction's connection and the commit is deferred to the end of the block.
+
     Args:
-        text (str): SQL query to execute.
+        text (str): SQL query to execute, or a PreparedStatement (see prepared_statement).
         params (tuple or list, optional): Parameters to pass with the SQL query. 
         Defaults to None.
         fetch (bool, optional): Whether to fetch and return results. Defaults to True.
 
     Returns:
         list or None: Query results if fetch is True, otherwise None.
+
+    Raises:
+        DatabaseError: if the request fails inside a db_transaction() block (outside a
+        transaction, an apology page is returned instead).
     """
+    transaction = _current_transaction.get()
     conn = None
+    pinned = False
+    started = None
+    rows = None
     try:
-        conn = get_connection()
+        if transaction is not None:
+            conn = transaction.connection()
+        else:
+            conn, pinned = acquire_connection()
         cursor = conn.cursor()
         if params is None:
             params = ()
-        cursor.execute(text, params)
+        started = time.perf_counter()
+        _execute(conn, cursor, text, params)
         if fetch:
             rows = cursor.fetchall()
         else:
             rows = None # Return value is None if no fetch requested
-        conn.commit()
+        if transaction is None:
+            conn.commit()
         return rows
     except Exception as e:
-        if conn:
-            conn.rollback()
+        if transaction is not None:
+            transaction.failed = True # Toute la transaction sera annulée à la sortie du bloc
+        elif conn:
+            try:
+                conn.rollback()
+            finally:
+                if pinned:
+                    # Connexion peut-être cassée : ne pas la garder pour la suite de la requête
+                    discard_request_connection()
         logger.error(f"Erreur base de données: {e}", extra={
             'query': text[:100],  # Première partie de la requête
             'params_count': len(params) if params else 0,
             'user_id': session.get('user_id') if session else None
         }, exc_info=True)
+        if transaction is not None:
+            raise DatabaseError(str(e)) from e
         return apology("Une erreur s'est produite lors de la requête à la base de données.")
     finally:
-        if conn:
+        if started is not None:
+            # Exécution, lecture des lignes et commit (hors attente d'une connexion du pool)
+            duration = time.perf_counter() - started
+            _record_statement(duration, len(rows) if isinstance(rows, list) else 0)
+            if duration >= slow_queries.threshold:
+                slow_queries.observe(text, params, duration, request.endpoint if has_request_context() else None)
+        if conn and transaction is None and not pinned:
             return_connection(conn)
 
 def generate_reset_token():
@@ -169,19 +478,26 @@ def generate_reset_token():
     return secrets.token_urlsafe(32)
 
 def send_reset_email(email, username, token):
-    """Envoie un email de réinitialisation de mot de passe"""
+    """
+    Envoie un email de réinitialisation de mot de passe.
+
+    Avec MAIL_OUTBOX=1 (et un serveur SMTP configuré) le message est seulement enregistré dans
+    la boîte d'envoi (helpers/mail_outbox.py) et part en arrière-plan ; sinon il est envoyé
+    tout de suite.
+    """
+    from .mail_outbox import enqueue_mail, outbox_active
+
     try:
         logger.info(f"Tentative d'envoi email de réinitialisation", extra={
             'email': email,
             'username': username,
             'smtp_server': current_app.config.get('MAIL_SERVER'),
-            'mail_configured': bool(current_app.config.get('MAIL_PASSWORD'))
+            'mail_configured': bool(current_app.config.get('MAIL_PASSWORD')),
+            'outbox': outbox_active()
         })
         
-        msg = Message(
-            subject="Réinitialisation de votre mot de passe - LawAndCode",
-            recipients=[email],
-            html=f"""
+        subject = "Réinitialisation de votre mot de passe - LawAndCode"
+        html = f"""
             <h2>Réinitialisation de mot de passe</h2>
             <p>Bonjour {username},</p>
             <p>Cliquez sur le lien suivant pour réinitialiser votre mot de passe :</p>
@@ -190,9 +506,19 @@ def send_reset_email(email, username, token):
             <p>Si vous n'avez pas demandé cette réinitialisation, ignorez cet email.</p>
             <br>
             <p>Cordialement,<br>L'équipe LawAndCode</p>
-            """,
-            body=f"Réinitialisation mot de passe - Token: {token}"
-        )
+            """
+        body = f"Réinitialisation mot de passe - Token: {token}"
+
+        if outbox_active():
+            if not enqueue_mail(email, subject, html=html, body=body):
+                raise RuntimeError("Enregistrement dans la boîte d'envoi impossible")
+            logger.info("Email de réinitialisation mis en file d'envoi", extra={
+                'email': email,
+                'username': username
+            })
+            return True
+
+        msg = Message(subject=subject, recipients=[email], html=html, body=body)
         
         current_app.mail.send(msg)
         logger.info("Email de réinitialisation envoyé avec succès", extra={
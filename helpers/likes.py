@@ -0,0 +1,201 @@
+"""
+Likes des quiz : enregistrement, compteurs et réconciliation.
+
+quiz_likes (une ligne par utilisateur et par quiz) est la source de vérité ; quiz_infos.likes
+et quiz_catalog.likes en sont des copies dénormalisées servant au tri de /quiz/choix.
+
+- record_like() insère le like et n'incrémente les compteurs que si une ligne a réellement
+  été insérée, le tout en une requête : un double clic ne fausse plus le compteur.
+- Par défaut l'incrément porte directement sur quiz_infos et quiz_catalog. Sur un quiz très
+  aimé, tous les likes attendent alors le même verrou de ligne : avec LIKE_COUNTER_SHARDS=N
+  (N > 1), l'incrément va dans l'une des N lignes de quiz_like_shards, tirée au hasard, et
+  roll_up_likes() reporte périodiquement ces deltas dans les compteurs (LIKE_ROLLUP_INTERVAL
+  secondes, thread d'arrière-plan de chaque worker). Les compteurs affichés ont alors
+  quelques secondes de retard.
+- reconcile_likes() recalcule les compteurs à partir de quiz_likes, pour corriger une dérive
+  passée ; à lancer ponctuellement ou par cron : python -m helpers.likes reconcile
+"""
+import argparse
+import logging
+import os
+import random
+import threading
+import time
+
+from .core import db_request, db_transaction
+
+logger = logging.getLogger('law_quiz_app.helpers.likes')
+
+# 0 ou 1 : incrément direct ; N > 1 : N lignes de compteur par quiz (migrations/006_quiz_like_counters.sql)
+LIKE_COUNTER_SHARDS = int(os.environ.get('LIKE_COUNTER_SHARDS', 0))
+LIKE_ROLLUP_INTERVAL = float(os.environ.get('LIKE_ROLLUP_INTERVAL', 10))
+
+# Le quiz est retrouvé par titre et auteur, comme dans les autres routes ; l'insertion du like
+# n'a lieu que si le quiz existe, et les compteurs ne bougent que si elle a inséré une ligne
+_LIKE_DIRECT = """
+    WITH target AS (
+        SELECT quiz_id FROM quiz_infos WHERE titre = %s AND user_id = %s LIMIT 1
+    ),
+    inserted AS (
+        INSERT INTO quiz_likes (user_id, quiz_id)
+        SELECT %s, quiz_id FROM target
+        ON CONFLICT (quiz_id, user_id) DO NOTHING
+        RETURNING quiz_id
+    ),
+    counted AS (
+        UPDATE quiz_infos SET likes = likes + 1
+        WHERE quiz_id IN (SELECT quiz_id FROM inserted)
+        RETURNING quiz_id
+    ),
+    listed AS (
+        UPDATE quiz_catalog SET likes = likes + 1
+        WHERE quiz_id IN (SELECT quiz_id FROM inserted)
+    )
+    SELECT (SELECT quiz_id FROM target), (SELECT quiz_id FROM counted)
+"""
+
+_LIKE_SHARDED = """
+    WITH target AS (
+        SELECT quiz_id FROM quiz_infos WHERE titre = %s AND user_id = %s LIMIT 1
+    ),
+    inserted AS (
+        INSERT INTO quiz_likes (user_id, quiz_id)
+        SELECT %s, quiz_id FROM target
+        ON CONFLICT (quiz_id, user_id) DO NOTHING
+        RETURNING quiz_id
+    ),
+    counted AS (
+        INSERT INTO quiz_like_shards (quiz_id, shard, delta)
+        SELECT quiz_id, %s, 1 FROM inserted
+        ON CONFLICT (quiz_id, shard) DO UPDATE SET delta = quiz_like_shards.delta + 1
+        RETURNING quiz_id
+    )
+    SELECT (SELECT quiz_id FROM target), (SELECT quiz_id FROM counted)
+"""
+
+# Vide les lignes de compteur et reporte leurs totaux dans quiz_infos et quiz_catalog.
+# Un like concurrent sur une ligne en cours de suppression attend la fin de la transaction
+# puis recrée sa ligne : aucun incrément n'est perdu.
+_ROLL_UP = """
+    WITH drained AS (
+        DELETE FROM quiz_like_shards RETURNING quiz_id, delta
+    ),
+    totals AS (
+        SELECT quiz_id, SUM(delta) AS delta FROM drained GROUP BY quiz_id
+    ),
+    counted AS (
+        UPDATE quiz_infos qi SET likes = qi.likes + t.delta
+        FROM totals t WHERE qi.quiz_id = t.quiz_id
+        RETURNING qi.quiz_id, qi.likes
+    ),
+    listed AS (
+        UPDATE quiz_catalog c SET likes = counted.likes
+        FROM counted WHERE c.quiz_id = counted.quiz_id
+    )
+    SELECT COUNT(*) FROM counted
+"""
+
+_RECONCILE = """
+    WITH actual AS (
+        SELECT qi.quiz_id, COUNT(ql.user_id) AS likes
+        FROM quiz_infos qi LEFT JOIN quiz_likes ql ON ql.quiz_id = qi.quiz_id
+        GROUP BY qi.quiz_id
+    ),
+    counted AS (
+        UPDATE quiz_infos qi SET likes = a.likes
+        FROM actual a WHERE qi.quiz_id = a.quiz_id AND qi.likes IS DISTINCT FROM a.likes
+        RETURNING qi.quiz_id
+    ),
+    listed AS (
+        UPDATE quiz_catalog c SET likes = a.likes
+        FROM actual a WHERE c.quiz_id = a.quiz_id AND c.likes IS DISTINCT FROM a.likes
+    )
+    SELECT COUNT(*) FROM counted
+"""
+
+
+def record_like(user_id, titre, author_id):
+    """
+    Enregistre le like d'un utilisateur sur un quiz, en une requête.
+
+    Args:
+        user_id (int): Utilisateur qui aime le quiz.
+        titre (str): Titre du quiz.
+        author_id (int): Auteur du quiz.
+
+    Returns:
+        tuple or None: (quiz_id, inserted) où quiz_id est None si le quiz n'existe pas et
+        inserted est False si l'utilisateur avait déjà aimé ce quiz ; None si la requête a échoué.
+    """
+    if LIKE_COUNTER_SHARDS > 1:
+        rows = db_request(_LIKE_SHARDED, (titre, author_id, user_id, random.randrange(LIKE_COUNTER_SHARDS)))
+        _ensure_rollup_thread()
+    else:
+        rows = db_request(_LIKE_DIRECT, (titre, author_id, user_id))
+
+    # db_request renvoie une page d'erreur (déjà journalisée) si la requête échoue
+    if not isinstance(rows, list) or not rows:
+        return None
+    quiz_id, counted_id = rows[0]
+    return quiz_id, counted_id is not None
+
+
+def roll_up_likes():
+    """Reporte les lignes de compteur (mode réparti) dans les compteurs de likes ; renvoie le nombre de quiz mis à jour"""
+    with db_transaction() as tx:
+        rows = tx.query(_ROLL_UP)
+    return rows[0][0] if isinstance(rows, list) and rows else 0
+
+
+def reconcile_likes():
+    """
+    Recalcule quiz_infos.likes et quiz_catalog.likes à partir de quiz_likes.
+
+    Les lignes de compteur en attente sont vidées dans la même transaction : le recomptage
+    les remplace. Renvoie le nombre de quiz dont le compteur était faux.
+    """
+    with db_transaction() as tx:
+        tx.query("DELETE FROM quiz_like_shards", fetch=False)
+        rows = tx.query(_RECONCILE)
+    fixed = rows[0][0] if isinstance(rows, list) and rows else 0
+    if fixed:
+        logger.warning(f"Compteurs de likes corrigés pour {fixed} quiz")
+    return fixed
+
+
+_rollup_thread = None
+_rollup_lock = threading.Lock()
+
+
+def _rollup_loop():
+    while True:
+        time.sleep(LIKE_ROLLUP_INTERVAL)
+        try:
+            roll_up_likes()
+        except Exception as e:
+            logger.error(f"Report des compteurs de likes impossible: {e}", exc_info=True)
+
+
+def _ensure_rollup_thread():
+    """Démarre le report périodique dans ce worker (au premier like en mode réparti)"""
+    global _rollup_thread
+    with _rollup_lock:
+        if _rollup_thread is None or not _rollup_thread.is_alive():
+            _rollup_thread = threading.Thread(target=_rollup_loop, name='likes-rollup', daemon=True)
+            _rollup_thread.start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintenance des compteurs de likes')
+    parser.add_argument('action', choices=['reconcile', 'rollup'],
+                        help='reconcile : recompter depuis quiz_likes ; rollup : reporter les lignes de compteur')
+    args = parser.parse_args()
+
+    if args.action == 'reconcile':
+        print(f"{reconcile_likes()} compteur(s) corrigé(s)")
+    else:
+        print(f"{roll_up_likes()} quiz mis à jour")
+
+
+if __name__ == "__main__":
+    main()
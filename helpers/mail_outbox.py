@@ -0,0 +1,326 @@
+"""
+Boîte d'envoi des emails (outbox).
+
+L'envoi SMTP prend souvent plusieurs secondes : fait dans /auth/forgot_password, il bloquait
+le worker gunicorn pendant tout ce temps. Avec MAIL_OUTBOX=1 (par défaut), la requête se
+contente d'insérer le message dans la table mail_outbox (migrations/008_mail_outbox.sql) ;
+un thread d'arrière-plan de chaque worker l'envoie :
+
+- les messages dus sont réservés par lots de MAIL_BATCH_SIZE (FOR UPDATE SKIP LOCKED, avec
+  un bail : deux workers n'envoient pas le même message) et envoyés sur les connexions du
+  pool SMTP de l'application (helpers/smtp.py), gardées ouvertes entre les messages et les lots ;
+- un échec reprogramme le message après MAIL_RETRY_BASE × 2^(essais - 1) secondes ; après
+  MAIL_MAX_ATTEMPTS échecs il passe en 'dead' (journalisé, consultable et relançable avec
+  python -m helpers.mail_outbox status|retry-dead) ;
+- la table est relue toutes les MAIL_POLL_INTERVAL secondes, et tout de suite après une
+  insertion par ce worker ;
+- les messages envoyés (qui contiennent les liens de réinitialisation) sont supprimés après
+  MAIL_SENT_RETENTION_DAYS jours, par le thread d'envoi une fois par heure ou avec
+  python -m helpers.mail_outbox purge.
+
+Livraison « au moins une fois » : chaque message est marqué envoyé dès qu'il est parti, et
+le bail couvre le pire cas d'un lot (deux essais par message, MAIL_TIMEOUT chacun) ; seul
+un worker tué entre l'envoi et la mise à jour de la ligne renverra le message à la fin du bail.
+"""
+import argparse
+import logging
+import os
+import threading
+import time
+from email.message import EmailMessage
+
+from .core import db_request
+from .monitoring import metrics
+from .smtp import SMTPPool
+
+logger = logging.getLogger('law_quiz_app.helpers.mail_outbox')
+
+MAIL_OUTBOX = os.environ.get('MAIL_OUTBOX', '1') == '1'
+
+_ENQUEUE = "INSERT INTO mail_outbox (recipient, subject, html, body) VALUES (%s, %s, %s, %s) RETURNING id"
+
+# Le bail repousse next_attempt_at : un message réservé par un worker n'est plus dû pour les
+# autres tant qu'il n'a pas été envoyé ou reprogrammé
+_CLAIM = """
+    UPDATE mail_outbox SET next_attempt_at = now() + make_interval(secs => %s)
+    WHERE id IN (
+        SELECT id FROM mail_outbox
+        WHERE status = 'pending' AND next_attempt_at <= now()
+        ORDER BY next_attempt_at
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id, recipient, subject, html, body, attempts
+"""
+
+_MARK_SENT = """
+    UPDATE mail_outbox SET status = 'sent', sent_at = now(), attempts = attempts + 1, last_error = NULL
+    WHERE id = ANY(%s)
+"""
+
+_PURGE_SENT = """
+    DELETE FROM mail_outbox WHERE id IN (
+        SELECT id FROM mail_outbox
+        WHERE status = 'sent' AND sent_at < now() - make_interval(days => %s)
+        LIMIT %s
+    )
+    RETURNING id
+"""
+
+_MARK_FAILED = """
+    UPDATE mail_outbox SET
+        attempts = attempts + 1,
+        last_error = %s,
+        status = CASE WHEN attempts + 1 >= %s THEN 'dead' ELSE 'pending' END,
+        next_attempt_at = now() + make_interval(secs => %s * power(2, attempts))
+    WHERE id = %s
+    RETURNING status
+"""
+
+
+class OutboxStore:
+    """Accès à la table mail_outbox"""
+
+    def enqueue(self, recipient, subject, html, body):
+        rows = db_request(_ENQUEUE, (recipient, subject, html, body))
+        return rows[0][0] if isinstance(rows, list) and rows else None
+
+    def claim(self, limit, lease):
+        rows = db_request(_CLAIM, (lease, limit))
+        return rows if isinstance(rows, list) else []
+
+    def mark_sent(self, ids):
+        db_request(_MARK_SENT, (list(ids),), fetch=False)
+
+    def mark_failed(self, message_id, error, max_attempts, retry_base):
+        rows = db_request(_MARK_FAILED, (error[:1000], max_attempts, retry_base, message_id))
+        return rows[0][0] if isinstance(rows, list) and rows else 'pending'
+
+    def purge_sent(self, retention_days, limit=1000):
+        """Supprime au plus limit messages envoyés depuis plus de retention_days jours ; renvoie leur nombre"""
+        rows = db_request(_PURGE_SENT, (retention_days, limit))
+        return len(rows) if isinstance(rows, list) else 0
+
+    def requeue_dead(self):
+        rows = db_request("""UPDATE mail_outbox SET status = 'pending', attempts = 0, next_attempt_at = now()
+                             WHERE status = 'dead' RETURNING id""")
+        return len(rows) if isinstance(rows, list) else 0
+
+    def counts(self):
+        rows = db_request("SELECT status, COUNT(*) FROM mail_outbox GROUP BY status")
+        return dict(rows) if isinstance(rows, list) else {}
+
+
+def purge_sent_mail(store, retention_days, chunk=1000):
+    """Supprime les messages envoyés depuis plus de retention_days jours, par tranches ; renvoie leur nombre"""
+    purged = 0
+    while True:
+        deleted = store.purge_sent(retention_days, chunk)
+        purged += deleted
+        if deleted < chunk:
+            break
+    if purged:
+        logger.info(f"{purged} email(s) envoyé(s) supprimé(s) de la boîte d'envoi")
+    return purged
+
+
+def build_message(sender, recipient, subject, html=None, body=None):
+    """Email texte, avec une version HTML s'il y en a une"""
+    message = EmailMessage()
+    message['From'] = sender
+    message['To'] = recipient
+    message['Subject'] = subject
+    message.set_content(body or '')
+    if html:
+        message.add_alternative(html, subtype='html')
+    return message
+
+
+class MailOutboxSender:
+    """Thread d'envoi des messages de la boîte d'envoi"""
+
+    def __init__(self, store, connection, sender, app=None, batch_size=20, poll_interval=5,
+                 max_attempts=6, retry_base=30, lease=None, retention_days=7, purge_interval=3600):
+        self.store = store
+        self.connection = connection
+        self.sender = sender
+        self.app = app
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        # Le bail doit couvrir tout le lot sur un serveur lent : sinon un autre worker
+        # réserve et renvoie les messages pas encore partis
+        if lease is None:
+            lease = max(300, batch_size * getattr(connection, 'timeout', 10) * 2)
+        self.lease = lease
+        self.retention_days = retention_days
+        self.purge_interval = purge_interval
+        self._purged_at = None
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread = None
+        self._lock = threading.Lock()
+        self.sent = 0
+        self.failed = 0
+        self.dead = 0
+
+    def start(self):
+        # Démarrage paresseux : le thread naît dans le worker, après le fork de gunicorn
+        with self._lock:
+            if not self._stopping and (self._thread is None or not self._thread.is_alive()):
+                self._thread = threading.Thread(target=self._run, name='mail-outbox', daemon=True)
+                self._thread.start()
+
+    def wake(self):
+        """Relire la boîte d'envoi sans attendre (après une insertion)"""
+        self.start()
+        self._wake.set()
+
+    def _run(self):
+        while not self._stopping:
+            self._wake.clear()
+            try:
+                claimed = self._process_in_context()
+            except Exception as e:
+                logger.error(f"Boîte d'envoi illisible: {e}", exc_info=True)
+                claimed = 0
+            if claimed < self.batch_size:
+                self._wake.wait(self.poll_interval)
+        self.connection.close()
+
+    def _process_in_context(self):
+        # Un contexte d'application par lot : la connexion à la base est rendue entre deux lots
+        if self.app is None:
+            return self._process()
+        with self.app.app_context():
+            return self._process()
+
+    def _process(self):
+        claimed = self.process_batch()
+        now = time.monotonic()
+        if self.retention_days > 0 and (self._purged_at is None or now - self._purged_at >= self.purge_interval):
+            self._purged_at = now
+            self.purge_sent()
+        return claimed
+
+    def purge_sent(self):
+        return purge_sent_mail(self.store, self.retention_days)
+
+    def process_batch(self):
+        """Envoie un lot de messages dus ; renvoie le nombre de messages réservés"""
+        rows = self.store.claim(self.batch_size, self.lease)
+        for message_id, recipient, subject, html, body, attempts in rows:
+            try:
+                self.connection.send(build_message(self.sender, recipient, subject, html, body))
+            except Exception as e:
+                self.failed += 1
+                metrics.increment('mail_outbox_failed')
+                status = self.store.mark_failed(message_id, f"{type(e).__name__}: {e}", self.max_attempts, self.retry_base)
+                if status == 'dead':
+                    self.dead += 1
+                    metrics.increment('mail_outbox_dead')
+                    logger.error(f"Email abandonné après {attempts + 1} essais", extra={
+                        'mail_id': message_id, 'recipient': recipient, 'error_message': str(e)})
+                else:
+                    logger.warning(f"Échec d'envoi d'email, nouvel essai programmé: {e}", extra={
+                        'mail_id': message_id, 'attempts': attempts + 1})
+                continue
+            # Marqué tout de suite : rien à renvoyer si le lot est interrompu ensuite
+            self.store.mark_sent([message_id])
+            self.sent += 1
+            metrics.increment('mail_outbox_sent')
+        return len(rows)
+
+    def stop(self, timeout=10):
+        """Termine le lot en cours puis arrête le thread (arrêt du worker)"""
+        self._stopping = True
+        self._wake.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            thread.join(timeout)
+
+    def stats(self):
+        return {'sent': self.sent, 'failed': self.failed, 'dead': self.dead}
+
+
+outbox_store = OutboxStore()
+
+# Thread d'envoi du worker (setup_mail_outbox), None si la boîte d'envoi est désactivée
+mail_sender = None
+
+
+def setup_mail_outbox(app):
+    """Prépare le thread d'envoi à partir de la configuration Flask-Mail de l'application"""
+    global mail_sender
+    if not MAIL_OUTBOX or not app.config.get('MAIL_SERVER'):
+        return
+    # Même pool que app.mail (PooledMail) : les connexions servent aux deux chemins d'envoi
+    connection = getattr(app.extensions.get('mail'), 'pool', None) or SMTPPool.from_config(app.config)
+    mail_sender = MailOutboxSender(
+        outbox_store,
+        connection,
+        app.config.get('MAIL_DEFAULT_SENDER'),
+        app=app,
+        batch_size=int(os.environ.get('MAIL_BATCH_SIZE', 20)),
+        poll_interval=float(os.environ.get('MAIL_POLL_INTERVAL', 5)),
+        max_attempts=int(os.environ.get('MAIL_MAX_ATTEMPTS', 6)),
+        retry_base=float(os.environ.get('MAIL_RETRY_BASE', 30)),
+        retention_days=int(os.environ.get('MAIL_SENT_RETENTION_DAYS', 7))
+    )
+    mail_sender.start()
+
+
+def outbox_active():
+    """
+    Boîte d'envoi utilisable : activée (MAIL_OUTBOX) et servie par un thread d'envoi dans ce
+    worker. Sans MAIL_SERVER, setup_mail_outbox ne crée pas de thread : un message mis en file
+    ne partirait jamais, l'appelant doit envoyer directement (et constater l'échec).
+    """
+    return MAIL_OUTBOX and mail_sender is not None
+
+
+def enqueue_mail(recipient, subject, html=None, body=None):
+    """
+    Ajoute un email à la boîte d'envoi (dans la transaction en cours s'il y en a une).
+    Vérifier outbox_active() avant : rien n'enverrait le message sinon.
+
+    Returns:
+        bool: True si le message est enregistré.
+    """
+    message_id = outbox_store.enqueue(recipient, subject, html, body)
+    if message_id is None:
+        return False
+    metrics.increment('mail_outbox_queued')
+    if mail_sender is not None:
+        mail_sender.wake()
+    return True
+
+
+def drain_mail_outbox():
+    """Arrête le thread d'envoi après le lot en cours (appelé par le hook worker_exit de gunicorn)"""
+    if mail_sender is not None:
+        mail_sender.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintenance de la boîte d'envoi des emails")
+    parser.add_argument('action', choices=['status', 'retry-dead', 'purge'],
+                        help="status : messages par état ; retry-dead : relancer les messages abandonnés ; "
+                             "purge : supprimer les messages envoyés depuis plus de --days jours")
+    parser.add_argument('--days', type=int, default=int(os.environ.get('MAIL_SENT_RETENTION_DAYS', 7)),
+                        help="Durée de conservation des messages envoyés (purge)")
+    args = parser.parse_args()
+
+    if args.action == 'status':
+        for status, count in sorted(outbox_store.counts().items()):
+            print(f"{status}: {count}")
+    elif args.action == 'purge':
+        purged = purge_sent_mail(outbox_store, args.days)
+        print(f"{purged} message(s) envoyé(s) supprimé(s)")
+    else:
+        print(f"{outbox_store.requeue_dead()} message(s) remis en file")
+
+
+if __name__ == "__main__":
+    main()
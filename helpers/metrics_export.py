@@ -0,0 +1,328 @@
+"""
+Exposition des métriques au format OpenMetrics (/metrics), agrégées entre les workers.
+
+Chaque worker gunicorn a son propre helpers.monitoring.metrics : /health ne montre que celui
+qui a répondu. Avec METRICS_MULTIPROC_DIR (comme le mode multiprocess de Prometheus), chaque
+worker recopie ses métriques toutes les METRICS_FLUSH_INTERVAL secondes dans des fichiers
+mappés en mémoire de ce répertoire (counter_<pid>.db : compteurs et histogrammes,
+gauge_<pid>.db : jauges) ; /metrics additionne les fichiers de tous les workers du conteneur.
+
+- les compteurs d'un worker terminé restent comptés (fichier renommé counter_dead_*, hook
+  child_exit de gunicorn) ; ses jauges sont supprimées ;
+- le répertoire est vidé au démarrage du maître gunicorn (hook on_starting) ;
+- sans METRICS_MULTIPROC_DIR, /metrics n'expose que le worker qui répond.
+
+Les métriques de requêtes sont étiquetées par route (endpoint du blueprint), méthode et
+statut ; les histogrammes de durées sont exposés avec un seau par doublement (0,1 ms à ~2 min).
+/metrics demande l'en-tête « Authorization: Bearer <METRICS_TOKEN> » ou une session admin.
+"""
+import glob
+import hmac
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+
+from flask import Response, current_app, request, session
+
+from .monitoring import TIMER_BUCKETS, Histogram, metrics
+
+logger = logging.getLogger('law_quiz_app.helpers.metrics_export')
+
+METRICS_MULTIPROC_DIR = os.environ.get('METRICS_MULTIPROC_DIR')
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 1))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+METRICS_PREFIX = 'law_quiz_'
+
+CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+# Seaux exposés : un par doublement (TIMER_BUCKETS en compte 8), les cumuls y sont exacts
+EXPORTED_BUCKETS = tuple(range(0, len(TIMER_BUCKETS), 8))
+
+_HEADER = 8  # octets utilisés (uint32) + alignement
+
+
+class MmapedDict:
+    """
+    Dictionnaire clé -> float64 dans un fichier mappé en mémoire, écrit par un seul processus.
+
+    Entrées : longueur de la clé (uint32), clé UTF-8 complétée pour aligner la valeur sur 8
+    octets, valeur (float64). L'en-tête (octets utilisés) n'est avancé qu'une fois l'entrée
+    écrite : un lecteur ne voit jamais d'entrée incomplète.
+    """
+
+    def __init__(self, path, initial_size=1 << 16):
+        self.path = path
+        self._file = open(path, 'a+b')
+        size = os.fstat(self._file.fileno()).st_size
+        if size < initial_size:
+            self._file.truncate(initial_size)
+            size = initial_size
+        self._capacity = size
+        self._map = mmap.mmap(self._file.fileno(), size)
+        self._used = struct.unpack_from('I', self._map, 0)[0] or _HEADER
+        self._positions = {key: position for key, _, position in _entries(self._map, self._used)}
+        self._lock = threading.Lock()
+
+    def write(self, key, value):
+        position = self._positions.get(key)
+        if position is None:
+            with self._lock:
+                position = self._positions.get(key) or self._append(key)
+        struct.pack_into('d', self._map, position, value)
+
+    def _append(self, key):
+        encoded = key.encode('utf-8')
+        padded = encoded + b' ' * (-(len(encoded) + 4) % 8)
+        entry = struct.pack(f'I{len(padded)}sd', len(encoded), padded, 0.0)
+        while self._used + len(entry) > self._capacity:
+            self._capacity *= 2
+            self._file.truncate(self._capacity)
+            self._map.close()
+            self._map = mmap.mmap(self._file.fileno(), self._capacity)
+        start = self._used
+        self._map[start:start + len(entry)] = entry
+        self._used += len(entry)
+        struct.pack_into('I', self._map, 0, self._used)
+        self._positions[key] = start + 4 + len(padded)
+        return self._positions[key]
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    @staticmethod
+    def read(path):
+        """Entrées d'un fichier (lecture simple, sans mmap) : {clé: valeur}"""
+        with open(path, 'rb') as f:
+            data = f.read()
+        if len(data) < _HEADER:
+            return {}
+        used = struct.unpack_from('I', data, 0)[0]
+        return {key: value for key, value, _ in _entries(data, used)}
+
+
+def _entries(data, used):
+    position = _HEADER
+    while position < used:
+        length = struct.unpack_from('I', data, position)[0]
+        key = bytes(data[position + 4:position + 4 + length]).decode('utf-8')
+        value_position = position + 4 + length + (-(length + 4) % 8)
+        yield key, struct.unpack_from('d', data, value_position)[0], value_position
+        position = value_position + 8
+
+
+def flat_samples(collector=metrics):
+    """
+    Métriques d'un collecteur à plat, comme dans les fichiers : ({clé: valeur} des
+    compteurs et histogrammes, {clé: valeur} des jauges). Clé : JSON [type, nom, tags, suffixe].
+    """
+    counters, gauges, histograms = collector.snapshot()
+    counter_samples = {}
+    for key, value in counters.items():
+        name, tags = key.split(':', 1)
+        counter_samples[json.dumps(['c', name, tags, ''])] = value
+    for key, histogram in histograms.items():
+        name, tags = key.split(':', 1)
+        counter_samples[json.dumps(['h', name, tags, 'count'])] = histogram.count
+        counter_samples[json.dumps(['h', name, tags, 'sum'])] = histogram.sum
+        for index, count in enumerate(histogram.counts):
+            if count:
+                counter_samples[json.dumps(['h', name, tags, index])] = count
+    gauge_samples = {}
+    for key, value in gauges.items():
+        name, tags = key.split(':', 1)
+        if isinstance(value, (int, float)):
+            gauge_samples[json.dumps(['g', name, tags, ''])] = value
+    return counter_samples, gauge_samples
+
+
+class MetricsFlusher:
+    """Thread qui recopie les métriques du worker dans ses fichiers de METRICS_MULTIPROC_DIR"""
+
+    def __init__(self, directory, collector=metrics, interval=1.0, pid=None):
+        self.directory = directory
+        self.collector = collector
+        self.interval = interval
+        self.pid = pid or os.getpid()
+        self._counters = None
+        self._gauges = None
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def flush(self):
+        """Écrit les valeurs courantes (cumuls : un fichier n'est jamais relu par son worker)"""
+        counter_samples, gauge_samples = flat_samples(self.collector)
+        with self._lock:
+            if self._counters is None:
+                os.makedirs(self.directory, exist_ok=True)
+                self._counters = MmapedDict(os.path.join(self.directory, f'counter_{self.pid}.db'))
+                self._gauges = MmapedDict(os.path.join(self.directory, f'gauge_{self.pid}.db'))
+            for key, value in counter_samples.items():
+                self._counters.write(key, value)
+            for key, value in gauge_samples.items():
+                self._gauges.write(key, value)
+
+    def start(self):
+        # Démarrage dans le worker (hook post_worker_init de gunicorn), après le fork
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='metrics-flusher', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Écriture des métriques impossible: {e}", exc_info=True)
+
+    def stop(self):
+        """Dernière écriture puis arrêt (hook worker_exit de gunicorn)"""
+        self._stopping.set()
+        self.flush()
+
+
+# Écriture des métriques de ce worker, None sans METRICS_MULTIPROC_DIR
+metrics_flusher = MetricsFlusher(METRICS_MULTIPROC_DIR, interval=METRICS_FLUSH_INTERVAL) if METRICS_MULTIPROC_DIR else None
+
+
+def start_metrics_flusher():
+    if metrics_flusher is not None:
+        metrics_flusher.pid = os.getpid()
+        metrics_flusher.start()
+
+
+def stop_metrics_flusher():
+    if metrics_flusher is not None:
+        metrics_flusher.stop()
+
+
+def clear_multiproc_dir(directory=METRICS_MULTIPROC_DIR):
+    """Supprime les fichiers d'une exécution précédente (hook on_starting de gunicorn)"""
+    if directory:
+        for path in glob.glob(os.path.join(directory, '*.db')):
+            os.remove(path)
+
+
+def mark_process_dead(pid, directory=METRICS_MULTIPROC_DIR):
+    """Worker terminé : ses jauges disparaissent, ses compteurs restent comptés (hook child_exit)"""
+    if not directory:
+        return
+    gauge_path = os.path.join(directory, f'gauge_{pid}.db')
+    if os.path.exists(gauge_path):
+        os.remove(gauge_path)
+    counter_path = os.path.join(directory, f'counter_{pid}.db')
+    if os.path.exists(counter_path):
+        # Renommé : un futur worker de même pid repartira d'un fichier vide
+        os.rename(counter_path, os.path.join(directory, f'counter_dead_{pid}_{time.time_ns()}.db'))
+
+
+def collect_samples(directory=METRICS_MULTIPROC_DIR, collector=metrics):
+    """Valeurs additionnées sur tous les workers (ou ce seul worker sans répertoire partagé)"""
+    if not directory:
+        counter_samples, gauge_samples = flat_samples(collector)
+        return {**counter_samples, **gauge_samples}
+    if metrics_flusher is not None:
+        metrics_flusher.flush()  # ce worker à jour, les autres à METRICS_FLUSH_INTERVAL près
+    totals = {}
+    for path in glob.glob(os.path.join(directory, 'counter_*.db')) + glob.glob(os.path.join(directory, 'gauge_*.db')):
+        try:
+            samples = MmapedDict.read(path)
+        except (OSError, struct.error) as e:
+            logger.warning(f"Fichier de métriques illisible {path}: {e}")
+            continue
+        for key, value in samples.items():
+            totals[key] = totals.get(key, 0) + value
+    return totals
+
+
+def parse_tags(tags):
+    """Étiquettes OpenMetrics d'une chaîne de tags : "k=v,k=v", sinon {'tag': tags}"""
+    if not tags:
+        return {}
+    if '=' not in tags:
+        return {'tag': tags}
+    return dict(part.split('=', 1) for part in tags.split(',') if '=' in part)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in sorted(labels.items())) + '}'
+
+
+def _number(value):
+    return repr(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render_openmetrics(samples):
+    """Texte OpenMetrics à partir des valeurs à plat de collect_samples()"""
+    families = {}
+    histograms = {}
+    for key, value in samples.items():
+        kind, name, tags, suffix = json.loads(key)
+        if kind == 'h':
+            histogram = histograms.setdefault((name, tags), Histogram())
+            if suffix == 'count':
+                histogram.count = int(value)
+            elif suffix == 'sum':
+                histogram.sum = value
+            else:
+                histogram.counts[suffix] = int(value)
+        else:
+            families.setdefault((kind, name), []).append((parse_tags(tags), value))
+
+    lines = []
+    for (kind, name), series in sorted(families.items()):
+        family = METRICS_PREFIX + name
+        if kind == 'c':
+            lines.append(f'# TYPE {family} counter')
+            lines.extend(f'{family}_total{_labels(labels)} {_number(value)}' for labels, value in sorted(series, key=str))
+        else:
+            lines.append(f'# TYPE {family} gauge')
+            lines.extend(f'{family}{_labels(labels)} {_number(value)}' for labels, value in sorted(series, key=str))
+
+    by_family = {}
+    for (name, tags), histogram in histograms.items():
+        base = name[:-len('_duration')] if name.endswith('_duration') else name
+        by_family.setdefault(METRICS_PREFIX + base + '_seconds', []).append((parse_tags(tags), histogram))
+    for family, series in sorted(by_family.items()):
+        lines.append(f'# TYPE {family} histogram')
+        lines.append(f'# UNIT {family} seconds')
+        for labels, histogram in sorted(series, key=lambda item: str(item[0])):
+            cumulative = 0
+            previous = 0
+            for index in EXPORTED_BUCKETS:
+                cumulative += sum(histogram.counts[previous:index + 1])
+                previous = index + 1
+                lines.append(f'{family}_bucket{_labels({**labels, "le": f"{TIMER_BUCKETS[index]:.6g}"})} {cumulative}')
+            lines.append(f'{family}_bucket{_labels({**labels, "le": "+Inf"})} {histogram.count}')
+            lines.append(f'{family}_count{_labels(labels)} {histogram.count}')
+            lines.append(f'{family}_sum{_labels(labels)} {_number(histogram.sum)}')
+    lines.append('# EOF')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_authorized():
+    """Jeton de collecte (METRICS_TOKEN) ou session de l'administrateur"""
+    header = request.headers.get('Authorization', '')
+    if METRICS_TOKEN and hmac.compare_digest(header.encode(), f'Bearer {METRICS_TOKEN}'.encode()):
+        return True
+    admin_id = current_app.config.get('ADMIN_USER_ID')
+    return bool(admin_id) and str(session.get('user_id')) == str(admin_id)
+
+
+def metrics_response():
+    """Réponse de /metrics"""
+    if not metrics_authorized():
+        return Response('Accès refusé\n', status=401, mimetype='text/plain',
+                        headers={'WWW-Authenticate': 'Bearer'})
+    return Response(render_openmetrics(collect_samples()), content_type=CONTENT_TYPE)
@@ -1,11 +1,17 @@
 """
 Système de monitoring et logging pour l'application Flask
 """
+import atexit
+import copy
 import logging
+import logging.handlers
 import os
+import queue
 import sys
+import threading
 import time
 import traceback
+from bisect import bisect_left
 from datetime import datetime
 from functools import wraps
 from flask import request, session, current_app, g
@@ -32,6 +38,26 @@ class ColoredFormatter(logging.Formatter):
         return super().format(record)
 
 
+def request_log_context():
+    """Champs de la requête en cours ajoutés aux logs JSON"""
+    return {
+        'request_id': getattr(g, 'request_id', None),
+        'user_id': session.get('user_id'),
+        'ip': request.remote_addr,
+        'method': request.method,
+        'url': request.url,
+        'user_agent': request.headers.get('User-Agent')
+    }
+
+
+def exception_log_data(exc_info):
+    return {
+        'type': exc_info[0].__name__,
+        'message': str(exc_info[1]),
+        'traceback': traceback.format_exception(*exc_info)
+    }
+
+
 class JSONFormatter(logging.Formatter):
     """Formatter JSON pour les logs en production"""
     
@@ -45,30 +71,216 @@ class JSONFormatter(logging.Formatter):
             'line': record.lineno
         }
         
-        # Ajouter des infos de requête si disponibles
-        if request:
-            log_data.update({
-                'request_id': getattr(g, 'request_id', None),
-                'user_id': session.get('user_id'),
-                'ip': request.remote_addr,
-                'method': request.method,
-                'url': request.url,
-                'user_agent': request.headers.get('User-Agent')
-            })
+        # Ajouter des infos de requête : relevées dans le thread de la requête quand le log
+        # passe par la file (QueuedLogHandler), lues directement sinon
+        context = getattr(record, 'request_context', None)
+        if context is None and request:
+            context = request_log_context()
+        if context:
+            log_data.update(context)
         
         # Ajouter les données d'exception si présentes
-        if record.exc_info:
-            log_data['exception'] = {
-                'type': record.exc_info[0].__name__,
-                'message': str(record.exc_info[1]),
-                'traceback': traceback.format_exception(*record.exc_info)
-            }
+        exception = getattr(record, 'exception_data', None)
+        if exception is None and record.exc_info:
+            exception = exception_log_data(record.exc_info)
+        if exception:
+            log_data['exception'] = exception
         
         return json.dumps(log_data)
 
 
-def setup_logging(app):
-    """Configure le système de logging selon l'environnement"""
+# Logs de production : mis en file par le thread de la requête, écrits par un thread dédié
+LOG_ASYNC = os.environ.get('LOG_ASYNC', '1') == '1'
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+LOG_MAX_BYTES = int(os.environ.get('LOG_MAX_BYTES', 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.environ.get('LOG_BACKUP_COUNT', 5))
+LOG_ROTATE_WHEN = os.environ.get('LOG_ROTATE_WHEN', '')
+
+
+class _ReopenAfterRotation:
+    """Plusieurs workers écrivent le même fichier : si un autre l'a déjà fait tourner,
+    on rouvre le nouveau fichier au lieu de refaire la rotation (qui écraserait la sienne)"""
+
+    _checked_at = 0.0
+
+    def _rotated_elsewhere(self):
+        if self.stream is None:
+            return False
+        try:
+            return os.stat(self.baseFilename).st_ino != os.fstat(self.stream.fileno()).st_ino
+        except FileNotFoundError:
+            return True
+
+    def _reopen(self):
+        self.stream.close()
+        self.stream = self._open()
+
+    def emit(self, record):
+        # Au plus un stat() par seconde pour suivre une rotation faite par un autre worker
+        now = time.monotonic()
+        if now - self._checked_at >= 1:
+            self._checked_at = now
+            if self._rotated_elsewhere():
+                self._reopen()
+        super().emit(record)
+
+    def doRollover(self):
+        if self._rotated_elsewhere():
+            self._reopen()
+            if hasattr(self, 'computeRollover'):
+                self.rolloverAt = self.computeRollover(int(time.time()))
+            return
+        super().doRollover()
+
+
+class RotatingLogFileHandler(_ReopenAfterRotation, logging.handlers.RotatingFileHandler):
+    """Rotation par taille (LOG_MAX_BYTES), partagée entre workers"""
+
+
+class TimedRotatingLogFileHandler(_ReopenAfterRotation, logging.handlers.TimedRotatingFileHandler):
+    """Rotation par date (LOG_ROTATE_WHEN, ex. 'midnight'), partagée entre workers"""
+
+
+def log_file_handler(path, level):
+    """Handler de fichier JSON avec rotation par date si LOG_ROTATE_WHEN, par taille sinon"""
+    if LOG_ROTATE_WHEN:
+        handler = TimedRotatingLogFileHandler(path, when=LOG_ROTATE_WHEN, backupCount=LOG_BACKUP_COUNT,
+                                              encoding='utf-8')
+    else:
+        handler = RotatingLogFileHandler(path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT,
+                                         encoding='utf-8')
+    handler.setLevel(level)
+    handler.setFormatter(JSONFormatter())
+    return handler
+
+
+class _LogListener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # File pleine à l'arrêt : attendre une place plutôt que lever queue.Full
+        self.queue.put(self._sentinel, timeout=5)
+
+
+class QueuedLogHandler(logging.handlers.QueueHandler):
+    """Met les logs dans une file bornée ; un thread (QueueListener) les formate et les écrit.
+
+    Le thread de la requête ne fait que relever le message, le contexte de la requête et
+    l'exception éventuelle : le JSON, l'écriture et la rotation des fichiers se font ailleurs.
+    File pleine : les erreurs attendent block_timeout secondes une place, les autres logs
+    sont abandonnés, comptés par niveau (log_records_dropped) et signalés dans le fichier
+    dès qu'il y a de nouveau de la place.
+    """
+
+    def __init__(self, handlers, maxsize=LOG_QUEUE_SIZE, block_timeout=0.05):
+        super().__init__(queue.Queue(maxsize=maxsize))
+        self.handlers = list(handlers)
+        self.maxsize = maxsize
+        self.block_timeout = block_timeout
+        self.listener = None
+        self.dropped = {}  # niveau -> logs abandonnés
+        self._unreported = 0
+        self._pid = None
+        self._stopped = False
+
+    def _start(self):
+        # Démarrage paresseux : le thread naît dans le worker, après le fork de gunicorn,
+        # avec une file neuve (celle du processus parent n'est plus vidée par personne)
+        self.queue = queue.Queue(maxsize=self.maxsize)
+        self.listener = _LogListener(self.queue, *self.handlers, respect_handler_level=True)
+        self.listener.start()
+        self._pid = os.getpid()
+        self._stopped = False
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if request:
+            record.request_context = request_log_context()
+        if record.exc_info:
+            record.exception_data = exception_log_data(record.exc_info)
+            record.exc_info, record.exc_text = None, None
+        return record
+
+    def emit(self, record):
+        if self._pid != os.getpid():
+            self._start()
+        elif self._stopped:
+            # Après stop() (fin du worker) : écriture directe
+            for handler in self.handlers:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+            return
+        super().emit(record)
+
+    def enqueue(self, record):
+        if self._unreported:
+            self._report_dropped()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if record.levelno >= logging.ERROR and self.block_timeout > 0:
+                try:
+                    self.queue.put(record, timeout=self.block_timeout)
+                    return
+                except queue.Full:
+                    pass
+            self.dropped[record.levelname] = self.dropped.get(record.levelname, 0) + 1
+            self._unreported += 1
+            metrics.increment('log_records_dropped', tags=f"level={record.levelname}")
+
+    def _report_dropped(self):
+        record = logging.LogRecord('law_quiz_app.logging', logging.WARNING, __file__, 0,
+                                   "%d logs abandonnés (file de logs pleine)", (self._unreported,), None)
+        try:
+            self.queue.put_nowait(record)
+            self._unreported = 0
+        except queue.Full:
+            pass
+
+    def stop(self):
+        """Écrit les logs encore en file et arrête le thread (fin du worker)"""
+        if self.listener is not None and self._pid == os.getpid() and not self._stopped:
+            self._stopped = True
+            self.listener.stop()
+
+    def close(self):
+        self.stop()
+        for handler in self.handlers:
+            handler.close()
+        super().close()
+
+    def stats(self):
+        return {
+            'queued': self.queue.qsize(),
+            'queue_size': self.maxsize,
+            'dropped': dict(self.dropped),
+            'running': self.listener is not None and self._pid == os.getpid() and not self._stopped
+        }
+
+
+log_handler = None
+
+
+def stop_logging():
+    """Vide la file de logs (fin du worker gunicorn, sortie du processus)"""
+    if log_handler is not None:
+        log_handler.stop()
+
+
+def logging_status():
+    """État de la file de logs, None si les logs sont écrits directement"""
+    return log_handler.stats() if log_handler is not None else None
+
+
+atexit.register(stop_logging)
+
+
+def setup_logging(app, queued=None):
+    """Configure le système de logging selon l'environnement
+
+    queued : file + thread d'écriture en production (LOG_ASYNC par défaut)
+    """
+    global log_handler
     
     # Niveau de log selon l'environnement
     log_level = logging.DEBUG if app.debug else logging.INFO
@@ -84,6 +296,9 @@ def setup_logging(app):
     # Supprimer les handlers existants
     for handler in logger.handlers[:]:
         logger.removeHandler(handler)
+    if log_handler is not None:
+        log_handler.close()
+        log_handler = None
     
     if app.debug:
         # Mode développement : logs colorés dans la console
@@ -94,19 +309,22 @@ def setup_logging(app):
         ))
         logger.addHandler(console_handler)
     else:
-        # Mode production : logs JSON dans des fichiers
-        
-        # Handler pour les logs généraux
-        file_handler = logging.FileHandler(os.path.join(log_dir, 'app.log'))
-        file_handler.setLevel(logging.INFO)
-        file_handler.setFormatter(JSONFormatter())
-        logger.addHandler(file_handler)
-        
-        # Handler séparé pour les erreurs
-        error_handler = logging.FileHandler(os.path.join(log_dir, 'errors.log'))
-        error_handler.setLevel(logging.ERROR)
-        error_handler.setFormatter(JSONFormatter())
-        logger.addHandler(error_handler)
+        # Mode production : logs JSON dans des fichiers, avec rotation
+        handlers = [
+            # Handler pour les logs généraux
+            log_file_handler(os.path.join(log_dir, 'app.log'), logging.INFO),
+            # Handler séparé pour les erreurs
+            log_file_handler(os.path.join(log_dir, 'errors.log'), logging.ERROR),
+        ]
+        if queued is None:
+            queued = LOG_ASYNC
+        if queued:
+            # Écriture dans un thread dédié : la requête n'attend pas le disque
+            log_handler = QueuedLogHandler(handlers)
+            logger.addHandler(log_handler)
+        else:
+            for handler in handlers:
+                logger.addHandler(handler)
     
     # Logger spécifique pour l'application
     app_logger = logging.getLogger('law_quiz_app')
@@ -181,36 +399,194 @@ def log_security_event(event_type, details=None):
     logger.warning(f"Security event: {event_type}", extra=log_data)
 
 
+# Bornes (secondes) des histogrammes de durées : progression géométrique de 0,1 ms à ~2 min,
+# 8 seaux par doublement (erreur relative des percentiles < 5 %), comme un histogramme HDR
+TIMER_BUCKETS = tuple(0.0001 * 2 ** (i / 8) for i in range(8 * 20 + 1))
+
+
+class Histogram:
+    """Histogramme à seaux fixes : mémoire constante quel que soit le nombre de valeurs"""
+    
+    __slots__ = ('bounds', 'counts', 'count', 'sum', 'min', 'max')
+    
+    def __init__(self, bounds=TIMER_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # dernier seau : au-delà de la dernière borne
+        self.count = 0
+        self.sum = 0.0
+        self.min = float('inf')
+        self.max = float('-inf')
+    
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+    
+    def percentile(self, q):
+        """Valeur sous laquelle tombent q % des observations (interpolée dans le seau)"""
+        if not self.count:
+            return None
+        rank = q / 100 * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.bounds[index - 1] if index > 0 else 0.0
+                upper = self.bounds[index] if index < len(self.bounds) else self.max
+                value = lower + (upper - lower) * (rank - seen) / count
+                return min(max(value, self.min), self.max)
+            seen += count
+        return self.max
+    
+    def merge(self, other):
+        """Ajoute les observations d'un autre histogramme (mêmes bornes)"""
+        for index, count in enumerate(list(other.counts)):
+            self.counts[index] += count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+    
+    def copy(self):
+        other = Histogram(self.bounds)
+        other.counts = list(self.counts)
+        other.count, other.sum, other.min, other.max = self.count, self.sum, self.min, self.max
+        return other
+    
+    def summary(self):
+        """Résumé pour /health : nombre, moyenne, extrêmes et percentiles"""
+        if not self.count:
+            return {'count': 0}
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'mean': round(self.sum / self.count, 6),
+            'min': round(self.min, 6),
+            'max': round(self.max, 6),
+            'p50': round(self.percentile(50), 6),
+            'p95': round(self.percentile(95), 6),
+            'p99': round(self.percentile(99), 6),
+        }
+
+
+class _MetricsShard:
+    """Compteurs et histogrammes d'un thread : modifiés par ce seul thread, sans verrou"""
+    
+    __slots__ = ('counters', 'histograms')
+    
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+    
+    def merge_into(self, counters, histograms):
+        # dict(...) et list(...) sont des copies atomiques sous le GIL : pas de verrou côté écriture
+        for key, value in dict(self.counters).items():
+            counters[key] = counters.get(key, 0) + value
+        for key, histogram in dict(self.histograms).items():
+            if key in histograms:
+                histograms[key].merge(histogram)
+            else:
+                histograms[key] = histogram.copy()
+
+
 class MetricsCollector:
-    """Collecteur de métriques pour le monitoring"""
+    """
+    Collecteur de métriques pour le monitoring.
+    
+    Compteurs, jauges et histogrammes de durées par clé "nom:tags". Les durées ne sont pas
+    conservées une à une (une liste par timer grossissait sans fin dans un worker gunicorn) :
+    chaque timer est un Histogram de taille fixe, d'où p50/p95/p99.
+    
+    Les écritures ne prennent pas de verrou : chaque thread (workers gthread, threads
+    d'arrière-plan) a ses propres compteurs et histogrammes, additionnés à la lecture
+    (get_metrics). Les jauges sont une simple affectation dans un dictionnaire partagé.
+    """
     
     def __init__(self):
-        self.metrics = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()  # registre des shards, pris à la création et à la lecture
+        self._shards = []              # (thread, shard)
+        self._retired = _MetricsShard()  # totaux des threads terminés
+        self._gauges = {}
     
-    def increment(self, metric_name, tags=None):
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = _MetricsShard()
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+            return shard
+    
+    def increment(self, metric_name, tags=None, value=1):
         """Incrémenter une métrique"""
         key = f"{metric_name}:{tags or ''}"
-        self.metrics[key] = self.metrics.get(key, 0) + 1
+        counters = self._shard().counters
+        counters[key] = counters.get(key, 0) + value
     
     def gauge(self, metric_name, value, tags=None):
         """Définir une valeur de métrique"""
-        key = f"{metric_name}:{tags or ''}"
-        self.metrics[key] = value
+        self._gauges[f"{metric_name}:{tags or ''}"] = value
     
     def timer(self, metric_name, duration, tags=None):
         """Enregistrer une durée"""
         key = f"{metric_name}_duration:{tags or ''}"
-        if key not in self.metrics:
-            self.metrics[key] = []
-        self.metrics[key].append(duration)
+        histograms = self._shard().histograms
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = Histogram()
+        histogram.observe(duration)
+    
+    def _collect(self):
+        """Totaux de tous les threads : (compteurs, histogrammes)"""
+        counters, histograms = {}, {}
+        with self._lock:
+            # Les shards des threads terminés sont versés dans les totaux et oubliés
+            alive = []
+            for thread, shard in self._shards:
+                if thread.is_alive():
+                    alive.append((thread, shard))
+                else:
+                    shard.merge_into(self._retired.counters, self._retired.histograms)
+            self._shards = alive
+            self._retired.merge_into(counters, histograms)
+            for _, shard in alive:
+                shard.merge_into(counters, histograms)
+        return counters, histograms
+    
+    def histogram(self, metric_name, tags=None):
+        """Histogramme d'un timer, tous threads confondus (None s'il n'a rien enregistré)"""
+        return self._collect()[1].get(f"{metric_name}_duration:{tags or ''}")
+    
+    def percentiles(self, metric_name, tags=None, quantiles=(50, 95, 99)):
+        """Percentiles d'un timer, en secondes : {50: ..., 95: ..., 99: ...}"""
+        histogram = self.histogram(metric_name, tags)
+        return {q: histogram.percentile(q) if histogram else None for q in quantiles}
+    
+    def snapshot(self):
+        """Valeurs brutes, tous threads confondus : (compteurs, jauges, histogrammes)"""
+        counters, histograms = self._collect()
+        return counters, dict(self._gauges), histograms
     
     def get_metrics(self):
-        """Récupérer toutes les métriques"""
-        return self.metrics.copy()
+        """Récupérer toutes les métriques (résumé des histogrammes pour les timers)"""
+        counters, histograms = self._collect()
+        values = dict(self._gauges)
+        values.update(counters)
+        values.update({key: histogram.summary() for key, histogram in histograms.items()})
+        return values
     
     def reset(self):
         """Reset toutes les métriques"""
-        self.metrics.clear()
+        with self._lock:
+            for _, shard in self._shards:
+                shard.counters.clear()
+                shard.histograms.clear()
+            self._retired = _MetricsShard()
+        self._gauges.clear()
 
 
 # Instance globale du collecteur de métriques
@@ -265,61 +641,109 @@ def setup_request_monitoring(app):
         g.start_time = time.time()
         g.request_id = f"{time.time()}_{os.getpid()}"
         
-        # Log de la requête entrante
-        logger.debug(f"Request: {request.method} {request.url}", extra={
-            'request_id': g.request_id,
-            'method': request.method,
-            'url': request.url,
-            'user_id': session.get('user_id'),
-            'ip': request.remote_addr
-        })
+        # Log de la requête entrante (arguments construits seulement si le niveau DEBUG est actif :
+        # session.get() chargerait la session à chaque requête)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Request: {request.method} {request.url}", extra={
+                'request_id': g.request_id,
+                'method': request.method,
+                'url': request.url,
+                'user_id': session.get('user_id'),
+                'ip': request.remote_addr
+            })
+    
+    from helpers.core import request_db_stats
+    # En-tête X-DB-Stats sur chaque réponse (DB_STATS_HEADER=1, ou mode debug)
+    db_stats_header = os.environ.get('DB_STATS_HEADER', '0') == '1' or app.debug
     
     @app.after_request
     def after_request(response):
         duration = time.time() - g.start_time
+        db = request_db_stats()
         
         # Log de la réponse
-        logger.info(f"Response: {response.status_code} in {duration:.3f}s", extra={
+        logger.info(f"Response: {response.status_code} in {duration:.3f}s "
+                    f"({db.statements} SQL, {db.time * 1000:.1f}ms, {db.rows} rows)", extra={
             'request_id': g.request_id,
             'status_code': response.status_code,
             'duration': duration,
+            'endpoint': request.endpoint,
+            'db_statements': db.statements,
+            'db_time': db.time,
+            'db_rows': db.rows,
             'user_id': session.get('user_id')
         })
         
-        # Métriques
-        metrics.increment('http_requests', tags=f"status_{response.status_code}")
-        metrics.timer('request_duration', duration)
+        # Métriques, par route (endpoint du blueprint), méthode et statut : /metrics les expose
+        # avec ces étiquettes
+        tags = f"endpoint={request.endpoint or 'none'},method={request.method},status={response.status_code}"
+        metrics.increment('http_requests', tags=tags)
+        metrics.timer('request_duration', duration, tags=tags)
+        if db.statements:
+            metrics.increment('db_statements', tags=tags, value=db.statements)
+            metrics.increment('db_rows', tags=tags, value=db.rows)
+            metrics.timer('request_db', db.time, tags=tags)
+        
+        if db_stats_header:
+            response.headers['X-DB-Stats'] = f"statements={db.statements}; time_ms={db.time * 1000:.3f}; rows={db.rows}"
         
         return response
 
 
 def health_check():
     """Endpoint de health check pour le monitoring"""
-    from helpers import get_connection
+    from helpers.core import get_connection, return_connection, pool_status
     
     status = {'status': 'healthy', 'timestamp': datetime.utcnow().isoformat()}
     
     try:
         # Test de connexion à la base de données
         conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT 1")
-        cursor.fetchone()
-        cursor.close()
-        conn.close()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+        finally:
+            # Rendre la connexion au pool (la fermer ferait perdre une place au pool)
+            return_connection(conn)
         status['database'] = 'healthy'
     except Exception as e:
         status['database'] = 'unhealthy'
         status['database_error'] = str(e)
         status['status'] = 'degraded'
     
+    # Occupation du pool de connexions
+    status['database_pool'] = pool_status()
+    
     try:
-        # Plus de Redis - cache désactivé
-        status['cache'] = 'disabled'
+        # Cache des contenus de quiz (LRU local, Redis optionnel)
+        from helpers.cache import cache_status
+        status['cache'] = cache_status()
     except Exception as e:
         status['cache'] = 'unhealthy'
         status['cache_error'] = str(e)
     
+    # File d'écriture différée des résultats de quiz (si activée)
+    from helpers.stats_queue import stats_write_behind
+    if stats_write_behind is not None:
+        status['stats_write_behind'] = stats_write_behind.stats()
+    
+    # Limitation de débit des connexions
+    from helpers.ratelimit import login_rate_status
+    status['login_rate_limit'] = login_rate_status()
+    
+    # Connexions SMTP réutilisées (app.mail)
+    from helpers.smtp import smtp_pool_status
+    smtp_pool = smtp_pool_status()
+    if smtp_pool is not None:
+        status['smtp_pool'] = smtp_pool
+    
+    # File des logs de production (si écrits par un thread dédié)
+    log_queue = logging_status()
+    if log_queue is not None:
+        status['logging'] = log_queue
+    
     # Ajouter les métriques
     status['metrics'] = metrics.get_metrics()
     
@@ -0,0 +1,144 @@
+"""
+Hachage des mots de passe hors du thread de la requête.
+
+scrypt et pbkdf2 sont volontairement coûteux : exécutés dans le worker gunicorn (synchrone,
+un seul thread), une rafale de connexions bloque chaque worker le temps des hachages. Ici le
+calcul part dans un pool de processus borné, qui peut occuper tous les cœurs :
+
+- PASSWORD_HASH_METHOD : méthode et coût au format werkzeug (par défaut "scrypt", soit
+  scrypt:32768:8:1 ; par exemple "pbkdf2:sha256:600000") ;
+- PASSWORD_HASH_WORKERS : processus de hachage par worker gunicorn (par défaut les cœurs
+  partagés entre les WEB_CONCURRENCY workers gunicorn, au moins un ; 0 : hachage dans le
+  thread de la requête, comme avant) ;
+- PASSWORD_HASH_MAX_PENDING et PASSWORD_HASH_TIMEOUT : hachages en cours ou en attente au plus
+  par worker, et attente maximale d'une place (secondes). Au-delà, la requête reçoit une 503
+  plutôt que d'allonger la file.
+
+Les hachages existants restent valides quand la méthode change : needs_rehash() signale à la
+connexion ceux qui ne suivent plus la configuration, et la route les remplace.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.exceptions import ServiceUnavailable
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from .monitoring import metrics
+
+logger = logging.getLogger('law_quiz_app.helpers.passwords')
+
+
+class PasswordHasherBusy(ServiceUnavailable):
+    """Trop de hachages en attente dans ce worker (rendu en 503 par Flask)"""
+    description = "Le serveur est très sollicité, réessayez dans quelques instants"
+
+
+def hash_method(password_hash):
+    """Méthode et coût d'un hachage werkzeug ("scrypt:32768:8:1$sel$hachage" -> "scrypt:32768:8:1")"""
+    return password_hash.split('$', 1)[0] if password_hash else None
+
+
+def default_hash_workers():
+    """Cœurs partagés entre les workers gunicorn (WEB_CONCURRENCY) : chaque worker a son pool"""
+    web_workers = int(os.environ.get('WEB_CONCURRENCY') or 1)
+    return max(1, (os.cpu_count() or 1) // max(web_workers, 1))
+
+
+class PasswordHasher:
+    """Hachage et vérification des mots de passe dans un pool de processus borné"""
+
+    def __init__(self, method='scrypt', workers=None, max_pending=None, timeout=5):
+        self.method = method
+        self.workers = default_hash_workers() if workers is None else workers
+        self.max_pending = max_pending or max(self.workers, 1) * 4
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor = None
+        self._lock = threading.Lock()
+        self._configured_method = None
+        self.rejected = 0
+
+    def _get_executor(self):
+        # Création paresseuse : le pool naît dans le worker gunicorn, après le fork. Les
+        # processus de hachage sont lancés par spawn (un fork d'un worker qui a déjà des
+        # threads peut hériter d'un verrou pris).
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+            return self._executor
+
+    def _run(self, function, *args):
+        if not self.workers:
+            return function(*args)
+        if not self._slots.acquire(timeout=self.timeout):
+            self.rejected += 1
+            metrics.increment('password_hash_rejected')
+            raise PasswordHasherBusy()
+        try:
+            return self._get_executor().submit(function, *args).result()
+        except BrokenProcessPool:
+            # Un processus de hachage a disparu (OOM par exemple) : nouveau pool au prochain appel
+            logger.error("Pool de hachage des mots de passe interrompu, calcul dans le worker")
+            with self._lock:
+                self._executor = None
+            return function(*args)
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        """Hache un mot de passe avec la méthode configurée"""
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        """Vérifie un mot de passe, quelle que soit la méthode de son hachage"""
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """True si le hachage n'utilise pas la méthode et le coût configurés"""
+        if self._configured_method is None:
+            # "scrypt" ou "pbkdf2" seuls prennent les paramètres par défaut de werkzeug : le plus
+            # sûr pour les connaître est de hacher une fois (résultat gardé)
+            self._configured_method = hash_method(generate_password_hash('', self.method))
+        return hash_method(password_hash) != self._configured_method
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def stats(self):
+        return {
+            'method': self.method,
+            'workers': self.workers,
+            'max_pending': self.max_pending,
+            'rejected': self.rejected
+        }
+
+
+password_hasher = PasswordHasher(
+    method=os.environ.get('PASSWORD_HASH_METHOD', 'scrypt'),
+    workers=int(os.environ['PASSWORD_HASH_WORKERS']) if 'PASSWORD_HASH_WORKERS' in os.environ else None,
+    max_pending=int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 0)) or None,
+    timeout=float(os.environ.get('PASSWORD_HASH_TIMEOUT', 5))
+)
+
+
+def hash_password(password):
+    """Hache un mot de passe (méthode PASSWORD_HASH_METHOD)"""
+    return password_hasher.hash(password)
+
+
+def verify_password(password_hash, password):
+    """Vérifie un mot de passe contre son hachage"""
+    return password_hasher.verify(password_hash, password)
+
+
+def needs_rehash(password_hash):
+    """True si le hachage doit être refait avec la méthode configurée (à la prochaine connexion)"""
+    return password_hasher.needs_rehash(password_hash)
@@ -0,0 +1,186 @@
+"""
+Pool de connexions PostgreSQL borné et observable.
+
+psycopg2.pool.ThreadedConnectionPool lève PoolError dès que maxconn connexions sont
+empruntées : une rafale de requêtes se traduisait par des pages d'erreur. BoundedConnectionPool
+enveloppe ce pool et ajoute :
+- une attente bornée : au-delà de maxconn, l'emprunt attend qu'une connexion soit rendue,
+  au plus checkout_timeout secondes, puis lève PoolTimeout ;
+- le recyclage : une connexion inutilisée depuis plus de max_idle secondes, ouverte depuis
+  plus de max_lifetime secondes ou fermée par le serveur est remplacée à l'emprunt ;
+- des statistiques (connexions empruntées, libres, attentes, épuisements, histogramme des
+  temps d'attente), publiées dans helpers.monitoring.metrics et /health.
+
+La taille se règle par la configuration de l'application ou l'environnement (DB_POOL_MIN,
+DB_POOL_MAX, DB_POOL_TIMEOUT, DB_POOL_MAX_IDLE, DB_POOL_MAX_LIFETIME). Chaque worker gunicorn
+a son propre pool : workers × DB_POOL_MAX doit rester sous max_connections de PostgreSQL.
+"""
+import logging
+import os
+import threading
+import time
+import weakref
+
+from psycopg2.pool import PoolError
+
+from .monitoring import metrics
+
+logger = logging.getLogger('law_quiz_app.helpers.pool')
+
+# Bornes (secondes) de l'histogramme des temps d'attente à l'emprunt
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+class PoolTimeout(PoolError):
+    """Aucune connexion n'a été rendue au pool dans le délai imparti"""
+
+
+def pool_settings(config=None):
+    """
+    Paramètres du pool : configuration de l'application, sinon environnement, sinon défauts.
+
+    Args:
+        config (Mapping, optional): Configuration Flask (clés DB_POOL_*).
+    """
+    config = config or {}
+
+    def setting(name, default, cast):
+        value = config.get(name, os.environ.get(name))
+        return cast(value) if value not in (None, '') else default
+
+    return {
+        'minconn': setting('DB_POOL_MIN', 2, int),
+        'maxconn': setting('DB_POOL_MAX', 10, int),
+        'checkout_timeout': setting('DB_POOL_TIMEOUT', 5.0, float),
+        'max_idle': setting('DB_POOL_MAX_IDLE', 300.0, float),
+        'max_lifetime': setting('DB_POOL_MAX_LIFETIME', 3600.0, float),
+    }
+
+
+class BoundedConnectionPool:
+    """Enveloppe un pool psycopg2 : attente bornée à l'emprunt, recyclage et statistiques"""
+
+    def __init__(self, pool, maxconn, minconn=0, checkout_timeout=5.0, max_idle=300.0, max_lifetime=3600.0):
+        self._pool = pool
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.checkout_timeout = checkout_timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        # Dates attachées aux connexions elles-mêmes : oubliées avec la connexion, même
+        # fermée par le pool psycopg2 (au-delà de minconn) sans passer par _forget
+        self._opened_at = weakref.WeakKeyDictionary()    # connexion -> date d'ouverture
+        self._returned_at = weakref.WeakKeyDictionary()  # connexion -> date du dernier retour au pool
+        self.in_use = 0
+        self.waiting = 0
+        self.exhausted = 0
+        self.timeouts = 0
+        self.recycled = 0
+        self.wait_histogram = [0] * (len(WAIT_BUCKETS) + 1)
+
+    def getconn(self):
+        """Emprunte une connexion, en attendant au plus checkout_timeout secondes"""
+        start = time.monotonic()
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.exhausted += 1
+                self.waiting += 1
+            metrics.increment('db_pool_exhausted')
+            try:
+                acquired = self._slots.acquire(timeout=self.checkout_timeout)
+            finally:
+                with self._lock:
+                    self.waiting -= 1
+            if not acquired:
+                with self._lock:
+                    self.timeouts += 1
+                metrics.increment('db_pool_timeouts')
+                raise PoolTimeout(f"Aucune connexion disponible après {self.checkout_timeout}s "
+                                  f"({self.maxconn} connexions empruntées)")
+        self._record_wait(time.monotonic() - start)
+
+        try:
+            conn = self._checkout_fresh()
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self.in_use += 1
+            in_use = self.in_use
+        metrics.gauge('db_pool_in_use', in_use)
+        return conn
+
+    def putconn(self, conn, close=False):
+        """Rend une connexion au pool (close=True la ferme au lieu de la garder)"""
+        with self._lock:
+            if close or conn.closed:
+                self._forget(conn)
+            else:
+                self._returned_at[conn] = time.monotonic()
+        try:
+            self._pool.putconn(conn, close=close)
+        finally:
+            with self._lock:
+                self.in_use = max(self.in_use - 1, 0)
+                in_use = self.in_use
+            self._slots.release()
+            metrics.gauge('db_pool_in_use', in_use)
+
+    def closeall(self):
+        with self._lock:
+            self._opened_at.clear()
+            self._returned_at.clear()
+        self._pool.closeall()
+
+    def _checkout_fresh(self):
+        """Connexion du pool sous-jacent, remplacée si elle est fermée, trop ancienne ou inactive depuis trop longtemps"""
+        # Les connexions libres peuvent toutes être périmées : au pire chacune est remplacée,
+        # puis le pool psycopg2 en ouvre une neuve
+        for _ in range(self.maxconn + 1):
+            conn = self._pool.getconn()
+            now = time.monotonic()
+            with self._lock:
+                opened_at = self._opened_at.setdefault(conn, now)
+                returned_at = self._returned_at.pop(conn, now)
+            if not (conn.closed or now - opened_at > self.max_lifetime or now - returned_at > self.max_idle):
+                return conn
+            with self._lock:
+                self._forget(conn)
+                self.recycled += 1
+            metrics.increment('db_pool_recycled')
+            self._pool.putconn(conn, close=True)
+        raise PoolError("Connexion neuve déjà fermée : base de données injoignable ?")
+
+    def _forget(self, conn):
+        self._opened_at.pop(conn, None)
+        self._returned_at.pop(conn, None)
+
+    def _record_wait(self, waited):
+        index = next((i for i, bound in enumerate(WAIT_BUCKETS) if waited <= bound), len(WAIT_BUCKETS))
+        with self._lock:
+            self.wait_histogram[index] += 1
+        # Histogramme de durées comme pour les requêtes : /metrics l'expose en
+        # law_quiz_db_pool_wait_seconds (seaux le="…", +Inf, _sum et _count)
+        metrics.timer('db_pool_wait', waited)
+
+    def stats(self):
+        """État du pool pour /health"""
+        with self._lock:
+            idle = len(getattr(self._pool, '_pool', ()))
+            return {
+                'min_connections': self.minconn,
+                'max_connections': self.maxconn,
+                'in_use': self.in_use,
+                'idle': idle,
+                'waiting': self.waiting,
+                'exhausted': self.exhausted,
+                'timeouts': self.timeouts,
+                'recycled': self.recycled,
+                'wait_histogram': {
+                    (f"le_{bound}" if i < len(WAIT_BUCKETS) else "le_inf"): count
+                    for i, (bound, count) in enumerate(zip(WAIT_BUCKETS + (None,), self.wait_histogram))
+                }
+            }
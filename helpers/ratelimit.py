@@ -0,0 +1,156 @@
+"""
+Limitation de débit des tentatives de connexion (seaux à jetons).
+
+Chaque tentative sur /auth/login consomme un jeton dans le seau de l'adresse IP, puis dans
+celui du nom d'utilisateur visé. Un seau contient au plus `capacity` jetons et se remplit de
+`per_minute` jetons par minute : un utilisateur légitime n'est jamais gêné, une attaque par
+force brute est refusée (429) avant toute requête en base ou tout hachage de mot de passe.
+login_attempts reste l'historique durable (blocage exponentiel par compte).
+
+Les seaux sont gardés en mémoire dans chaque worker, en nombre borné (les plus anciens sont
+oubliés). Avec LOGIN_RATE_LIMIT_SHARED=1 et REDIS_URL, ils sont partagés entre workers et
+serveurs (script Lua atomique) ; si Redis ne répond pas, le seau local prend le relais.
+"""
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from .cache import shared_store
+
+logger = logging.getLogger('law_quiz_app.helpers.ratelimit')
+
+# Même calcul que TokenBucketLimiter._take, exécuté atomiquement par Redis
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+
+class TokenBucketLimiter:
+    """Seaux à jetons indexés par clé (adresse IP, nom d'utilisateur...)"""
+
+    def __init__(self, name, capacity, per_minute, max_keys=10000, store=None):
+        self.name = name
+        self.capacity = capacity
+        self.rate = per_minute / 60.0  # jetons par seconde
+        self.max_keys = max_keys
+        self.store = store
+        self._buckets = OrderedDict()  # clé -> (jetons, date du dernier calcul)
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def _take(self, key, now):
+        """Consomme un jeton du seau local ; renvoie (accepté, jetons restants)"""
+        with self._lock:
+            tokens, last = self._buckets.pop(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + max(0.0, now - last) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, tokens
+
+    def _take_shared(self, key, now):
+        allowed, tokens = self.store.eval(
+            TOKEN_BUCKET_SCRIPT, 1, f"ratelimit:{self.name}:{key}", self.capacity, self.rate, now)
+        return bool(allowed), float(tokens)
+
+    def allow(self, key):
+        """
+        Consomme un jeton pour la clé.
+
+        Returns:
+            tuple: (accepté, secondes avant le prochain jeton si refusé, sinon 0).
+        """
+        now = time.time()
+        if self.store is not None:
+            try:
+                allowed, tokens = self._take_shared(key, now)
+            except Exception as e:
+                logger.warning(f"Limiteur partagé indisponible, seau local utilisé: {e}")
+                allowed, tokens = self._take(key, now)
+        else:
+            allowed, tokens = self._take(key, now)
+
+        if allowed:
+            return True, 0
+        self.rejected += 1
+        return False, math.ceil((1 - tokens) / self.rate)
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'keys': len(self._buckets), 'rejected': self.rejected}
+
+
+LOGIN_RATE_LIMIT = os.environ.get('LOGIN_RATE_LIMIT', '1') == '1'
+_store = shared_store if os.environ.get('LOGIN_RATE_LIMIT_SHARED', '0') == '1' and hasattr(shared_store, 'eval') else None
+
+login_ip_limiter = TokenBucketLimiter(
+    'login_ip',
+    capacity=int(os.environ.get('LOGIN_IP_BURST', 20)),
+    per_minute=float(os.environ.get('LOGIN_IP_PER_MINUTE', 10)),
+    store=_store
+)
+login_username_limiter = TokenBucketLimiter(
+    'login_username',
+    capacity=int(os.environ.get('LOGIN_USERNAME_BURST', 10)),
+    per_minute=float(os.environ.get('LOGIN_USERNAME_PER_MINUTE', 5)),
+    store=_store
+)
+
+
+def check_login_rate(ip, username):
+    """
+    Consomme un jeton pour l'adresse IP puis pour le nom d'utilisateur visé.
+
+    Returns:
+        tuple: (None, 0) si la tentative est acceptée, sinon ('ip' ou 'username', secondes
+        avant de pouvoir réessayer).
+    """
+    if not LOGIN_RATE_LIMIT:
+        return None, 0
+    allowed, retry_after = login_ip_limiter.allow(ip or 'unknown')
+    if not allowed:
+        return 'ip', retry_after
+    allowed, retry_after = login_username_limiter.allow(username.strip().lower())
+    if not allowed:
+        return 'username', retry_after
+    return None, 0
+
+
+def reset_login_limiters():
+    """Vide les seaux locaux (tests)"""
+    login_ip_limiter.reset()
+    login_username_limiter.reset()
+
+
+def login_rate_status():
+    """État des limiteurs pour /health"""
+    return {
+        'enabled': LOGIN_RATE_LIMIT,
+        'backend': 'shared' if _store is not None else 'local',
+        'ip': login_ip_limiter.stats(),
+        'username': login_username_limiter.stats()
+    }
@@ -0,0 +1,110 @@
+"""
+Recherche plein texte dans le catalogue des quiz.
+
+La barre de recherche de /quiz/choix utilisait quatre prédicats ILIKE '%terme%' : aucun
+index ne pouvait les servir et chaque recherche parcourait toute la jointure, deux fois
+(page puis comptage). La recherche s'appuie désormais sur la colonne search_vector de
+quiz_catalog (configuration french_unaccent, index GIN, voir migrations/003_catalog_search.sql) :
+- les résultats sont classés par pertinence (ts_rank) puis par likes ;
+- la page et le nombre total de résultats sont renvoyés par une seule requête ;
+- la pagination se fait par curseur (rank, likes, quiz_id), comme la liste du catalogue.
+"""
+import logging
+import re
+
+from .core import db_request
+from .catalog import PAGE_SIZE, encode_cursor
+
+logger = logging.getLogger('law_quiz_app.helpers.search')
+
+# Configuration plein texte créée par la migration 003 (français, sans accents)
+SEARCH_CONFIG = 'french_unaccent'
+
+# Au-delà, les termes supplémentaires sont ignorés
+MAX_SEARCH_TERMS = 8
+
+
+def build_tsquery(text):
+    """
+    Transforme la saisie de l'utilisateur en requête tsquery.
+
+    Chaque mot devient un préfixe ("civ" trouve "Droit Civil") et tous les mots
+    doivent être présents. Les caractères spéciaux de tsquery sont écartés.
+
+    Returns:
+        str or None: La requête à passer à to_tsquery, ou None si la saisie ne contient aucun mot.
+    """
+    if not text:
+        return None
+    terms = re.findall(r"\w+", text.lower())[:MAX_SEARCH_TERMS]
+    if not terms:
+        return None
+    return " & ".join(f"{term}:*" for term in terms)
+
+
+def search_catalog(text, where, params, after=None, before=None):
+    """
+    Recherche une page de quiz dans le catalogue.
+
+    Args:
+        text (str): Saisie de l'utilisateur.
+        where (str): Condition SQL supplémentaire sur quiz_catalog (fragment interne).
+        params (tuple): Paramètres de la condition.
+        after (tuple, optional): Curseur décodé (rank, likes, quiz_id), renvoie les résultats suivants.
+        before (tuple, optional): Curseur décodé, renvoie les résultats précédents.
+
+    Returns:
+        tuple: (rows, next_cursor, prev_cursor, total_results). Chaque ligne contient
+        (titre, username, matiere, niveau, question_count, likes, quiz_id).
+    """
+    tsquery = build_tsquery(text)
+    if not tsquery:
+        return [], None, None, 0
+
+    if before and len(before) == 3:
+        keyset = "WHERE (rank, likes, quiz_id) > (%s::real, %s, %s)"
+        order, position = "rank ASC, likes ASC, quiz_id ASC", before
+    elif after and len(after) == 3:
+        keyset = "WHERE (rank, likes, quiz_id) < (%s::real, %s, %s)"
+        order, position = "rank DESC, likes DESC, quiz_id DESC", after
+    else:
+        keyset, order, position = "", "rank DESC, likes DESC, quiz_id DESC", ()
+
+    # La CTE est évaluée une seule fois : elle sert à la fois à la page et au comptage
+    rows = db_request(f"""
+        WITH matches AS (
+            SELECT titre, username, matiere, niveau, question_count, likes, quiz_id,
+                   ts_rank(search_vector, query) AS rank
+            FROM quiz_catalog, to_tsquery('{SEARCH_CONFIG}', %s) AS query
+            WHERE {where} AND search_vector @@ query
+        )
+        SELECT titre, username, matiere, niveau, question_count, likes, quiz_id, rank,
+               (SELECT COUNT(*) FROM matches) AS total_results
+        FROM matches
+        {keyset}
+        ORDER BY {order}
+        LIMIT %s
+    """, (tsquery, *params, *position, PAGE_SIZE + 1))
+
+    # db_request renvoie une page d'erreur (déjà journalisée) si la requête échoue
+    rows = list(rows) if isinstance(rows, list) else []
+    total_results = rows[0][8] if rows else 0
+
+    has_more = len(rows) > PAGE_SIZE
+    rows = rows[:PAGE_SIZE]
+
+    if keyset and before:
+        rows.reverse()
+        has_next, has_prev = True, has_more
+    else:
+        has_next, has_prev = has_more, bool(keyset)
+
+    next_cursor = encode_cursor(rows[-1][7], rows[-1][5], rows[-1][6]) if rows and has_next else None
+    prev_cursor = encode_cursor(rows[0][7], rows[0][5], rows[0][6]) if rows and has_prev else None
+
+    logger.debug("Recherche dans le catalogue", extra={
+        'terms': tsquery,
+        'total_results': total_results
+    })
+
+    return [row[:7] for row in rows], next_cursor, prev_cursor, total_results
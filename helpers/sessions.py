@@ -0,0 +1,276 @@
+"""
+Stockage des sessions Flask.
+
+Flask-Session en mode filesystem écrivait un fichier par session dans flask_session/ : des
+E/S disque à chaque requête, aucun nettoyage, et des sessions propres à chaque conteneur.
+SESSION_BACKEND choisit le stockage :
+
+- cookie (par défaut) : session signée dans le cookie (SecureCookieSessionInterface de
+  Flask), aucun stockage côté serveur ; à réserver à des sessions légères (user_id, username) ;
+- redis : session côté serveur dans Redis (REDIS_URL, partagé avec le cache ; memory://
+  pour un stockage local de test), expirée par Redis lui-même ;
+- postgres : session côté serveur dans la table sessions (migrations/007_sessions.sql),
+  expirée à la lecture et supprimée par un balayage périodique (SESSION_SWEEP_INTERVAL
+  secondes, thread d'arrière-plan de chaque worker, ou python -m helpers.sessions sweep) ;
+- filesystem : l'ancien comportement (Flask-Session), le temps de la transition.
+
+Côté serveur, le cookie ne contient qu'un identifiant aléatoire signé ; la session expire
+après PERMANENT_SESSION_LIFETIME (SESSION_LIFETIME secondes, 7 jours par défaut) à compter
+de sa dernière modification. Une requête qui ne modifie pas la session ne l'écrit pas, et
+une requête anonyme n'en crée pas (même principe que les sessions dans le cookie).
+"""
+import argparse
+import logging
+import os
+import secrets
+import threading
+import time
+from datetime import timedelta
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SecureCookieSessionInterface, SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+
+from .core import db_request, prepared_statement
+from .monitoring import metrics
+
+logger = logging.getLogger('law_quiz_app.helpers.sessions')
+
+SESSION_BACKEND = os.environ.get('SESSION_BACKEND', 'cookie')
+SESSION_LIFETIME = int(os.environ.get('SESSION_LIFETIME', 7 * 24 * 3600))
+SESSION_SWEEP_INTERVAL = float(os.environ.get('SESSION_SWEEP_INTERVAL', 300))
+
+
+def _new_sid():
+    return secrets.token_urlsafe(32)
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Session dont le contenu est stocké côté serveur, sous l'identifiant sid"""
+
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(session):
+            session.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid or _new_sid()
+        self.new = new
+        self.modified = False
+        self.stale_sid = None
+
+    def clear(self):
+        # Vider la session (connexion, déconnexion) change aussi son identifiant : un
+        # identifiant connu avant la connexion ne donne pas accès à la session connectée
+        super().clear()
+        if not self.new and self.stale_sid is None:
+            self.stale_sid = self.sid
+        self.sid = _new_sid()
+
+
+class RedisSessionStore:
+    """Sessions dans Redis (ou InMemoryStore en test) ; l'expiration est confiée à Redis"""
+
+    def __init__(self, client, prefix='session:'):
+        self.client = client
+        self.prefix = prefix
+
+    def load(self, sid):
+        data = self.client.get(self.prefix + sid)
+        return data.decode() if isinstance(data, bytes) else data
+
+    def save(self, sid, data, lifetime):
+        self.client.set(self.prefix + sid, data, ex=max(int(lifetime), 1))
+
+    def delete(self, sid):
+        self.client.delete(self.prefix + sid)
+
+    def sweep(self):
+        return 0
+
+
+SESSION_LOAD = prepared_statement(
+    'session_load', "SELECT data FROM sessions WHERE sid = %s AND expires_at > now()")
+SESSION_SAVE = prepared_statement('session_save', """
+    INSERT INTO sessions (sid, data, expires_at) VALUES (%s, %s, now() + make_interval(secs => %s))
+    ON CONFLICT (sid) DO UPDATE SET data = EXCLUDED.data, expires_at = EXCLUDED.expires_at
+""")
+
+# Suppression par lots : le balayage ne verrouille jamais beaucoup de lignes à la fois
+SESSION_SWEEP = """
+    DELETE FROM sessions WHERE sid IN (
+        SELECT sid FROM sessions WHERE expires_at <= now() LIMIT %s
+    )
+    RETURNING sid
+"""
+
+
+class PostgresSessionStore:
+    """Sessions dans la table sessions ; les lignes expirées sont ignorées puis balayées"""
+
+    def __init__(self, sweep_batch=1000):
+        self.sweep_batch = sweep_batch
+
+    def load(self, sid):
+        rows = db_request(SESSION_LOAD, (sid,))
+        return rows[0][0] if isinstance(rows, list) and rows else None
+
+    def save(self, sid, data, lifetime):
+        _ensure_sweeper(self)
+        db_request(SESSION_SAVE, (sid, data, lifetime), fetch=False)
+
+    def delete(self, sid):
+        db_request("DELETE FROM sessions WHERE sid = %s", (sid,), fetch=False)
+
+    def sweep(self):
+        """Supprime les sessions expirées ; renvoie leur nombre"""
+        total = 0
+        while True:
+            rows = db_request(SESSION_SWEEP, (self.sweep_batch,))
+            if not isinstance(rows, list):
+                break
+            total += len(rows)
+            if len(rows) < self.sweep_batch:
+                break
+        return total
+
+
+class StoreSessionInterface(SessionInterface):
+    """Session côté serveur : le cookie ne porte qu'un identifiant signé"""
+
+    serializer = TaggedJSONSerializer()
+    salt = 'law-quiz-session-id'
+
+    def __init__(self, store):
+        self.store = store
+        self.writes = 0
+        self.deletes = 0
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt=self.salt)
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self._signer(app).unsign(cookie).decode()
+                data = self.store.load(sid)
+                if data is not None:
+                    return ServerSession(self.serializer.loads(data), sid=sid)
+            except BadSignature:
+                pass
+            except Exception as e:
+                logger.warning(f"Session illisible, nouvelle session: {e}")
+        return ServerSession(new=True)
+
+    def save_session(self, app, session, response):
+        # Écriture paresseuse : le stockage n'est touché que si la session a été modifiée
+        # pendant la requête ; une session vide n'est jamais créée
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.stale_sid:
+            self._delete(session.stale_sid)
+            session.stale_sid = None
+        elif not session and session.modified and not session.new:
+            self._delete(session.sid)  # vidée clé par clé, sans clear()
+
+        if not session:
+            if session.modified and not session.new:
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        if not session.modified:
+            return
+
+        lifetime = app.permanent_session_lifetime.total_seconds()
+        self.store.save(session.sid, self.serializer.dumps(dict(session)), lifetime)
+        self.writes += 1
+        metrics.increment('session_store_writes')
+        response.set_cookie(
+            name,
+            self._signer(app).sign(session.sid).decode(),
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+            domain=domain,
+            path=path
+        )
+
+    def _delete(self, sid):
+        self.store.delete(sid)
+        self.deletes += 1
+        metrics.increment('session_store_deletes')
+
+    def stats(self):
+        return {'writes': self.writes, 'deletes': self.deletes}
+
+
+_sweeper_thread = None
+_sweeper_lock = threading.Lock()
+
+
+def _sweep_loop(store):
+    while True:
+        time.sleep(SESSION_SWEEP_INTERVAL)
+        try:
+            swept = store.sweep()
+            if swept:
+                logger.info(f"{swept} session(s) expirée(s) supprimée(s)")
+        except Exception as e:
+            logger.error(f"Balayage des sessions impossible: {e}", exc_info=True)
+
+
+def _ensure_sweeper(store):
+    """Démarre le balayage périodique dans ce worker (à la première écriture de session)"""
+    global _sweeper_thread
+    if not SESSION_SWEEP_INTERVAL:
+        return
+    with _sweeper_lock:
+        if _sweeper_thread is None or not _sweeper_thread.is_alive():
+            _sweeper_thread = threading.Thread(target=_sweep_loop, args=(store,), name='session-sweeper', daemon=True)
+            _sweeper_thread.start()
+
+
+def create_session_interface(backend):
+    """Interface de session Flask pour SESSION_BACKEND (None : Flask-Session en mode filesystem)"""
+    if backend == 'redis':
+        from .cache import shared_store
+        if shared_store is None:
+            logger.warning("SESSION_BACKEND=redis sans REDIS_URL joignable - sessions dans le cookie")
+            return SecureCookieSessionInterface()
+        return StoreSessionInterface(RedisSessionStore(shared_store))
+    if backend == 'postgres':
+        return StoreSessionInterface(PostgresSessionStore())
+    if backend == 'filesystem':
+        return None
+    if backend != 'cookie':
+        logger.warning(f"SESSION_BACKEND inconnu ({backend}) - sessions dans le cookie")
+    return SecureCookieSessionInterface()
+
+
+def setup_sessions(app, backend=SESSION_BACKEND):
+    """Configure le stockage des sessions de l'application"""
+    app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(seconds=SESSION_LIFETIME)
+    interface = create_session_interface(backend)
+    if interface is None:
+        from flask_session import Session
+        app.config["SESSION_TYPE"] = "filesystem"
+        Session(app)
+    else:
+        app.session_interface = interface
+    logger.info(f"Sessions : {backend}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintenance des sessions (SESSION_BACKEND=postgres)')
+    parser.add_argument('action', choices=['sweep'], help='sweep : supprimer les sessions expirées')
+    parser.parse_args()
+
+    print(f"{PostgresSessionStore().sweep()} session(s) expirée(s) supprimée(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""
+Journal des requêtes SQL lentes.
+
+db_request signale ici toute requête plus longue que SLOW_QUERY_MS millisecondes (exécution,
+lecture des lignes et commit). Chaque requête lente est écrite en JSON, une par ligne, dans
+logs/slow_queries.log (SLOW_QUERY_LOG) :
+
+- la requête normalisée (littéraux et paramètres remplacés par ?, espaces réduits) et son
+  empreinte, pour regrouper les exécutions d'une même requête ;
+- la forme des paramètres (types et longueurs, jamais les valeurs) ;
+- la durée, la route (endpoint) et le nom de la requête préparée s'il y en a un ;
+- pour un échantillon (SLOW_QUERY_EXPLAIN_SAMPLE, au plus une fois par requête toutes les
+  SLOW_QUERY_EXPLAIN_INTERVAL secondes), le plan EXPLAIN (ANALYZE, BUFFERS) ; ANALYZE
+  réexécute la requête, il n'est donc demandé que pour une lecture (EXPLAIN seul dès que
+  la requête contient INSERT, UPDATE, DELETE ou MERGE, même dans une CTE).
+
+L'écriture et l'EXPLAIN se font dans un thread d'arrière-plan, sur une connexion du pool
+distincte et dans une transaction annulée : la requête HTTP n'attend pas. La file est bornée ;
+au-delà, les requêtes lentes sont comptées (slow_queries_dropped) mais pas écrites.
+
+python monitoring_dashboard.py --slow-queries classe les requêtes par temps total.
+"""
+import hashlib
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from datetime import datetime
+
+from .monitoring import metrics
+
+logger = logging.getLogger('law_quiz_app.helpers.slow_queries')
+
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 200))
+SLOW_QUERY_LOG = os.environ.get('SLOW_QUERY_LOG') or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'logs', 'slow_queries.log')
+SLOW_QUERY_EXPLAIN_SAMPLE = float(os.environ.get('SLOW_QUERY_EXPLAIN_SAMPLE', 0.1))
+SLOW_QUERY_EXPLAIN_INTERVAL = float(os.environ.get('SLOW_QUERY_EXPLAIN_INTERVAL', 60))
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%s|\$\d+")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+_WRITE = re.compile(r"\b(?:INSERT|UPDATE|DELETE|MERGE)\b", re.IGNORECASE)
+
+
+def normalize_sql(text):
+    """Requête sans valeurs : littéraux et paramètres remplacés par ?, espaces réduits"""
+    normalized = _STRING_LITERAL.sub('?', str(text))
+    normalized = _PLACEHOLDER.sub('?', normalized)
+    normalized = _NUMBER_LITERAL.sub('?', normalized)
+    normalized = _IN_LIST.sub('(?)', normalized)
+    return _WHITESPACE.sub(' ', normalized).strip()
+
+
+def fingerprint(normalized):
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:12]
+
+
+def params_shape(params):
+    """Types des paramètres (longueur des chaînes et listes), sans leurs valeurs"""
+    def shape(value):
+        if isinstance(value, (str, bytes)):
+            return f"{type(value).__name__}({len(value)})"
+        if isinstance(value, (list, tuple)):
+            return f"{type(value).__name__}[{len(value)}]"
+        return type(value).__name__
+    if isinstance(params, dict):
+        return {key: shape(value) for key, value in params.items()}
+    return [shape(value) for value in params or ()]
+
+
+def _explainable(text):
+    return normalize_sql(text).split(' ', 1)[0].upper() in ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE')
+
+
+class SlowQueryRecorder:
+    """Écrit les requêtes lentes (et des plans échantillonnés) depuis un thread d'arrière-plan"""
+
+    def __init__(self, path, threshold_ms=200, explain_sample=0.1, explain_interval=60, max_pending=100,
+                 connect=None):
+        self.path = path
+        self.threshold = threshold_ms / 1000
+        self.explain_sample = explain_sample
+        self.explain_interval = explain_interval
+        self.connect = connect  # () -> (connexion, rendre(connexion)) ; pool de helpers.core par défaut
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._last_explain = {}  # empreinte -> date du dernier EXPLAIN
+        self._lock = threading.Lock()
+        self._thread = None
+        self.recorded = 0
+        self.dropped = 0
+
+    def observe(self, text, params, duration, endpoint=None):
+        """Appelé par db_request après chaque requête ; ne fait rien sous le seuil"""
+        if self.threshold <= 0 or duration < self.threshold:
+            return
+        normalized = normalize_sql(text)
+        entry = {
+            'timestamp': datetime.utcnow().isoformat(),
+            'fingerprint': fingerprint(normalized),
+            'statement': getattr(text, 'name', None),
+            'sql': normalized,
+            'params': params_shape(params),
+            'duration_ms': round(duration * 1000, 3),
+            'endpoint': endpoint,
+            'pid': os.getpid(),
+        }
+        explain = self._should_explain(entry['fingerprint'], text)
+        self._start()
+        try:
+            self._queue.put_nowait((entry, str(text) if explain else None, params if explain else None))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            metrics.increment('slow_queries_dropped')
+            return
+        metrics.increment('slow_queries')
+
+    def _should_explain(self, key, text):
+        if self.explain_sample <= 0 or random.random() >= self.explain_sample or not _explainable(text):
+            return False
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_explain.get(key, float('-inf')) < self.explain_interval:
+                return False
+            self._last_explain[key] = now
+        return True
+
+    def _start(self):
+        # Démarrage paresseux : le thread naît dans le worker, après le fork de gunicorn
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='slow-queries', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                self.write(*item)
+            except Exception as e:
+                logger.error(f"Écriture du journal des requêtes lentes impossible: {e}", exc_info=True)
+            finally:
+                self._queue.task_done()
+
+    def write(self, entry, explain_text=None, params=None):
+        """Ajoute une entrée au journal, avec son plan si explain_text est fourni"""
+        if explain_text is not None:
+            try:
+                entry['explain'] = self.explain(explain_text, params)
+            except Exception as e:
+                entry['explain_error'] = f"{type(e).__name__}: {e}"
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        with self._lock:
+            self.recorded += 1
+
+    def explain(self, text, params):
+        """Plan de la requête, sur une connexion distincte, dans une transaction annulée"""
+        # ANALYZE réexécute la requête : jamais pour une écriture, y compris dans une CTE
+        # (WITH ... INSERT/UPDATE/DELETE), qui prendrait des verrous jusqu'au rollback
+        normalized = normalize_sql(text)
+        analyze = normalized.split(' ', 1)[0].upper() in ('SELECT', 'WITH') and not _WRITE.search(normalized)
+        options = '(ANALYZE, BUFFERS) ' if analyze else ''
+        conn, release = self._connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SET LOCAL statement_timeout = '10s'")
+            cursor.execute(f"EXPLAIN {options}{text}", params or ())
+            return '\n'.join(row[0] for row in cursor.fetchall())
+        finally:
+            try:
+                conn.rollback()
+            finally:
+                release(conn)
+
+    def _connection(self):
+        if self.connect is not None:
+            return self.connect()
+        from .core import get_connection, return_connection
+        return get_connection(), return_connection
+
+    def flush(self, timeout=5):
+        """Attend l'écriture des entrées en file (tests, arrêt du worker)"""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def stats(self):
+        return {'recorded': self.recorded, 'dropped': self.dropped, 'pending': self._queue.qsize()}
+
+
+slow_queries = SlowQueryRecorder(
+    SLOW_QUERY_LOG,
+    threshold_ms=SLOW_QUERY_MS,
+    explain_sample=SLOW_QUERY_EXPLAIN_SAMPLE,
+    explain_interval=SLOW_QUERY_EXPLAIN_INTERVAL
+)
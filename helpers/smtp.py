@@ -0,0 +1,302 @@
+"""
+Transport SMTP à connexions réutilisées.
+
+Flask-Mail ouvre une connexion par envoi : connexion TCP, EHLO, STARTTLS, second EHLO et
+AUTH avant chaque email, soit plusieurs allers-retours (et une négociation TLS) pour un seul
+MAIL FROM/RCPT/DATA. SMTPPool garde au plus MAIL_POOL_SIZE connexions authentifiées par
+worker et les prête à chaque envoi :
+
+- une connexion inactive depuis plus de MAIL_POOL_IDLE_CHECK secondes est vérifiée par NOOP
+  avant d'être prêtée (le serveur a pu la fermer sans prévenir) ; au-delà de
+  MAIL_POOL_MAX_IDLE secondes elle est fermée et remplacée ;
+- une connexion coupée pendant l'envoi est jetée et l'envoi refait une fois sur une nouvelle ;
+- au-delà de MAIL_POOL_SIZE envois simultanés, l'emprunt attend au plus MAIL_POOL_TIMEOUT
+  secondes, puis lève SMTPPoolTimeout.
+
+PooledMail remplace flask_mail.Mail (app.mail) : mail.send() emprunte une connexion du pool
+au lieu d'en ouvrir une. Le thread de la boîte d'envoi (helpers/mail_outbox.py) partage le
+même pool.
+"""
+import logging
+import os
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app
+from flask_mail import Connection, Mail
+
+from .monitoring import metrics
+
+logger = logging.getLogger('law_quiz_app.helpers.smtp')
+
+
+def connection_lost(error):
+    """
+    Erreur qui justifie un nouvel essai sur une autre connexion : connexion fermée par le
+    serveur ou coupée (socket). smtplib.SMTPException hérite d'OSError : une réponse SMTP
+    (refus 5xx, SMTPDataError...) n'en est pas une, et un délai dépassé non plus, le serveur
+    ayant peut-être déjà reçu le message (un nouvel essai l'enverrait deux fois).
+    """
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    return isinstance(error, OSError) and not isinstance(error, (smtplib.SMTPException, TimeoutError))
+
+
+class SMTPPoolTimeout(smtplib.SMTPException):
+    """Aucune connexion SMTP n'a été rendue au pool dans le délai imparti"""
+
+
+def smtp_pool_settings(config=None):
+    """
+    Paramètres du pool SMTP : configuration de l'application, sinon environnement, sinon défauts.
+
+    Args:
+        config (Mapping, optional): Configuration Flask (clés MAIL_*).
+    """
+    config = config or {}
+
+    def setting(name, default, cast):
+        value = config.get(name, os.environ.get(name))
+        return cast(value) if value not in (None, '') else default
+
+    return {
+        'host': config.get('MAIL_SERVER'),
+        'port': setting('MAIL_PORT', 587, int),
+        'use_tls': bool(config.get('MAIL_USE_TLS', True)),
+        'use_ssl': bool(config.get('MAIL_USE_SSL', False)),
+        'username': config.get('MAIL_USERNAME'),
+        'password': config.get('MAIL_PASSWORD'),
+        'timeout': setting('MAIL_TIMEOUT', 10.0, float),
+        'size': setting('MAIL_POOL_SIZE', 2, int),
+        'checkout_timeout': setting('MAIL_POOL_TIMEOUT', 10.0, float),
+        'idle_check': setting('MAIL_POOL_IDLE_CHECK', 30.0, float),
+        'max_idle': setting('MAIL_POOL_MAX_IDLE', 300.0, float),
+    }
+
+
+class SMTPPool:
+    """Connexions SMTP authentifiées, prêtées envoi par envoi et rouvertes si le serveur les a fermées"""
+
+    def __init__(self, host, port=587, use_tls=True, username=None, password=None, timeout=10, size=2,
+                 checkout_timeout=10, idle_check=30, max_idle=300, use_ssl=False):
+        self.host = host
+        self.port = port
+        self.use_tls = use_tls
+        self.use_ssl = use_ssl
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self.size = size
+        self.checkout_timeout = checkout_timeout
+        self.idle_check = idle_check
+        self.max_idle = max_idle
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._idle = []  # (connexion, date du dernier retour au pool), la plus récente en dernier
+        self.in_use = 0
+        self.opened = 0
+        self.reused = 0
+        self.reconnects = 0
+        self.timeouts = 0
+
+    @classmethod
+    def from_config(cls, config=None):
+        return cls(**smtp_pool_settings(config))
+
+    def open_connection(self):
+        """Nouvelle connexion : connexion TCP, EHLO, STARTTLS et AUTH"""
+        smtp_class = smtplib.SMTP_SSL if self.use_ssl else smtplib.SMTP
+        smtp = smtp_class(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.use_tls and not self.use_ssl:
+                smtp.starttls()
+            if self.username and self.password:
+                smtp.login(self.username, self.password)
+        except Exception:
+            self._quit(smtp)
+            raise
+        with self._lock:
+            self.opened += 1
+        metrics.increment('smtp_connections_opened')
+        return smtp
+
+    def acquire(self):
+        """Emprunte une connexion, en attendant au plus checkout_timeout secondes"""
+        if not self._slots.acquire(timeout=self.checkout_timeout):
+            with self._lock:
+                self.timeouts += 1
+            metrics.increment('smtp_pool_timeouts')
+            raise SMTPPoolTimeout(f"Aucune connexion SMTP disponible après {self.checkout_timeout}s "
+                                  f"({self.size} connexions empruntées)")
+        try:
+            smtp = self._checkout()
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.in_use += 1
+        return smtp
+
+    def _checkout(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                smtp, returned_at = self._idle.pop()
+            idle = time.monotonic() - returned_at
+            if idle > self.max_idle:
+                self._quit(smtp)
+                continue
+            if idle > self.idle_check and not self._alive(smtp):
+                self._quit(smtp)
+                self._record_reconnect()
+                continue
+            with self._lock:
+                self.reused += 1
+            return smtp
+        return self.open_connection()
+
+    def release(self, smtp, discard=False):
+        """Rend une connexion au pool (discard=True la ferme au lieu de la garder)"""
+        try:
+            if discard or smtp.sock is None:
+                self._quit(smtp)
+            else:
+                with self._lock:
+                    self._idle.append((smtp, time.monotonic()))
+        finally:
+            with self._lock:
+                self.in_use = max(self.in_use - 1, 0)
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Connexion empruntée le temps du bloc ; jetée si le bloc lève autre chose qu'une erreur SMTP"""
+        smtp = self.acquire()
+        try:
+            yield smtp
+        except smtplib.SMTPServerDisconnected:
+            self.release(smtp, discard=True)
+            raise
+        except smtplib.SMTPException:
+            # Refus du serveur (destinataire, contenu) : smtplib a fait RSET, la connexion reste bonne
+            self.release(smtp)
+            raise
+        except BaseException:
+            self.release(smtp, discard=True)
+            raise
+        else:
+            self.release(smtp)
+
+    def send(self, message, from_addr=None, to_addrs=None):
+        """Envoie un email.message.Message ; une connexion perdue est remplacée une fois"""
+        for attempt in (1, 2):
+            try:
+                with self.connection() as smtp:
+                    return smtp.send_message(message, from_addr, to_addrs)
+            except Exception as e:
+                if attempt == 2 or not connection_lost(e):
+                    raise
+                self._record_reconnect()
+
+    def close(self):
+        """Ferme les connexions inutilisées (arrêt du worker)"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for smtp, _ in idle:
+            self._quit(smtp)
+
+    def _record_reconnect(self):
+        with self._lock:
+            self.reconnects += 1
+        metrics.increment('smtp_reconnects')
+
+    @staticmethod
+    def _alive(smtp):
+        try:
+            return smtp.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    @staticmethod
+    def _quit(smtp):
+        try:
+            smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            smtp.close()
+
+    def stats(self):
+        """État du pool pour /health"""
+        with self._lock:
+            return {
+                'size': self.size,
+                'in_use': self.in_use,
+                'idle': len(self._idle),
+                'opened': self.opened,
+                'reused': self.reused,
+                'reconnects': self.reconnects,
+                'timeouts': self.timeouts,
+            }
+
+
+class PooledConnection(Connection):
+    """Connexion Flask-Mail empruntée au pool et rendue à la fin de l'envoi au lieu d'être fermée"""
+
+    def __init__(self, mail, pool):
+        super().__init__(mail)
+        self.pool = pool
+
+    def __enter__(self):
+        self.host = None if self.mail.suppress else self.pool.acquire()
+        self.num_emails = 0
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if self.host is not None:
+            broken = exc_type is not None and (
+                not issubclass(exc_type, smtplib.SMTPException) or issubclass(exc_type, smtplib.SMTPServerDisconnected))
+            self.pool.release(self.host, discard=broken)
+            self.host = None
+
+    def configure_host(self):
+        # Appelé par Flask-Mail après MAIL_MAX_EMAILS envois sur la même connexion
+        return self.pool.open_connection()
+
+    def send(self, message, envelope_from=None):
+        try:
+            super().send(message, envelope_from)
+        except Exception as e:
+            if self.host is None or not connection_lost(e):
+                raise
+            # Connexion coupée malgré le contrôle à l'emprunt : un seul nouvel essai
+            self.pool.release(self.host, discard=True)
+            self.host = None
+            self.pool._record_reconnect()
+            self.host = self.pool.acquire()
+            super().send(message, envelope_from)
+
+
+class PooledMail(Mail):
+    """flask_mail.Mail dont les envois passent par un SMTPPool (app.extensions['mail'].pool)"""
+
+    def init_app(self, app):
+        state = super().init_app(app)
+        state.pool = SMTPPool.from_config(app.config)
+        return state
+
+    def connect(self):
+        app = getattr(self, 'app', None) or current_app
+        try:
+            state = app.extensions['mail']
+        except KeyError as err:
+            raise RuntimeError("The current application was not configured with Flask-Mail") from err
+        return PooledConnection(state, state.pool)
+
+
+def smtp_pool_status(app=None):
+    """Statistiques du pool SMTP de l'application, None sans PooledMail"""
+    app = app or current_app
+    pool = getattr(app.extensions.get('mail'), 'pool', None)
+    return pool.stats() if pool is not None else None
@@ -0,0 +1,186 @@
+"""
+Écriture différée (write-behind) des résultats de quiz.
+
+En fin de séance, toute une promotion termine le même quiz et les POST /quiz/update_stats
+arrivent en rafale, chacun avec son écriture synchrone. Avec STATS_WRITE_BEHIND=1, la route
+accuse réception immédiatement : le résultat est ajouté à une file en mémoire du worker, et
+un thread d'arrière-plan l'écrit par lots avec un seul upsert multi-lignes.
+
+- Un lot part dès qu'il atteint STATS_BATCH_SIZE résultats, ou STATS_FLUSH_INTERVAL secondes
+  après l'arrivée du plus ancien résultat en attente.
+- Si la file contient déjà STATS_QUEUE_MAX résultats, submit() refuse et la route écrit
+  de façon synchrone : la mémoire reste bornée.
+- Si un lot échoue, ses résultats sont réécrits un par un : une ligne invalide (quiz supprimé
+  entre-temps par exemple) est journalisée et écartée sans bloquer les autres.
+- La file est vidée à l'arrêt du worker (hook worker_exit de gunicorn.conf.py, et atexit).
+
+Un résultat encore en file est perdu si le worker est tué brutalement (SIGKILL, OOM).
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from psycopg2.extras import execute_values
+
+from .core import db_transaction
+from .monitoring import metrics
+
+logger = logging.getLogger('law_quiz_app.helpers.stats_queue')
+
+# Même logique que l'upsert unitaire de quiz/routes.py, pour un lot :
+# - un seul essai par (user_id, quiz_id), même si le lot contient des doublons ;
+# - les stats d'une même matière sont additionnées avant l'upsert (ON CONFLICT DO UPDATE
+#   ne peut pas modifier deux fois la même ligne dans une requête).
+BATCH_UPSERT = """
+    WITH submitted (user_id, quiz_id, matiere, posées, trouvées) AS (VALUES %s),
+    attempts AS (
+        INSERT INTO quiz_attempts (user_id, quiz_id)
+        SELECT DISTINCT user_id, quiz_id FROM submitted
+        ON CONFLICT (user_id, quiz_id) DO NOTHING
+        RETURNING user_id, quiz_id
+    ),
+    accepted AS (
+        SELECT DISTINCT ON (s.user_id, s.quiz_id) s.user_id, s.matiere, s.posées, s.trouvées
+        FROM submitted s JOIN attempts a ON a.user_id = s.user_id AND a.quiz_id = s.quiz_id
+    )
+    INSERT INTO stats (user_id, matiere, posées, trouvées)
+    SELECT user_id, matiere, SUM(posées), SUM(trouvées) FROM accepted GROUP BY user_id, matiere
+    ON CONFLICT (user_id, matiere) DO UPDATE
+    SET posées = stats.posées + EXCLUDED.posées, trouvées = stats.trouvées + EXCLUDED.trouvées
+"""
+BATCH_TEMPLATE = "(%s::integer, %s::integer, %s, %s::integer, %s::integer)"
+
+
+def write_stats_batch(rows):
+    """
+    Enregistre un lot de résultats en une requête et une transaction.
+
+    Args:
+        rows (list): Tuples (user_id, quiz_id, matiere, posées, trouvées).
+    """
+    with db_transaction() as tx:
+        cursor = tx.connection().cursor()
+        execute_values(cursor, BATCH_UPSERT, rows, template=BATCH_TEMPLATE, page_size=len(rows))
+
+
+class StatsWriteBehind:
+    """File des résultats de quiz en attente d'écriture, vidée par un thread d'arrière-plan"""
+
+    def __init__(self, writer=write_stats_batch, batch_size=200, flush_interval=0.5, max_pending=10000):
+        self.writer = writer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending = deque()  # (date d'arrivée, résultat)
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        self.written = 0
+        self.dropped = 0
+        self.rejected = 0
+
+    def submit(self, row):
+        """
+        Ajoute un résultat à la file.
+
+        Returns:
+            bool: False si la file est pleine ou arrêtée (l'appelant écrit alors lui-même).
+        """
+        with self._condition:
+            if self._stopping or len(self._pending) >= self.max_pending:
+                self.rejected += 1
+                metrics.increment('stats_write_behind_rejected')
+                return False
+            self._pending.append((time.monotonic(), row))
+            self._ensure_started()
+            if len(self._pending) >= self.batch_size:
+                self._condition.notify()
+        return True
+
+    def _ensure_started(self):
+        # Démarrage paresseux : le thread naît dans le worker, après le fork de gunicorn
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='stats-write-behind', daemon=True)
+            self._thread.start()
+
+    def _next_batch(self):
+        """Attend qu'un lot soit prêt (taille ou délai atteints, ou arrêt) et le retire de la file"""
+        with self._condition:
+            while True:
+                if self._pending:
+                    age = time.monotonic() - self._pending[0][0]
+                    if self._stopping or len(self._pending) >= self.batch_size or age >= self.flush_interval:
+                        count = min(len(self._pending), self.batch_size)
+                        return [self._pending.popleft()[1] for _ in range(count)]
+                    self._condition.wait(self.flush_interval - age)
+                elif self._stopping:
+                    return None
+                else:
+                    self._condition.wait()
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            self._write(batch)
+
+    def _write(self, batch):
+        start = time.monotonic()
+        try:
+            self.writer(batch)
+            self.written += len(batch)
+        except Exception as e:
+            logger.warning(f"Échec de l'écriture d'un lot de {len(batch)} résultats, écriture un par un: {e}")
+            for row in batch:
+                try:
+                    self.writer([row])
+                    self.written += 1
+                except Exception as row_error:
+                    self.dropped += 1
+                    metrics.increment('stats_write_behind_dropped')
+                    logger.error(f"Résultat de quiz écarté: {row_error}", extra={'row': row})
+        metrics.increment('stats_write_behind_batches')
+        metrics.timer('stats_write_behind_flush', time.monotonic() - start)
+
+    def stop(self, timeout=10):
+        """Écrit les résultats en attente puis arrête le thread (arrêt du worker)"""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+            thread = self._thread
+        if thread is not None and thread.is_alive():
+            thread.join(timeout)
+        if self._pending:
+            logger.error(f"{len(self._pending)} résultats de quiz non écrits à l'arrêt du worker")
+
+    def stats(self):
+        with self._condition:
+            return {
+                'pending': len(self._pending),
+                'written': self.written,
+                'dropped': self.dropped,
+                'rejected': self.rejected
+            }
+
+
+STATS_WRITE_BEHIND = os.environ.get('STATS_WRITE_BEHIND', '0') == '1'
+
+# File du worker, None si l'écriture différée est désactivée
+stats_write_behind = StatsWriteBehind(
+    batch_size=int(os.environ.get('STATS_BATCH_SIZE', 200)),
+    flush_interval=float(os.environ.get('STATS_FLUSH_INTERVAL', 0.5)),
+    max_pending=int(os.environ.get('STATS_QUEUE_MAX', 10000))
+) if STATS_WRITE_BEHIND else None
+
+if stats_write_behind is not None:
+    atexit.register(stats_write_behind.stop)
+
+
+def drain_stats_queue():
+    """Vide la file d'écriture différée (appelé par le hook worker_exit de gunicorn)"""
+    if stats_write_behind is not None:
+        stats_write_behind.stop()
@@ -0,0 +1,33 @@
+-- Catalogue matérialisé des quiz pour la page /quiz/choix
+-- Une ligne par quiz possédant au moins une question, maintenue par helpers.catalog.refresh_quiz_catalog
+
+CREATE TABLE IF NOT EXISTS quiz_catalog (
+    quiz_id INTEGER PRIMARY KEY REFERENCES quiz_infos(quiz_id) ON DELETE CASCADE,
+    titre TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    username TEXT NOT NULL,
+    matiere TEXT,
+    niveau TEXT,
+    type TEXT NOT NULL DEFAULT 'private',
+    likes INTEGER NOT NULL DEFAULT 0,
+    question_count INTEGER NOT NULL DEFAULT 0
+);
+
+-- Liste publique : parcours d'index dans l'ordre d'affichage
+CREATE INDEX IF NOT EXISTS quiz_catalog_public_likes_idx
+    ON quiz_catalog (likes DESC, quiz_id)
+    WHERE type = 'public' AND question_count > 3;
+
+CREATE INDEX IF NOT EXISTS quiz_catalog_user_id_idx ON quiz_catalog (user_id);
+
+-- Nécessaire pour que refresh_quiz_catalog ne compte que les questions d'un seul quiz
+CREATE INDEX IF NOT EXISTS quiz_questions_quiz_id_idx ON quiz_questions (quiz_id);
+
+-- Remplissage initial
+INSERT INTO quiz_catalog (quiz_id, titre, user_id, username, matiere, niveau, type, likes, question_count)
+SELECT qi.quiz_id, qi.titre, qi.user_id, u.username, qi.matiere, qi.niveau, qi.type, qi.likes, COUNT(qq.quiz_id)
+FROM quiz_infos qi
+JOIN users u ON qi.user_id = u.id
+JOIN quiz_questions qq ON qq.quiz_id = qi.quiz_id
+GROUP BY qi.quiz_id, u.username
+ON CONFLICT (quiz_id) DO NOTHING;
@@ -0,0 +1,11 @@
+-- Pagination par curseur sur /quiz/choix : tri (likes DESC, quiz_id DESC)
+-- Les index suivent exactement l'ordre de parcours de helpers.catalog.fetch_catalog_page
+
+DROP INDEX IF EXISTS quiz_catalog_public_likes_idx;
+CREATE INDEX IF NOT EXISTS quiz_catalog_public_keyset_idx
+    ON quiz_catalog (likes DESC, quiz_id DESC)
+    WHERE type = 'public' AND question_count > 3;
+
+DROP INDEX IF EXISTS quiz_catalog_user_id_idx;
+CREATE INDEX IF NOT EXISTS quiz_catalog_user_keyset_idx
+    ON quiz_catalog (user_id, likes DESC, quiz_id DESC);
@@ -0,0 +1,26 @@
+-- Recherche plein texte sur le catalogue des quiz (helpers.search.search_catalog)
+-- Remplace les prédicats ILIKE '%terme%' qu'aucun index ne pouvait servir
+
+CREATE EXTENSION IF NOT EXISTS unaccent;
+
+-- Configuration française qui ignore les accents ("penal" trouve "Pénal")
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'french_unaccent') THEN
+        CREATE TEXT SEARCH CONFIGURATION french_unaccent (COPY = french);
+        ALTER TEXT SEARCH CONFIGURATION french_unaccent
+            ALTER MAPPING FOR hword, hword_part, word WITH unaccent, french_stem;
+    END IF;
+END
+$$;
+
+-- Le titre pèse plus que l'auteur et la matière, eux-mêmes plus que le niveau
+ALTER TABLE quiz_catalog ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('french_unaccent', coalesce(titre, '')), 'A') ||
+        setweight(to_tsvector('french_unaccent', coalesce(username, '')), 'B') ||
+        setweight(to_tsvector('french_unaccent', coalesce(matiere, '')), 'B') ||
+        setweight(to_tsvector('french_unaccent', coalesce(niveau, '')), 'C')
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS quiz_catalog_search_idx ON quiz_catalog USING GIN (search_vector);
@@ -0,0 +1,21 @@
+-- Version du contenu de chaque quiz, utilisée comme ETag par /quiz/get_*_questions
+-- Toute écriture sur quiz_questions incrémente la version du quiz concerné
+
+ALTER TABLE quiz_infos ADD COLUMN IF NOT EXISTS content_version INTEGER NOT NULL DEFAULT 1;
+
+CREATE OR REPLACE FUNCTION bump_quiz_content_version() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE quiz_infos SET content_version = content_version + 1 WHERE quiz_id = OLD.quiz_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND (TG_OP = 'INSERT' OR NEW.quiz_id IS DISTINCT FROM OLD.quiz_id) THEN
+        UPDATE quiz_infos SET content_version = content_version + 1 WHERE quiz_id = NEW.quiz_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS quiz_questions_content_version ON quiz_questions;
+CREATE TRIGGER quiz_questions_content_version
+    AFTER INSERT OR UPDATE OR DELETE ON quiz_questions
+    FOR EACH ROW EXECUTE FUNCTION bump_quiz_content_version();
@@ -0,0 +1,25 @@
+-- Clés uniques utilisées par l'upsert de /quiz/update_stats (une seule requête, sans course)
+-- quiz_attempts : un essai par utilisateur et par quiz ; stats : une ligne par utilisateur et par matière
+-- Les doublons éventuels sont d'abord fusionnés
+
+BEGIN;
+
+CREATE TEMP TABLE stats_duplicates ON COMMIT DROP AS
+    SELECT user_id, matiere, SUM(posées) AS posées, SUM(trouvées) AS trouvées
+    FROM stats GROUP BY user_id, matiere HAVING COUNT(*) > 1;
+DELETE FROM stats USING stats_duplicates d
+    WHERE stats.user_id = d.user_id AND stats.matiere = d.matiere;
+INSERT INTO stats (user_id, matiere, posées, trouvées)
+    SELECT user_id, matiere, posées, trouvées FROM stats_duplicates;
+
+CREATE TEMP TABLE attempts_duplicates ON COMMIT DROP AS
+    SELECT user_id, quiz_id FROM quiz_attempts GROUP BY user_id, quiz_id HAVING COUNT(*) > 1;
+DELETE FROM quiz_attempts USING attempts_duplicates d
+    WHERE quiz_attempts.user_id = d.user_id AND quiz_attempts.quiz_id = d.quiz_id;
+INSERT INTO quiz_attempts (user_id, quiz_id)
+    SELECT user_id, quiz_id FROM attempts_duplicates;
+
+CREATE UNIQUE INDEX IF NOT EXISTS stats_user_matiere_key ON stats (user_id, matiere);
+CREATE UNIQUE INDEX IF NOT EXISTS quiz_attempts_user_quiz_key ON quiz_attempts (user_id, quiz_id);
+
+COMMIT;
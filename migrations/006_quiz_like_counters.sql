@@ -0,0 +1,13 @@
+-- Compteurs de likes répartis (LIKE_COUNTER_SHARDS > 1, voir helpers/likes.py)
+-- Chaque like incrémente l'une des lignes (quiz_id, shard) ; roll_up_likes() reporte
+-- périodiquement les deltas dans quiz_infos.likes et quiz_catalog.likes puis vide la table
+
+CREATE TABLE IF NOT EXISTS quiz_like_shards (
+    quiz_id INTEGER NOT NULL REFERENCES quiz_infos(quiz_id) ON DELETE CASCADE,
+    shard SMALLINT NOT NULL,
+    delta INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (quiz_id, shard)
+);
+
+-- Clé unique ciblée par INSERT ... ON CONFLICT (quiz_id, user_id) dans record_like()
+CREATE UNIQUE INDEX IF NOT EXISTS quiz_likes_quiz_user_key ON quiz_likes (quiz_id, user_id);
@@ -0,0 +1,11 @@
+-- Sessions côté serveur dans PostgreSQL (SESSION_BACKEND=postgres, voir helpers/sessions.py)
+-- Une ligne par session ; les sessions expirées sont ignorées à la lecture et supprimées
+-- par le balayage périodique (sweep_sessions), qui s'appuie sur l'index de expires_at
+
+CREATE TABLE IF NOT EXISTS sessions (
+    sid TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    expires_at TIMESTAMPTZ NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS sessions_expires_at_idx ON sessions (expires_at);
@@ -0,0 +1,22 @@
+-- Boîte d'envoi des emails (MAIL_OUTBOX=1, voir helpers/mail_outbox.py)
+-- La requête HTTP insère le message ; le thread d'envoi de chaque worker réserve les messages
+-- dus (FOR UPDATE SKIP LOCKED), les envoie et les marque envoyés, ou reprogramme l'essai avec
+-- un délai croissant. Après MAIL_MAX_ATTEMPTS échecs, le message passe en 'dead' et reste
+-- consultable (python -m helpers.mail_outbox status / retry-dead)
+
+CREATE TABLE IF NOT EXISTS mail_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    recipient TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    html TEXT,
+    body TEXT,
+    status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'sent', 'dead')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    last_error TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    sent_at TIMESTAMPTZ
+);
+
+-- Seuls les messages en attente sont parcourus par le thread d'envoi
+CREATE INDEX IF NOT EXISTS mail_outbox_pending_idx ON mail_outbox (next_attempt_at) WHERE status = 'pending';
@@ -0,0 +1,5 @@
+-- Suppression des emails envoyés après MAIL_SENT_RETENTION_DAYS jours (voir helpers/mail_outbox.py)
+-- Les messages envoyés contiennent les liens de réinitialisation : ils ne sont gardés que le
+-- temps de diagnostiquer un envoi. Le balayage du thread d'envoi s'appuie sur cet index.
+
+CREATE INDEX IF NOT EXISTS mail_outbox_sent_at_idx ON mail_outbox (sent_at) WHERE status = 'sent';
@@ -2,6 +2,7 @@
 """
 Script de monitoring pour l'application LawAndCode
 Usage: python monitoring_dashboard.py
+       python monitoring_dashboard.py --slow-queries --top 10
 """
 import os
 import json
@@ -85,6 +86,69 @@ class HealthMonitor:
         
         return stats
     
+    def analyze_slow_queries(self, log_file="logs/slow_queries.log", top=10):
+        """Classe les requêtes lentes (helpers/slow_queries.py) par temps total"""
+        if not os.path.exists(log_file):
+            return {"error": f"Log file {log_file} not found"}
+        
+        statements = {}
+        with open(log_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line.strip())
+                except json.JSONDecodeError:
+                    continue
+                stats = statements.setdefault(entry.get('fingerprint'), {
+                    'fingerprint': entry.get('fingerprint'),
+                    'sql': entry.get('sql'),
+                    'statement': entry.get('statement'),
+                    'count': 0,
+                    'total_ms': 0.0,
+                    'max_ms': 0.0,
+                    'durations': [],
+                    'endpoints': {},
+                    'explain': None
+                })
+                duration = entry.get('duration_ms', 0)
+                stats['count'] += 1
+                stats['total_ms'] += duration
+                stats['max_ms'] = max(stats['max_ms'], duration)
+                stats['durations'].append(duration)
+                endpoint = entry.get('endpoint') or '-'
+                stats['endpoints'][endpoint] = stats['endpoints'].get(endpoint, 0) + 1
+                if entry.get('explain'):
+                    stats['explain'] = entry['explain']  # plan le plus récent
+        
+        ranking = sorted(statements.values(), key=lambda stats: stats['total_ms'], reverse=True)[:top]
+        for stats in ranking:
+            durations = sorted(stats.pop('durations'))
+            stats['mean_ms'] = stats['total_ms'] / stats['count']
+            stats['p95_ms'] = durations[min(int(len(durations) * 0.95), len(durations) - 1)]
+        return {"total_statements": len(statements), "ranking": ranking}
+    
+    def print_slow_queries(self, log_file="logs/slow_queries.log", top=10, show_plans=False):
+        """Affiche le classement des requêtes lentes"""
+        print("🐢 REQUÊTES SQL LENTES (par temps total)")
+        print("-" * 40)
+        report = self.analyze_slow_queries(log_file, top)
+        if "error" in report:
+            print(f"❌ {report['error']}")
+            return
+        if not report['ranking']:
+            print("✅ Aucune requête lente enregistrée")
+            return
+        for rank, stats in enumerate(report['ranking'], 1):
+            endpoints = ", ".join(f"{name} ({count})" for name, count in
+                                  sorted(stats['endpoints'].items(), key=lambda item: -item[1]))
+            print(f"{rank:2d}. {stats['total_ms'] / 1000:8.2f}s total | {stats['count']:5d} fois | "
+                  f"moy {stats['mean_ms']:.0f}ms | p95 {stats['p95_ms']:.0f}ms | max {stats['max_ms']:.0f}ms")
+            print(f"    {stats['statement'] or stats['fingerprint']}: {stats['sql'][:160]}")
+            print(f"    routes: {endpoints}")
+            if show_plans and stats['explain']:
+                for plan_line in stats['explain'].splitlines():
+                    print(f"      {plan_line}")
+        print(f"({report['total_statements']} requête(s) distincte(s) au total)")
+    
     def generate_report(self):
         """Génère un rapport de monitoring complet"""
         print("=" * 60)
@@ -137,6 +201,10 @@ class HealthMonitor:
         
         print()
         
+        # Requêtes SQL lentes
+        self.print_slow_queries(top=5)
+        print()
+        
         # Alertes
         self.check_alerts(health, log_stats)
         if self.alerts:
@@ -184,12 +252,20 @@ def main():
                        help='Mode surveillance continue')
     parser.add_argument('--interval', type=int, default=60,
                        help='Intervalle de surveillance en secondes')
+    parser.add_argument('--slow-queries', action='store_true',
+                       help='Classement des requêtes SQL lentes uniquement (avec leurs plans)')
+    parser.add_argument('--slow-log', default='logs/slow_queries.log',
+                       help='Journal des requêtes lentes')
+    parser.add_argument('--top', type=int, default=10,
+                       help='Nombre de requêtes lentes affichées')
     
     args = parser.parse_args()
     
     monitor = HealthMonitor(args.url)
     
-    if args.watch:
+    if args.slow_queries:
+        monitor.print_slow_queries(args.slow_log, args.top, show_plans=True)
+    elif args.watch:
         print("Mode surveillance activé. Appuyez sur Ctrl+C pour arrêter.")
         try:
             while True:
@@ -1,5 +1,7 @@
-from flask import Blueprint, jsonify, render_template, request, session, redirect, url_for
-from helpers import login_required, apology, db_request, arg_is_present, clean_arg, log_security_event
+from flask import Blueprint, jsonify, make_response, render_template, request, session, redirect, url_for
+from helpers import login_required, apology, db_request, db_transaction, DatabaseError, prepared_statement, arg_is_present, clean_arg, log_security_event, refresh_quiz_catalog, \
+    fetch_catalog_page, fetch_public_page, decode_cursor, PAGE_SIZE, PUBLIC_LISTING, search_catalog, \
+    quiz_questions_cache, invalidate_quiz_questions, stats_write_behind, record_like
 
 quiz_bp = Blueprint('quiz', __name__, url_prefix='/quiz')
 
@@ -15,116 +17,160 @@ matieres = ["Droit Civil", "Droit Pénal", "Droit Administratif", "Droit des Soc
                  "Droit de la Protection des Données"]
 niveaux = ["L1", "L2", "L3", "M1", "M2"]
 
+# Requêtes les plus fréquentes, préparées une fois par connexion
+QUIZ_ID_BY_TITLE = prepared_statement(
+    'quiz_id_by_title', "SELECT quiz_id FROM quiz_infos WHERE titre = %s AND user_id = %s")
+QUIZ_QUESTIONS = prepared_statement('quiz_questions', """SELECT qi.content_version, qq.réponse, qq.question, qq.explication
+    FROM quiz_questions qq
+    JOIN quiz_infos qi ON qq.quiz_id = qi.quiz_id
+    WHERE qq.quiz_id = %s ORDER BY qq.id""")
+QUIZ_CONTENT_VERSION = prepared_statement(
+    'quiz_content_version', "SELECT content_version FROM quiz_infos WHERE quiz_id = %s")
+# Fin de quiz : essai et statistiques en un aller-retour (voir migrations/005_stats_upsert_keys.sql)
+RECORD_QUIZ_RESULT = prepared_statement('record_quiz_result', """WITH attempt AS (
+        INSERT INTO quiz_attempts (user_id, quiz_id) VALUES (%s, %s)
+        ON CONFLICT (user_id, quiz_id) DO NOTHING
+        RETURNING user_id
+    )
+    INSERT INTO stats (user_id, matiere, posées, trouvées)
+    SELECT user_id, %s, %s::integer, %s::integer FROM attempt
+    ON CONFLICT (user_id, matiere) DO UPDATE
+    SET posées = stats.posées + EXCLUDED.posées, trouvées = stats.trouvées + EXCLUDED.trouvées""")
+
 # Affiche la page de choix de quiz public ou privés
 @quiz_bp.route("/choix", methods=["GET", "POST"]) 
 def choix():
+    # Pagination par curseur : "after" et "before" désignent le dernier/premier quiz de la page affichée
+    # "page" ne sert plus qu'à l'affichage du numéro de page
+    page = int(request.values.get("page")) if request.values.get("page") else 1
+    after = decode_cursor(request.values.get("after"))
+    before = decode_cursor(request.values.get("before"))
+
     if request.method == "GET":
-        page = int(request.args.get("page")) if request.args.get("page") else 1
-        offset = int(page) * 10 - 10 # Nombre de résultats à exclure 
         type = request.args.get("quiz_type")
 
-        # Récupérer directement les quiz publics avec toutes les informations nécessaires
+        # Les quiz sont lus dans le catalogue matérialisé (voir helpers/catalog.py)
+        # qui contient déjà le nombre de questions, les likes et l'auteur de chaque quiz
         if type == "public":
-            rows = db_request("""
-                SELECT qi.titre, u.username, qi.matiere, qi.niveau, COUNT(*) AS nombre_de_questions, qi.likes
-                FROM quiz_questions qq
-                JOIN quiz_infos qi ON qq.quiz_id = qi.quiz_id
-                JOIN users u ON qi.user_id = u.id
-                WHERE qi.type = 'public'
-                GROUP BY qi.titre, u.username, qi.matiere, qi.niveau, qi.likes, qi.quiz_id
-                HAVING COUNT(*) > 3
-                ORDER BY qi.likes DESC
-                LIMIT 10 OFFSET %s
-            """, (offset,))
-
-            total_results = len(db_request("""SELECT qq.quiz_id FROM quiz_questions qq LEFT JOIN quiz_infos qi
-            ON qq.quiz_id = qi.quiz_id WHERE type = 'public' GROUP BY qq.quiz_id HAVING COUNT(*) > 3;""", fetch=True))
+            rows, next_cursor, prev_cursor, total_results = fetch_public_page(after, before)
 
         else:
             user_id = session.get("user_id")
 
-            rows = db_request("""
-                SELECT qi.titre, qi.quiz_id, COUNT(*) AS nombre_de_questions
-                FROM quiz_questions qq
-                JOIN quiz_infos qi ON qq.quiz_id = qi.quiz_id
-                JOIN users u ON qi.user_id = u.id
-                WHERE qi.user_id = %s
-                GROUP BY qi.titre, qi.quiz_id
-                LIMIT 10 OFFSET %s
-            """, (user_id, offset))
-
-            total_results = db_request(
-            """SELECT COUNT(*) FROM quiz_infos
-            WHERE user_id = %s""",
-            (user_id,), fetch=True)[0][0]
+            rows, next_cursor, prev_cursor, total_results = fetch_catalog_page(
+                "user_id = %s AND question_count > 0", (user_id,), after, before)
         
-        total_pages = (total_results + 9) // 10
+        total_pages = (total_results + PAGE_SIZE - 1) // PAGE_SIZE
 
         # Extrait les données de chaque tuple selon le type de quiz (moins de données si quiz privés)
         dossiers = [{"titre": row[0], "user_id": row[1], "matiere": row[2], 
                     "niveau": row[3], "nombre_de_questions": row[4], 
                     "likes": row[5]} for row in rows] if type == "public" else [{"titre": row[0], 
-                    "quiz_id": row[1], "nombre_de_questions": row[2]} for row in rows]
+                    "quiz_id": row[6], "nombre_de_questions": row[4]} for row in rows]
 
         return render_template("choice.html", type=type, response=dossiers, 
-                               total_pages=total_pages, page=page)
+                               total_pages=total_pages, page=page,
+                               next_cursor=next_cursor, prev_cursor=prev_cursor)
     
     else: # Méthode POST pour les recherches de quiz avec la barre de recherches
         query = request.form.get("query").strip() if request.form.get("query") else None
-        page = int(request.form.get("page")) if request.form.get("page") else 1
-        offset = int(page) * 10 - 10
         type = request.form.get("quiz_type")
     
         if not query:
             return apology("Veuillez fournir un terme de recherche")
 
-        # On nettoie la requête pour éviter les injections SQL
-        # Nettoyage spécifique aux requêtes ILIKE
-        param = f"%{query}%"
-        
-        rows = db_request("""
-            SELECT titre, username, matiere, niveau, COUNT(*) AS nombre_de_questions, likes, type 
-            FROM quiz_questions 
-            JOIN quiz_infos ON quiz_questions.quiz_id = quiz_infos.quiz_id
-            JOIN users ON quiz_infos.user_id = users.id
-            WHERE type = 'public' 
-            AND (titre ILIKE %s
-            OR username ILIKE %s
-            OR matiere ILIKE %s
-            OR niveau ILIKE %s)
-            GROUP BY titre, username, matiere, niveau, likes, type
-            HAVING COUNT(*) > 3
-            ORDER BY likes DESC LIMIT 10 OFFSET %s;
-        """, (param, param, param, param, offset,)) if type == "public" else db_request(
-        """SELECT titre, COUNT(*) FROM quiz_questions
-        JOIN quiz_infos ON quiz_questions.quiz_id = quiz_infos.quiz_id
-        WHERE (titre ILIKE %s) AND user_id = %s GROUP BY titre LIMIT 10 OFFSET %s""",
-        (param, session.get("user_id"), offset))
-
-        total_results = len(db_request("""SELECT titre FROM quiz_questions 
-            JOIN quiz_infos ON quiz_questions.quiz_id = quiz_infos.quiz_id
-            JOIN users ON quiz_infos.user_id = users.id
-            WHERE type = 'public' AND (titre ILIKE %s OR username ILIKE %s
-            OR matiere ILIKE %s OR niveau ILIKE %s) GROUP BY titre
-            HAVING COUNT(*) > 3""", 
-            (param, param, param, param), fetch=True)) if type == "public" else len(db_request(
-        """SELECT titre FROM quiz_infos
-        WHERE (titre ILIKE %s) AND user_id = %s;""",
-        (param, session.get("user_id"),), fetch=True))
-
-        total_pages = (total_results + 9) // 10  # Arrondi vers le haut pour obtenir le nombre total de pages
+        # Recherche plein texte classée par pertinence (voir helpers/search.py)
+        # La page et le nombre total de résultats sont obtenus en une seule requête
+        if type == "public":
+            rows, next_cursor, prev_cursor, total_results = search_catalog(
+                query, PUBLIC_LISTING, (), after, before)
+        else:
+            rows, next_cursor, prev_cursor, total_results = search_catalog(
+                query, "user_id = %s AND question_count > 0", (session.get("user_id"),), after, before)
+
+        total_pages = (total_results + PAGE_SIZE - 1) // PAGE_SIZE  # Arrondi vers le haut pour obtenir le nombre total de pages
         
-        # Extrait le premier élément de chaque tuple, 
-        # contenu dans la liste de tuples que renvoie la base de données
+        # Extrait les informations de chaque tuple renvoyé par le catalogue
         dossiers = [{"titre": row[0], "user_id": row[1], "matiere": row[2], 
-                    "niveau": row[3], "nombre_de_questions": row[4], "likes": row[5]} for row in rows] if type =="public" else [{"titre": row[0], "nombre_de_questions": row[1]} for row in rows]
+                    "niveau": row[3], "nombre_de_questions": row[4], "likes": row[5]} for row in rows] if type =="public" else [{"titre": row[0], "nombre_de_questions": row[4]} for row in rows]
         
         result_feedback = f"{total_results} résultat(s) trouvé(s) pour '{query}'" if dossiers else f"Aucun résultat trouvé pour '{query}'"
         
         return render_template("choice.html", type=type, response=dossiers, 
                                result_feedback=result_feedback, query=query,
-                            total_results=total_results, total_pages=total_pages, page=page)
+                            total_results=total_results, total_pages=total_pages, page=page,
+                            next_cursor=next_cursor, prev_cursor=prev_cursor)
+
+
+
+def load_quiz_questions(quiz_id, version):
+    """
+    Renvoie les questions d'un quiz et la version de son contenu, en passant par le cache.
+
+    La version (quiz_infos.content_version) est incrémentée par la base à chaque écriture
+    sur quiz_questions (voir migrations/004_quiz_content_version.sql). L'appelant la relit
+    en base (une ligne, par clé primaire) : une copie en cache d'une autre version est
+    rechargée, même si l'écriture a eu lieu dans un autre worker sans stockage partagé.
+
+    Args:
+        quiz_id (int): Identifiant normalisé du quiz.
+        version (int ou None): Version du contenu lue en base.
+
+    Returns:
+        dict: {"version": int ou None, "rows": [[réponse, question, explication], ...]},
+        ou la page d'erreur renvoyée par db_request.
+    """
+    def load():
+        rows = db_request(QUIZ_QUESTIONS, (quiz_id,), fetch=True)
+        if not isinstance(rows, list):
+            return rows
+        return {"version": rows[0][0] if rows else version, "rows": [list(row[1:]) for row in rows]}
+
+    return quiz_questions_cache.get_or_load(str(quiz_id), load,
+                                            is_current=lambda content: content["version"] == version)
+
+
+def questions_response(quiz_id, cache_control):
+    """
+    Construit la réponse JSON des questions d'un quiz avec un ETag fort.
 
+    Si le navigateur renvoie l'ETag qu'il possède déjà (If-None-Match), on répond 304
+    sans corps : un quiz rejoué ne coûte que la lecture de sa version (le contenu est en cache)
+    et aucun payload.
+
+    L'ETag est construit à partir de la version lue en base et de l'identifiant normalisé,
+    jamais de la copie en cache : "012" et "12" ont le même ETag.
+    """
+    # Même clé que invalidate_quiz_questions : "012" et "12" désignent le même quiz
+    try:
+        quiz_id = int(quiz_id)
+    except (TypeError, ValueError):
+        return apology("Quiz introuvable")
+
+    current = db_request(QUIZ_CONTENT_VERSION, (quiz_id,), fetch=True)
+    if not isinstance(current, list): # Erreur de base de données
+        return current
+    version = current[0][0] if current else None
+
+    content = load_quiz_questions(quiz_id, version)
+
+    if not isinstance(content, dict): # Erreur de base de données
+        return content
+
+    if len(content["rows"]) < 4:
+        return apology("Le quiz ne contient pas assez de questions")
+
+    etag = f"{quiz_id}-{version}"
+
+    if request.if_none_match.contains(etag):
+        response = make_response("", 304)
+    else:
+        response = jsonify(content["rows"])
+
+    response.set_etag(etag)
+    # Le navigateur garde la réponse mais la revalide à chaque partie
+    response.headers["Cache-Control"] = cache_control
+    return response
 
 
 # Renvoie vers Javascript les arrêts d'un titre donné pour un quiz public
@@ -137,13 +183,7 @@ def get_public_questions():
         return apology("titre manquant")
 
     try:
-        rows = db_request("""SELECT réponse, question, explication FROM quiz_questions
-                           WHERE quiz_id = %s""", (quiz_id,), fetch=True)
-
-        if len(rows) < 4:
-            return apology("Le quiz ne contient pas assez de questions")
-
-        return jsonify(rows)
+        return questions_response(quiz_id, "public, no-cache")
         
     except Exception as e:
         return apology("Une erreur est survenue. Le titre n'existe peut-être pas")
@@ -159,14 +199,7 @@ def get_private_questions():
     if not arg_is_present([quiz_id]):
         return apology("titre manquant")
 
-    rows = db_request("""SELECT réponse, question, explication FROM quiz_questions
-                      WHERE quiz_id = %s""",
-                      (quiz_id,), fetch=True)
-
-    if len(rows) < 4:
-        return apology("Le quiz ne contient pas assez de questions")
-        
-    return jsonify(rows)
+    return questions_response(quiz_id, "private, no-cache")
 
 
 @quiz_bp.route("/quiz") # Affiche la page où sera jouée le quiz avec les infos nécessaires
@@ -198,7 +231,7 @@ def quiz():
         # On retrouve l'id du quiz pour l'auteur correspondant
         # Parce qu'un titre peut être partagé par plusieurs auteurs
 
-        quiz_id = db_request("SELECT quiz_id FROM quiz_infos WHERE titre = %s AND user_id = %s",
+        quiz_id = db_request(QUIZ_ID_BY_TITLE,
                             (titre, author_id), fetch=True)
         
         if not quiz_id:
@@ -226,7 +259,7 @@ def quiz():
 
             return apology("Titre ou type de quiz manquant")
 
-        quiz_id = db_request("SELECT quiz_id FROM quiz_infos WHERE titre = %s AND user_id = %s",
+        quiz_id = db_request(QUIZ_ID_BY_TITLE,
                             (titre, session.get("user_id")), fetch=True)
 
         if not quiz_id:
@@ -261,33 +294,17 @@ def update_stats():
     if not arg_is_present([matiere, posées, trouvées, quiz_id]):
         return apology("Matière, nombre de questions ou quiz manquant")
 
-    attempt = db_request("SELECT 1 FROM quiz_attempts WHERE user_id = %s AND quiz_id = %s",
-                   (session.get("user_id"), quiz_id))
+    result = (session.get("user_id"), quiz_id, matiere, posées, trouvées)
 
-    if attempt:
-        return '', 204  # Si l'utilisateur a déjà joué ce quiz, on n'update pas les stats
+    # Écriture différée (STATS_WRITE_BEHIND=1) : le résultat sera écrit avec d'autres, par lot
+    if stats_write_behind is not None and stats_write_behind.submit(result):
+        return '', 204
+
+    # Une seule requête, sans course entre deux soumissions simultanées :
+    # l'essai n'est enregistré qu'une fois (clé unique user_id, quiz_id) et les stats de la
+    # matière ne sont créées ou incrémentées que si l'essai vient d'être inséré
+    db_request(RECORD_QUIZ_RESULT, result, fetch=False)
 
-    elif not attempt:
-        # On enregistre l'essai de l'utilisateur dans la base de données
-        db_request("INSERT INTO quiz_attempts (user_id, quiz_id) VALUES (%s, %s)",
-                   (session.get("user_id"), quiz_id), fetch=False)
-    
-    # Vérifier si l'utilisateur a une ligne dans la db pour la matière qu'il vient de jouer
-    if not db_request("SELECT matiere FROM stats WHERE matiere = %s AND user_id = %s",
-                     (matiere, session.get("user_id"),)):
-
-        # Si l'utilisateur n'a pas encore une ligne pour cette matière (parce qu'il y a jamais joué)
-        # On crée une nouvelle ligne pour cette matière pour l'utilisateur
-        db_request("INSERT INTO stats (user_id, matiere, posées, trouvées) VALUES (%s, %s, %s, %s)",
-                       (session.get("user_id"), matiere, posées, trouvées,), fetch=False)
-
-    else:  
-        # Sinon, l'utilisateur a déjà joué à un quiz dans cette matière
-        # la ligne est déjà présente, on update juste le nombre les résultats
-        # On incrémente le nombre de questions posées et trouvées pour cette matière
-        db_request("UPDATE stats SET posées = posées + %s, trouvées = trouvées + %s WHERE user_id = %s AND matiere = %s",
-                       (posées, trouvées, session.get("user_id"), matiere,), fetch=False)
-    
     # On retourne quand même une réponse valide 
     # même si cette route n'a pas vocation à renvoyer quelque chose à l'appelant
     return '', 204 
@@ -382,7 +399,7 @@ def add_new_question():
                 return apology("Veuillez renseigner tous les champs")
         
         # Récupérer le quiz_id d'abord pour optimiser les requêtes
-        quiz_id_row = db_request("SELECT quiz_id FROM quiz_infos WHERE titre = %s AND user_id = %s",
+        quiz_id_row = db_request(QUIZ_ID_BY_TITLE,
                              (dossier, session.get("user_id")), fetch=True)
 
         if not quiz_id_row:
@@ -401,17 +418,15 @@ def add_new_question():
             return redirect(url_for('quiz.modify_quiz_questions', 
                                     dossier=dossier, error_msg=error_msg, matiere=matiere))
 
-        # Insertion avec gestion des erreurs
+        # Insertion et mise à jour du catalogue ensemble (ou pas du tout)
         try:
-            db_request("""INSERT INTO quiz_questions (quiz_id, question, réponse, explication) 
-                    VALUES (%s, %s, %s, %s)""",
-                    (quiz_id, question, reponse, explication), fetch=False)
+            with db_transaction():
+                db_request("""INSERT INTO quiz_questions (quiz_id, question, réponse, explication) 
+                        VALUES (%s, %s, %s, %s)""",
+                        (quiz_id, question, reponse, explication), fetch=False)
+                refresh_quiz_catalog(quiz_id)
 
-            message = "Question ajoutée avec succès"
-            return redirect(url_for('quiz.modify_quiz_questions', 
-                                    dossier=dossier, message=message, matiere=matiere))
-
-        except Exception as e:
+        except DatabaseError as e:
             # Log pour debugging et sécurité
             log_security_event('quiz_question_add_failed', {
                 'user_id': session.get("user_id"),
@@ -431,6 +446,12 @@ def add_new_question():
 
             return redirect(url_for('quiz.modify_quiz_questions', 
                                     dossier=dossier, error_msg=error_msg, matiere=matiere))
+
+        invalidate_quiz_questions(quiz_id)
+
+        message = "Question ajoutée avec succès"
+        return redirect(url_for('quiz.modify_quiz_questions', 
+                                dossier=dossier, message=message, matiere=matiere))
  # Modifier les questions d'un quiz privé
 @quiz_bp.route("/modify_quiz_questions", methods=["GET", "POST"])
 @login_required
@@ -510,7 +531,7 @@ def modify_quiz_questions():
             error_msg = "Cette question existe déjà dans ce dossier"
 
             return redirect(url_for('quiz.modify_quiz_questions', dossier=dossier, error_msg=error_msg, matiere=matiere))
-        quiz_id_row = db_request("SELECT quiz_id FROM quiz_infos WHERE titre = %s AND user_id = %s",
+        quiz_id_row = db_request(QUIZ_ID_BY_TITLE,
                                  (dossier, session.get("user_id"),), fetch=True)
 
         if not quiz_id_row:
@@ -518,10 +539,16 @@ def modify_quiz_questions():
         quiz_id = quiz_id_row[0][0]
 
         # On met à jour la question, la réponse et l'explication dans la base de données
-        db_request("""UPDATE quiz_questions
-                   SET question = %s, réponse = %s, explication = %s WHERE quiz_id = %s
-                   AND question = %s AND réponse = %s""",
-                    (question, reponse, explication, quiz_id, initial_question, initial_reponse,), fetch=False)
+        try:
+            with db_transaction():
+                db_request("""UPDATE quiz_questions
+                           SET question = %s, réponse = %s, explication = %s WHERE quiz_id = %s
+                           AND question = %s AND réponse = %s""",
+                            (question, reponse, explication, quiz_id, initial_question, initial_reponse,), fetch=False)
+        except DatabaseError:
+            error_msg = "Erreur lors de la modification de la question"
+            return redirect(url_for('quiz.modify_quiz_questions', dossier=dossier, error_msg=error_msg, matiere=matiere))
+        invalidate_quiz_questions(quiz_id)
 
         message = "Question modifiée avec succès"
         # Redirige vers la page de modification des questions du quiz privé 
@@ -544,7 +571,7 @@ def delete_quiz_questions():
         if not arg_is_present([dossier, question, reponse, matiere]):
             return apology("Dossier, question ou réponse manquante")
 
-        quiz_id = db_request("SELECT quiz_id FROM quiz_infos WHERE titre = %s AND user_id = %s",
+        quiz_id = db_request(QUIZ_ID_BY_TITLE,
                              (dossier, session.get("user_id"),), fetch=True)
 
         if not quiz_id:
@@ -553,9 +580,17 @@ def delete_quiz_questions():
         # On récupère l'ID du quiz pour supprimer la question
         quiz_id = quiz_id[0][0]
 
-        db_request("""DELETE FROM quiz_questions
-                   WHERE quiz_id = %s AND question = %s AND réponse = %s""",
-                    (quiz_id, question, reponse), fetch=False)
+        # Suppression et mise à jour du catalogue ensemble (ou pas du tout)
+        try:
+            with db_transaction():
+                db_request("""DELETE FROM quiz_questions
+                           WHERE quiz_id = %s AND question = %s AND réponse = %s""",
+                            (quiz_id, question, reponse), fetch=False)
+                refresh_quiz_catalog(quiz_id)
+        except DatabaseError:
+            error_msg = "Erreur lors de la suppression de la question"
+            return redirect(url_for('quiz.modify_quiz_questions', dossier=dossier, error_msg=error_msg, matiere=matiere))
+        invalidate_quiz_questions(quiz_id)
                     
         message = "Question supprimée avec succès"
 
@@ -587,8 +622,20 @@ def rename_file():
         # pour éviter les doublons
         return redirect(url_for('quiz.choose_file', error_msg=error_msg)) 
 
-    db_request("UPDATE quiz_infos SET titre = %s WHERE titre = %s AND user_id = %s",
-               (nouveau_nom, dossier, session.get("user_id"),), fetch=False)
+    # Renommage et mise à jour du catalogue ensemble (ou pas du tout)
+    try:
+        with db_transaction():
+            renamed = db_request("UPDATE quiz_infos SET titre = %s WHERE titre = %s AND user_id = %s RETURNING quiz_id",
+                       (nouveau_nom, dossier, session.get("user_id"),), fetch=True)
+
+            if renamed:
+                refresh_quiz_catalog(renamed[0][0])
+    except DatabaseError:
+        error_msg = "Erreur lors du renommage du dossier"
+        return redirect(url_for('quiz.choose_file', error_msg=error_msg))
+
+    if not renamed:
+        return redirect(url_for('quiz.choose_file', error_msg="Dossier introuvable"))
 
     message = "Dossier renommé avec succès"
 
@@ -605,8 +652,13 @@ def delete_file():
     if not dossier:
         return apology("Dossier manquant")
 
-    db_request("DELETE FROM quiz_infos WHERE titre = %s AND user_id = %s", 
-               (dossier, session.get("user_id"),), fetch=False)
+    # La ligne correspondante de quiz_catalog est supprimée par ON DELETE CASCADE
+    deleted = db_request("DELETE FROM quiz_infos WHERE titre = %s AND user_id = %s RETURNING quiz_id", 
+               (dossier, session.get("user_id"),), fetch=True)
+
+    if isinstance(deleted, list):
+        for row in deleted:
+            invalidate_quiz_questions(row[0])
 
     # Redirige vers la page de choix de fichier après la suppression du dossier
     message = "Dossier supprimé avec succès"
@@ -625,27 +677,16 @@ def like_quiz():
     if not titre:
         return jsonify(success=False, error="Titre manquant")
     
-    # Vérifier si l'utilisateur a déjà aimé ce quiz
-    if db_request("""SELECT 1 FROM quiz_likes JOIN quiz_infos ON quiz_likes.quiz_id = quiz_infos.quiz_id 
-                  WHERE quiz_likes.user_id = %s AND quiz_infos.titre = %s""",
-                   (session.get("user_id"), titre), fetch=True):
-      
-        return jsonify(success=False, error="Vous avez déjà aimé ce quiz")
-
-    # Ajouter le like dans la base de données
-    quiz_id_row = db_request("SELECT quiz_id FROM quiz_infos WHERE titre = %s AND user_id = %s"
-                             , (titre, author_id), fetch=True)
+    # Like et compteurs en une requête : le compteur ne bouge que si le like est nouveau
+    result = record_like(session.get("user_id"), titre, author_id)
+    if result is None:
+        return jsonify(success=False, error="Une erreur s'est produite, réessayez plus tard")
 
-    if not quiz_id_row:
+    quiz_id, inserted = result
+    if quiz_id is None:
         return jsonify(success=False, error="Quiz introuvable")
-
-    quiz_id = quiz_id_row[0][0]
-
-    db_request("INSERT INTO quiz_likes (user_id, quiz_id) VALUES (%s, %s) ON CONFLICT (quiz_id, user_id) DO NOTHING",
-               (session.get("user_id"), quiz_id), fetch=False)
-
-    # Incrémenter le nombre de likes dans la table quiz_infos
-    db_request("UPDATE quiz_infos SET likes = likes + 1 WHERE quiz_id = %s", (quiz_id,), fetch=False)
+    if not inserted:
+        return jsonify(success=False, error="Vous avez déjà aimé ce quiz")
 
     return jsonify(success=True, message="Quiz aimé avec succès")
 
@@ -668,15 +709,25 @@ def modify_quiz_infos(): # Modifier les informations du quiz (accès, niveau, ma
                                 message="Type d'accès invalide", dossier=titre, matiere=matiere))
 
     # Vérifier si le titre existe pour l'utilisateur
-    if not db_request("SELECT 1 FROM quiz_infos WHERE titre = %s AND user_id = %s",
-                      (titre, author_id), fetch=True):
+    quiz_id_row = db_request(QUIZ_ID_BY_TITLE,
+                      (titre, author_id), fetch=True)
+    if not quiz_id_row:
         return redirect(url_for('quiz.modify_quiz_questions', 
                                 message="Quiz introuvable", dossier=titre, matiere=matiere))
 
-    # Mettre à jour les informations du quiz
-    updated = db_request("""UPDATE quiz_infos SET type = %s, niveau = %s, matiere = %s 
-    WHERE titre = %s AND user_id = %s""",
-               (type, niveau, matiere, titre, author_id), fetch=False)
+    quiz_id = quiz_id_row[0][0]
+
+    # Mettre à jour les informations du quiz et le catalogue ensemble (ou pas du tout)
+    try:
+        with db_transaction():
+            db_request("""UPDATE quiz_infos SET type = %s, niveau = %s, matiere = %s 
+            WHERE quiz_id = %s""",
+                       (type, niveau, matiere, quiz_id), fetch=False)
+            refresh_quiz_catalog(quiz_id)
+    except DatabaseError:
+        return redirect(url_for('quiz.modify_quiz_questions', 
+                                message="Erreur lors de la mise à jour du quiz", dossier=titre, matiere=matiere))
+    invalidate_quiz_questions(quiz_id)
 
     message = "Informations du quiz mises à jour avec succès"
 
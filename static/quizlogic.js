@@ -25,8 +25,11 @@ async function getArrets(){
         quiz_id = document.getElementById("quiz_id").textContent;
         // La route Flask "/get_private_questions" appelée avec POST renvoie la liste des arrêts 
         // associés à un quiz_id choisi
+        // "no-cache" : le navigateur réutilise sa copie si le serveur confirme (304) que l'ETag
+        // du quiz n'a pas changé, ce qui évite de retélécharger les questions à chaque partie
         let response = await fetch(`${collectArretsRoute}?quiz_id=${encodeURIComponent(quiz_id)}`, {
-            method: method
+            method: method,
+            cache: "no-cache"
         });
         let arrets = await response.json();
         return arrets;
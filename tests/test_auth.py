@@ -32,8 +32,7 @@ class TestAuthRoutes:
         # Mock des requêtes DB
         mock_db_request.side_effect = [
             [],  # Vérification username n'existe pas
-            None,  # Insertion utilisateur
-            [(1,)],  # Récupération ID utilisateur
+            [(1,)],  # Insertion utilisateur (RETURNING id)
             None  # Insertion login_attempts
         ]
         
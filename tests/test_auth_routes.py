@@ -16,6 +16,19 @@ class TestAuthLogin:
         assert response.status_code == 200
         assert b'login' in response.data.lower()
     
+    def test_login_get_writes_no_session(self, client):
+        """Test que l'affichage de la page de connexion ne crée ni ne modifie de session"""
+        response = client.get('/auth/login')
+        assert 'Set-Cookie' not in response.headers
+        
+        with client.session_transaction() as sess:
+            sess['user_id'] = 1
+            sess['username'] = 'testuser'
+        response = client.get('/auth/login')
+        assert 'Set-Cookie' not in response.headers
+        with client.session_transaction() as sess:
+            assert sess.get('user_id') == 1
+    
     def test_login_get_with_next_url(self, client):
         """Test que GET /auth/login conserve l'URL next"""
         response = client.get('/auth/login?next=/quiz/choix')
@@ -40,7 +53,7 @@ class TestAuthLogin:
         assert response.status_code == 403
         assert 'mot de passe' in response.data.decode().lower()
     
-    @patch('auth.routes.db_request')
+    @patch('helpers.accounts.db_request')
     def test_login_user_not_found(self, mock_db, client):
         """Test connexion avec utilisateur inexistant"""
         mock_db.return_value = []  # Utilisateur non trouvé
@@ -52,15 +65,14 @@ class TestAuthLogin:
         assert response.status_code == 403
         assert 'incorrect' in response.data.decode().lower()
     
-    @patch('auth.routes.db_request')
-    @patch('auth.routes.check_password_hash')
+    @patch('helpers.accounts.db_request')
+    @patch('auth.routes.verify_password')
     def test_login_wrong_password(self, mock_check_hash, mock_db, client):
         """Test connexion avec mauvais mot de passe"""
-        # Simuler utilisateur existant avec tentatives de connexion
+        # Compte et état de blocage (une requête), puis décompte de la tentative (une requête)
         mock_db.side_effect = [
-            [(1, 'testuser', 'hashed_password', 'test@example.com')],  # User exists
-            [(None, 5, 0)],  # Login attempts data
-            [(4,)]  # Update attempts result
+            [(1, 'hashed_password', 'test@example.com', False, 5, None)],
+            [(4,)]
         ]
         mock_check_hash.return_value = False
         
@@ -70,17 +82,52 @@ class TestAuthLogin:
         })
         assert response.status_code == 403
         assert 'incorrect' in response.data.decode().lower()
+        assert mock_db.call_count == 2
+        assert mock_db.call_args[0][1] == (1,)
     
-    @patch('auth.routes.db_request')
-    @patch('auth.routes.check_password_hash')
+    @patch('helpers.accounts.db_request')
+    @patch('auth.routes.verify_password')
+    def test_login_last_attempt_bans(self, mock_check_hash, mock_db, client):
+        """Test message de blocage quand la dernière tentative échoue"""
+        mock_db.side_effect = [
+            [(1, 'hashed_password', 'test@example.com', False, 1, None)],
+            [(0,)]
+        ]
+        mock_check_hash.return_value = False
+        
+        response = client.post('/auth/login', data={
+            'username': 'testuser',
+            'password': 'wrongpass'
+        })
+        assert response.status_code == 403
+        assert 'réessayez plus tard' in response.data.decode()
+    
+    @patch('helpers.accounts.db_request')
+    @patch('auth.routes.verify_password')
+    def test_login_banned(self, mock_check_hash, mock_db, client):
+        """Test refus sans vérifier le mot de passe pendant le blocage calculé par la base"""
+        mock_db.return_value = [(1, 'hashed_password', 'test@example.com', False, 0, 7.5)]
+        
+        response = client.post('/auth/login', data={
+            'username': 'testuser',
+            'password': 'correctpass'
+        })
+        assert response.status_code == 403
+        assert 'réessayez dans 7.5 minute(s)' in response.data.decode()
+        mock_check_hash.assert_not_called()
+        assert mock_db.call_count == 1
+    
+    @patch('auth.routes.needs_rehash', return_value=False)
+    @patch('helpers.accounts.db_request')
+    @patch('auth.routes.verify_password')
     @patch('auth.routes.log_user_action')
     @patch('auth.routes.capture_user_context')
-    def test_login_success(self, mock_capture, mock_log, mock_check_hash, mock_db, client):
+    def test_login_success(self, mock_capture, mock_log, mock_check_hash, mock_db, mock_rehash, client):
         """Test connexion réussie"""
         # Simuler utilisateur valide et mot de passe correct
         mock_db.side_effect = [
-            [(1, 'testuser', 'hashed_password', 'test@example.com')],  # User exists
-            [(None, 5, 0)],  # Login attempts data
+            [(1, 'hashed_password', 'test@example.com', False, 5, None)],
+            None  # Remise à zéro des tentatives
         ]
         mock_check_hash.return_value = True
         
@@ -92,11 +139,50 @@ class TestAuthLogin:
         # Vérifier la redirection vers l'index
         assert response.status_code == 302
         assert 'Bienvenu' in response.location or '/' in response.location
+        mock_capture.assert_called_once_with(user_id=1, username='testuser', email='test@example.com')
         
         # Vérifier que la session contient l'utilisateur
         with client.session_transaction() as sess:
             assert sess.get('user_id') == 1
             assert sess.get('username') == 'testuser'
+    
+    @patch('auth.routes.hash_password', return_value='scrypt:32768:8:1$new$hash')
+    @patch('auth.routes.needs_rehash', return_value=True)
+    @patch('helpers.accounts.db_request')
+    @patch('auth.routes.verify_password', return_value=True)
+    @patch('auth.routes.capture_user_context')
+    def test_login_rehash_outdated_hash(self, mock_capture, mock_verify, mock_db, mock_rehash, mock_hash, client):
+        """Test que le hachage est refait à la connexion quand la méthode configurée a changé"""
+        mock_db.side_effect = [
+            [(1, 'pbkdf2:sha256:1000$old$hash', None, False, 5, None)],
+            None,  # Remise à zéro des tentatives
+            None   # Nouveau hachage
+        ]
+        
+        response = client.post('/auth/login', data={
+            'username': 'testuser',
+            'password': 'correctpass'
+        })
+        
+        assert response.status_code == 302
+        mock_hash.assert_called_once_with('correctpass')
+        assert mock_db.call_args[0][1] == ('scrypt:32768:8:1$new$hash', 1)
+    
+    @patch('auth.routes.log_security_event')
+    @patch('helpers.accounts.db_request')
+    def test_login_rate_limited(self, mock_db, mock_log, client):
+        """Test refus (429) avant toute requête en base quand le débit est dépassé"""
+        with patch('auth.routes.check_login_rate', return_value=('ip', 30)):
+            response = client.post('/auth/login', data={
+                'username': 'testuser',
+                'password': 'wrongpass'
+            })
+        
+        assert response.status_code == 429
+        assert response.headers['Retry-After'] == '30'
+        assert 'Trop de tentatives' in response.data.decode()
+        mock_db.assert_not_called()
+        assert mock_log.call_args[0][0] == 'login_rate_limited'
 
 
 class TestAuthRegister:
@@ -216,7 +302,7 @@ class TestAuthRegister:
     
     @patch('auth.routes.db_request')
     @patch('auth.routes.is_valid_email')
-    @patch('auth.routes.generate_password_hash')
+    @patch('auth.routes.hash_password')
     @patch('auth.routes.generate_reset_token')
     @patch('auth.routes.log_user_action')
     def test_register_success(self, mock_log, mock_token, mock_hash, mock_email_valid, mock_db, client):
@@ -227,8 +313,7 @@ class TestAuthRegister:
         mock_db.side_effect = [
             [],  # Username doesn't exist
             [],  # Email doesn't exist
-            None,  # Insert user
-            [(1,)],  # Get user ID
+            [(1,)],  # Insert user RETURNING id
             None,  # Insert login attempts
         ]
         
@@ -248,6 +333,35 @@ class TestAuthRegister:
             assert sess.get('user_id') == 1
             assert sess.get('username') == 'newuser'
 
+    @patch('auth.routes.hash_password', return_value='hashed_password')
+    @patch('auth.routes.log_user_action')
+    @patch('helpers.core.get_connection')
+    def test_register_insert_failure_rolls_back(self, mock_get_conn, mock_log, mock_hash, client):
+        """Test INSERT en échec (même nom enregistré entre-temps) : page d'erreur, transaction annulée, pas de session"""
+        conn = MagicMock()
+        cursor = conn.cursor.return_value
+        cursor.fetchall.return_value = []  # Username doesn't exist (encore)
+
+        def execute(sql, params=()):
+            if sql.startswith('INSERT INTO users'):
+                raise Exception('duplicate key value violates unique constraint "users_username_key"')
+        cursor.execute.side_effect = execute
+        mock_get_conn.return_value = conn
+
+        response = client.post('/auth/register', data={
+            'username': 'newuser',
+            'password': 'Test123!',
+            'confirmation': 'Test123!'
+        })
+
+        assert response.status_code == 400
+        executed = [c[0][0] for c in cursor.execute.call_args_list]
+        assert not any(sql.startswith('SELECT id FROM users') for sql in executed)
+        conn.rollback.assert_called()
+        mock_log.assert_not_called()
+        with client.session_transaction() as sess:
+            assert 'user_id' not in sess
+
 
 class TestAuthLogout:
     """Tests pour la route de déconnexion"""
@@ -406,8 +520,8 @@ class TestAuthPasswordReset:
         future_time = datetime.now() + timedelta(hours=1)
         mock_db.side_effect = [
             [(1, 1, 'testuser', future_time, False)],  # Valid token
-            None,  # Update password
             [(1,)],  # Mark token as used
+            None,  # Update password
             None   # Delete used tokens
         ]
         
@@ -419,6 +533,26 @@ class TestAuthPasswordReset:
         assert response.status_code == 200
         assert 'réinitialisé avec succès' in response.data.decode()
 
+    @patch('auth.routes.hash_password', return_value='hashed_password')
+    @patch('auth.routes.db_request')
+    def test_reset_password_token_already_used(self, mock_db, mock_hash, client):
+        """Test token consommé entre-temps : le mot de passe n'est pas modifié"""
+        future_time = datetime.now() + timedelta(hours=1)
+        mock_db.side_effect = [
+            [(1, 1, 'testuser', future_time, False)],  # Valid token
+            [],  # Mark token as used : déjà utilisé
+        ]
+
+        response = client.post('/auth/reset_password/valid_token', data={
+            'password': 'NewPass123!',
+            'confirmation': 'NewPass123!'
+        })
+
+        assert response.status_code == 400
+        assert 'déjà utilisé' in response.data.decode()
+        executed = [c[0][0] for c in mock_db.call_args_list]
+        assert not any(sql.startswith('UPDATE users') for sql in executed)
+
 
 class TestAuthDeleteAccount:
     """Tests pour la suppression de compte"""
@@ -0,0 +1,180 @@
+"""
+Tests pour le cache des contenus de quiz (helpers/cache.py)
+"""
+import pytest
+from unittest.mock import patch, MagicMock
+
+from helpers.cache import LRUCache, InMemoryStore, ReadThroughCache, MISSING
+
+
+@pytest.mark.cache
+class TestLRUCache:
+    """Tests du cache LRU en mémoire"""
+
+    def test_get_and_set(self):
+        """Test lecture d'une valeur mise en cache"""
+        cache = LRUCache(max_entries=4, ttl=60)
+
+        cache.set('a', [1, 2])
+
+        assert cache.get('a') == [1, 2]
+        assert cache.get('b') is MISSING
+        assert cache.stats()['hits'] == 1
+        assert cache.stats()['misses'] == 1
+
+    def test_eviction_of_least_recently_used(self):
+        """Test éviction de l'entrée la moins récemment utilisée"""
+        cache = LRUCache(max_entries=2, ttl=60)
+
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')  # 'a' devient la plus récente
+        cache.set('c', 3)
+
+        assert cache.get('b') is MISSING
+        assert cache.get('a') == 1
+        assert cache.stats()['evictions'] == 1
+
+    def test_expired_entry(self):
+        """Test qu'une entrée expirée n'est plus servie"""
+        cache = LRUCache(max_entries=2, ttl=60)
+
+        with patch('helpers.cache.time.monotonic', return_value=1000.0):
+            cache.set('a', 1, ttl=5)
+        with patch('helpers.cache.time.monotonic', return_value=1006.0):
+            assert cache.get('a') is MISSING
+
+
+@pytest.mark.cache
+class TestReadThroughCache:
+    """Tests du cache en lecture à deux niveaux"""
+
+    def test_loader_called_once(self):
+        """Test que la base n'est interrogée qu'au premier appel"""
+        cache = ReadThroughCache('test', LRUCache(), ttl=60)
+        loader = MagicMock(return_value=[('Réponse', 'Question', None)])
+
+        first = cache.get_or_load('1', loader)
+        second = cache.get_or_load('1', loader)
+
+        assert first == second == [['Réponse', 'Question', None]]
+        loader.assert_called_once()
+
+    def test_error_page_not_cached(self):
+        """Test que la page d'erreur de db_request n'est pas mise en cache"""
+        cache = ReadThroughCache('test', LRUCache(), ttl=60)
+        loader = MagicMock(return_value=('<html>erreur</html>', 400))
+
+        cache.get_or_load('1', loader)
+        cache.get_or_load('1', loader)
+
+        assert loader.call_count == 2
+
+    def test_invalidation_reaches_other_workers(self):
+        """Test qu'une invalidation via le stockage partagé rend obsolète le cache local d'un autre worker"""
+        shared = InMemoryStore()
+        worker_a = ReadThroughCache('test', LRUCache(), shared, ttl=60)
+        worker_b = ReadThroughCache('test', LRUCache(), shared, ttl=60)
+
+        worker_a.get_or_load('1', lambda: ['ancienne'])
+        assert worker_b.get_or_load('1', lambda: ['jamais lue']) == ['ancienne']
+
+        worker_a.invalidate('1')
+
+        assert worker_b.get_or_load('1', lambda: ['nouvelle']) == ['nouvelle']
+
+    def test_load_invalidated_meanwhile_not_cached(self):
+        """Test qu'une valeur lue avant une invalidation survenue pendant le chargement n'est pas mise en cache"""
+        cache = ReadThroughCache('test', LRUCache(), ttl=60)
+
+        def slow_load():
+            cache.invalidate('1')  # Écriture concurrente pendant la lecture en base
+            return ['ancienne']
+
+        assert cache.get_or_load('1', slow_load) == ['ancienne']
+        assert cache.get_or_load('1', lambda: ['nouvelle']) == ['nouvelle']
+
+    def test_stale_copy_reloaded(self):
+        """Test qu'une copie que is_current juge dépassée est rechargée"""
+        cache = ReadThroughCache('test', LRUCache(), ttl=60)
+        cache.get_or_load('1', lambda: {'version': 1})
+
+        value = cache.get_or_load('1', lambda: {'version': 2}, is_current=lambda v: v['version'] == 2)
+
+        assert value == {'version': 2}
+        assert cache.get_or_load('1', lambda: {'version': 3}) == {'version': 2}
+
+
+def question_loads(mock_db):
+    """Nombre de lectures des questions (hors lecture de la version du contenu)"""
+    from quiz.routes import QUIZ_QUESTIONS
+    return sum(1 for c in mock_db.call_args_list if c[0][0] is QUIZ_QUESTIONS)
+
+
+@pytest.mark.cache
+class TestQuizQuestionsCache:
+    """Tests de l'utilisation du cache par les routes quiz"""
+
+    def test_public_questions_served_from_cache(self, client):
+        """Test qu'un quiz rejoué n'interroge pas la base"""
+        rows = [(1, 'Réponse %d' % i, 'Question %d' % i, None) for i in range(4)]
+
+        with patch('quiz.routes.db_request') as mock_db:
+            mock_db.return_value = rows
+
+            assert client.get('/quiz/get_public_questions?quiz_id=7').status_code == 200
+            assert client.get('/quiz/get_public_questions?quiz_id=7').status_code == 200
+
+            assert question_loads(mock_db) == 1
+
+    def test_write_from_other_worker_reloads(self, client):
+        """Test qu'une version en base plus récente que la copie en cache (écriture dans un autre worker) recharge les questions"""
+        with patch('quiz.routes.db_request') as mock_db:
+            mock_db.return_value = [(1, 'Réponse %d' % i, 'Question %d' % i, None) for i in range(4)]
+            assert client.get('/quiz/get_public_questions?quiz_id=7').status_code == 200
+
+            mock_db.return_value = [(2, 'Nouvelle %d' % i, 'Question %d' % i, None) for i in range(4)]
+            response = client.get('/quiz/get_public_questions?quiz_id=7')
+
+            assert response.get_json()[0][0] == 'Nouvelle 0'
+            assert question_loads(mock_db) == 2
+
+    def test_invalidation_reaches_non_canonical_quiz_id(self, client):
+        """Test que quiz_id=012 partage l'entrée de cache invalidée par invalidate_quiz_questions(12)"""
+        from helpers.cache import invalidate_quiz_questions
+        rows = [(1, 'Réponse %d' % i, 'Question %d' % i, None) for i in range(4)]
+
+        with patch('quiz.routes.db_request') as mock_db:
+            mock_db.return_value = rows
+
+            assert client.get('/quiz/get_public_questions?quiz_id=012').status_code == 200
+            assert client.get('/quiz/get_public_questions?quiz_id=12').status_code == 200
+            assert question_loads(mock_db) == 1
+            assert mock_db.call_args[0][1] == (12,)
+
+            invalidate_quiz_questions(12)
+            assert client.get('/quiz/get_public_questions?quiz_id=012').status_code == 200
+            assert question_loads(mock_db) == 2
+
+    def test_add_question_invalidates_cache(self, client):
+        """Test que l'ajout d'une question invalide le cache du quiz"""
+        with client.session_transaction() as sess:
+            sess['user_id'] = 1
+            sess['username'] = 'testuser'
+
+        with patch('quiz.routes.db_request') as mock_db, \
+                patch('quiz.routes.refresh_quiz_catalog'), \
+                patch('quiz.routes.invalidate_quiz_questions') as mock_invalidate:
+            mock_db.side_effect = [
+                [(123,)],  # quiz_id
+                [],  # La question n'existe pas encore
+                None  # Insertion
+            ]
+
+            response = client.post('/quiz/add_new_question?dossier=Test&matiere=Droit Civil', data={
+                'question': 'Nouvelle question ?',
+                'réponse': 'Nouvelle réponse'
+            })
+
+            assert response.status_code == 302
+            mock_invalidate.assert_called_once_with(123)
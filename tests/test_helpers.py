@@ -6,6 +6,9 @@ from unittest.mock import patch, MagicMock, call
 import psycopg2
 from psycopg2 import pool
 import os
+import json
+import logging
+import threading
 from flask import session, request
 
 
@@ -98,7 +101,7 @@ class TestConnectionPool:
         
         return_connection(mock_conn)
         
-        mock_pool.putconn.assert_called_once_with(mock_conn)
+        mock_pool.putconn.assert_called_once_with(mock_conn, close=False)
 
 
 class TestLoginRequired:
@@ -281,6 +284,311 @@ class TestDatabaseRequest:
         mock_cursor.execute.assert_called_once_with("SELECT * FROM test WHERE id = %s", (123,))
 
 
+class TestDatabaseTransaction:
+    """Tests pour db_transaction"""
+
+    @patch('helpers.core.return_connection')
+    @patch('helpers.core.get_connection')
+    def test_single_connection_and_commit(self, mock_get_conn, mock_return_conn):
+        """Toutes les requêtes du bloc partagent une connexion et un seul commit"""
+        from helpers.core import db_request, db_transaction
+
+        mock_conn = MagicMock()
+        mock_conn.cursor.return_value.fetchall.return_value = [(1,)]
+        mock_get_conn.return_value = mock_conn
+
+        with db_transaction() as tx:
+            assert tx.query("SELECT 1") == [(1,)]
+            db_request("UPDATE test SET a = 1", fetch=False)
+            mock_conn.commit.assert_not_called()
+
+        mock_get_conn.assert_called_once()
+        mock_conn.commit.assert_called_once()
+        mock_conn.rollback.assert_not_called()
+        mock_return_conn.assert_called_once_with(mock_conn)
+
+    @patch('helpers.core.return_connection')
+    @patch('helpers.core.get_connection')
+    def test_failed_statement_rolls_back(self, mock_get_conn, mock_return_conn, test_app):
+        """Une requête en échec annule toute la transaction"""
+        from helpers.core import DatabaseError, db_request, db_transaction
+
+        mock_conn = MagicMock()
+        mock_conn.cursor.return_value.execute.side_effect = [None, Exception("DB Error")]
+        mock_get_conn.return_value = mock_conn
+        after_failure = MagicMock()
+
+        with test_app.test_request_context():
+            with pytest.raises(DatabaseError):
+                with db_transaction():
+                    db_request("INSERT INTO test VALUES (1)", fetch=False)
+                    db_request("INVALID SQL")
+                    after_failure()  # la suite du bloc n'est pas exécutée
+
+        after_failure.assert_not_called()
+        mock_conn.commit.assert_not_called()
+        mock_conn.rollback.assert_called()
+        mock_return_conn.assert_called_once_with(mock_conn)
+
+    @patch('helpers.core.return_connection')
+    @patch('helpers.core.get_connection')
+    def test_exception_in_block_rolls_back(self, mock_get_conn, mock_return_conn):
+        """Une exception levée dans le bloc annule la transaction et est propagée"""
+        from helpers.core import db_request, db_transaction
+
+        mock_conn = MagicMock()
+        mock_get_conn.return_value = mock_conn
+
+        with pytest.raises(ValueError):
+            with db_transaction():
+                db_request("INSERT INTO test VALUES (1)", fetch=False)
+                raise ValueError("boom")
+
+        mock_conn.commit.assert_not_called()
+        mock_conn.rollback.assert_called_once()
+        mock_return_conn.assert_called_once_with(mock_conn)
+
+    @patch('helpers.core.return_connection')
+    @patch('helpers.core.get_connection')
+    def test_commit_failure_on_broken_connection(self, mock_get_conn, mock_return_conn, test_app):
+        """COMMIT en échec et rollback impossible : DatabaseError d'origine, connexion fermée et retirée de g"""
+        from flask import g
+        from helpers.core import DatabaseError, db_request, db_transaction
+
+        mock_conn = MagicMock()
+        mock_conn.commit.side_effect = Exception("server closed the connection unexpectedly")
+        mock_conn.rollback.side_effect = Exception("connection already closed")
+        mock_get_conn.return_value = mock_conn
+
+        with test_app.test_request_context():
+            with pytest.raises(DatabaseError, match="server closed the connection"):
+                with db_transaction():
+                    db_request("INSERT INTO test VALUES (1)", fetch=False)
+            assert g.get('_db_connection') is None
+
+        mock_return_conn.assert_called_once_with(mock_conn, close=True)
+
+    @patch('helpers.core.return_connection')
+    @patch('helpers.core.get_connection')
+    def test_nested_block_joins_outer_transaction(self, mock_get_conn, mock_return_conn):
+        """Un bloc imbriqué ne valide rien : seul le bloc englobant commit"""
+        from helpers.core import db_request, db_transaction
+
+        mock_conn = MagicMock()
+        mock_get_conn.return_value = mock_conn
+
+        with db_transaction() as outer:
+            with db_transaction() as inner:
+                assert inner is outer
+                db_request("UPDATE test SET a = 1", fetch=False)
+            mock_conn.commit.assert_not_called()
+
+        mock_conn.commit.assert_called_once()
+
+    @patch('helpers.core.get_connection')
+    def test_no_connection_without_query(self, mock_get_conn):
+        """Un bloc sans requête n'emprunte aucune connexion au pool"""
+        from helpers.core import db_transaction
+
+        with db_transaction():
+            pass
+
+        mock_get_conn.assert_not_called()
+
+    @patch('helpers.core.return_connection')
+    @patch('helpers.core.get_connection')
+    def test_db_request_after_block_uses_own_connection(self, mock_get_conn, mock_return_conn):
+        """Après le bloc, db_request retrouve son fonctionnement habituel"""
+        from helpers.core import db_request, db_transaction
+
+        mock_conn = MagicMock()
+        mock_get_conn.return_value = mock_conn
+
+        with db_transaction():
+            db_request("UPDATE test SET a = 1", fetch=False)
+        db_request("UPDATE test SET a = 2", fetch=False)
+
+        assert mock_get_conn.call_count == 2
+        assert mock_conn.commit.call_count == 2
+
+
+class TestPreparedStatements:
+    """Tests pour les requêtes préparées côté serveur"""
+
+    def test_placeholders_converted(self):
+        """Les paramètres %s deviennent $1, $2... dans PREPARE"""
+        from helpers.core import PreparedStatement
+
+        statement = PreparedStatement('test_lookup', "SELECT id FROM t WHERE a = %s AND b LIKE 'x%%' AND c = %s")
+
+        assert statement.prepare_text == "PREPARE test_lookup AS SELECT id FROM t WHERE a = $1 AND b LIKE 'x%' AND c = $2"
+        assert statement.execute_text == "EXECUTE test_lookup (%s, %s)"
+        assert statement == "SELECT id FROM t WHERE a = %s AND b LIKE 'x%%' AND c = %s"
+
+    def test_name_reused_with_other_text(self):
+        """Un même nom ne peut pas désigner deux requêtes différentes"""
+        from helpers.core import prepared_statement
+
+        prepared_statement('test_unique', "SELECT 1")
+        assert prepared_statement('test_unique', "SELECT 1") == "SELECT 1"
+        with pytest.raises(ValueError):
+            prepared_statement('test_unique', "SELECT 2")
+
+    @patch('helpers.core.get_connection')
+    def test_prepared_once_per_connection(self, mock_get_conn):
+        """PREPARE n'est envoyé qu'une fois par connexion, puis seul EXECUTE est utilisé"""
+        from helpers.core import db_request, PreparedStatement
+
+        statement = PreparedStatement('test_by_id', "SELECT * FROM test WHERE id = %s")
+        first_conn, second_conn = MagicMock(), MagicMock()
+        mock_get_conn.side_effect = [first_conn, first_conn, second_conn]
+
+        db_request(statement, (1,))
+        db_request(statement, (2,))
+        db_request(statement, (3,))
+
+        assert first_conn.cursor.return_value.execute.call_args_list == [
+            call("PREPARE test_by_id AS SELECT * FROM test WHERE id = $1"),
+            call("EXECUTE test_by_id (%s)", (1,)),
+            call("EXECUTE test_by_id (%s)", (2,)),
+        ]
+        assert second_conn.cursor.return_value.execute.call_args_list == [
+            call("PREPARE test_by_id AS SELECT * FROM test WHERE id = $1"),
+            call("EXECUTE test_by_id (%s)", (3,)),
+        ]
+
+    @patch('helpers.core.PREPARED_STATEMENTS_ENABLED', False)
+    @patch('helpers.core.get_connection')
+    def test_disabled(self, mock_get_conn):
+        """Désactivées, les requêtes préparées s'exécutent comme du SQL ordinaire"""
+        from helpers.core import db_request, PreparedStatement
+
+        statement = PreparedStatement('test_plain', "SELECT * FROM test WHERE id = %s")
+        mock_conn = MagicMock()
+        mock_get_conn.return_value = mock_conn
+
+        db_request(statement, (1,))
+
+        mock_conn.cursor.return_value.execute.assert_called_once_with("SELECT * FROM test WHERE id = %s", (1,))
+
+
+class TestRequestConnection:
+    """Tests pour la connexion liée au contexte d'application"""
+
+    @patch('helpers.core.return_connection')
+    @patch('helpers.core.get_connection')
+    def test_connection_reused_within_request(self, mock_get_conn, mock_return_conn, test_app):
+        """Les requêtes SQL d'une même requête HTTP partagent une connexion, rendue à la fin"""
+        from helpers.core import db_request
+
+        mock_conn = MagicMock()
+        mock_get_conn.return_value = mock_conn
+
+        with test_app.test_request_context():
+            db_request("SELECT 1")
+            db_request("SELECT 2")
+            mock_return_conn.assert_not_called()
+
+        mock_get_conn.assert_called_once()
+        assert mock_conn.commit.call_count == 2  # chaque requête reste validée individuellement
+        mock_return_conn.assert_called_once_with(mock_conn)
+
+    @patch('helpers.core.return_connection')
+    @patch('helpers.core.get_connection')
+    def test_transaction_uses_request_connection(self, mock_get_conn, mock_return_conn, test_app):
+        """Une transaction dans une requête HTTP utilise la connexion du contexte"""
+        from helpers.core import db_request, db_transaction
+
+        mock_conn = MagicMock()
+        mock_get_conn.return_value = mock_conn
+
+        with test_app.test_request_context():
+            db_request("SELECT 1")
+            with db_transaction():
+                db_request("UPDATE test SET a = 1", fetch=False)
+            db_request("SELECT 2")
+            mock_return_conn.assert_not_called()
+
+        mock_get_conn.assert_called_once()
+        mock_return_conn.assert_called_once_with(mock_conn)
+
+    @patch('helpers.core.return_connection')
+    @patch('helpers.core.get_connection')
+    def test_connection_discarded_after_error(self, mock_get_conn, mock_return_conn, test_app):
+        """Après une erreur, la connexion est rendue et la requête suivante en obtient une neuve"""
+        from helpers.core import db_request
+
+        broken_conn, fresh_conn = MagicMock(), MagicMock()
+        broken_conn.cursor.return_value.execute.side_effect = Exception("connection lost")
+        mock_get_conn.side_effect = [broken_conn, fresh_conn]
+
+        with test_app.test_request_context():
+            assert isinstance(db_request("SELECT 1"), tuple)
+            mock_return_conn.assert_called_once_with(broken_conn)
+            db_request("SELECT 2")
+
+        fresh_conn.commit.assert_called_once()
+        assert mock_return_conn.call_args_list == [call(broken_conn), call(fresh_conn)]
+
+
+
+class TestRequestDBStats:
+    """Tests des statistiques SQL par requête HTTP"""
+
+    @patch('helpers.core.return_connection')
+    @patch('helpers.core.get_connection')
+    def test_statements_and_rows_counted(self, mock_get_conn, mock_return_conn, test_app):
+        """Nombre de requêtes, lignes lues et temps cumulés sur la requête HTTP"""
+        from helpers.core import db_request, request_db_stats
+
+        mock_conn = MagicMock()
+        mock_conn.cursor.return_value.fetchall.return_value = [(1,), (2,)]
+        mock_get_conn.return_value = mock_conn
+
+        with test_app.test_request_context():
+            db_request("SELECT id FROM test")
+            db_request("UPDATE test SET a = 1", fetch=False)
+            stats = request_db_stats()
+            assert stats.statements == 2
+            assert stats.rows == 2
+            assert stats.time >= 0
+
+        with test_app.test_request_context():
+            assert request_db_stats().statements == 0  # une nouvelle requête repart de zéro
+
+    @patch('helpers.core.return_connection')
+    @patch('helpers.core.get_connection')
+    def test_debug_header_log_and_metrics(self, mock_get_conn, mock_return_conn):
+        """En-tête X-DB-Stats (DB_STATS_HEADER=1), ligne de log et métriques par route"""
+        from flask import Flask
+        from helpers.core import db_request
+        from helpers.monitoring import metrics, setup_request_monitoring
+
+        mock_conn = MagicMock()
+        mock_conn.cursor.return_value.fetchall.return_value = [(1,)]
+        mock_get_conn.return_value = mock_conn
+
+        app = Flask(__name__)
+        app.secret_key = 'test'
+
+        @app.route('/n_plus_one')
+        def n_plus_one():
+            for _ in range(3):
+                db_request("SELECT 1")
+            return 'ok'
+
+        with patch.dict(os.environ, {'DB_STATS_HEADER': '1'}):
+            setup_request_monitoring(app)
+        metrics.reset()
+
+        with patch('logging.Logger.info') as mock_info:
+            response = app.test_client().get('/n_plus_one')
+
+        assert response.headers['X-DB-Stats'].startswith('statements=3;')
+        assert response.headers['X-DB-Stats'].endswith('rows=3')
+        assert mock_info.call_args.kwargs['extra']['db_statements'] == 3
+        assert metrics.get_metrics()['db_statements:endpoint=n_plus_one,method=GET,status=200'] == 3
+
 class TestTokenGeneration:
     """Tests pour la génération de tokens"""
     
@@ -376,7 +684,9 @@ from helpers.core import (
     is_valid_email,
     generate_reset_token
 )
-from helpers.monitoring import MetricsCollector
+from helpers.monitoring import (
+    MetricsCollector, TIMER_BUCKETS, JSONFormatter, QueuedLogHandler, RotatingLogFileHandler, log_file_handler
+)
 from flask import session
 
 
@@ -472,9 +782,52 @@ class TestMetricsCollector:
         metrics.timer("request_duration", 0.456)
         
         timers = metrics.get_metrics()["request_duration_duration:"]
-        assert len(timers) == 2
-        assert 0.123 in timers
-        assert 0.456 in timers
+        assert timers['count'] == 2
+        assert timers['min'] == 0.123
+        assert timers['max'] == 0.456
+    
+    def test_timer_memory_bounded(self):
+        """Test que les durées ne sont pas conservées une à une"""
+        metrics = MetricsCollector()
+        
+        for i in range(10000):
+            metrics.timer("request_duration", i / 10000)
+        
+        histogram = metrics.histogram("request_duration")
+        assert histogram.count == 10000
+        assert len(histogram.counts) == len(TIMER_BUCKETS) + 1
+    
+    def test_timer_percentiles(self):
+        """Test p50/p95/p99 à moins de 5 % près"""
+        metrics = MetricsCollector()
+        
+        for i in range(1, 1001):
+            metrics.timer("request_duration", i / 1000)  # 1 ms à 1 s
+        
+        p = metrics.percentiles("request_duration")
+        assert p[50] == pytest.approx(0.5, rel=0.05)
+        assert p[95] == pytest.approx(0.95, rel=0.05)
+        assert p[99] == pytest.approx(0.99, rel=0.05)
+        assert metrics.get_metrics()["request_duration_duration:"]['p99'] == pytest.approx(0.99, rel=0.05)
+    
+    def test_concurrent_updates(self):
+        """Test qu'aucune mise à jour n'est perdue entre threads"""
+        metrics = MetricsCollector()
+        
+        def work():
+            for _ in range(5000):
+                metrics.increment("http_requests")
+                metrics.timer("request_duration", 0.01)
+        
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        data = metrics.get_metrics()
+        assert data["http_requests:"] == 40000
+        assert data["request_duration_duration:"]['count'] == 40000
     
     def test_metrics_with_tags(self):
         """Test métriques avec tags"""
@@ -498,6 +851,94 @@ class TestMetricsCollector:
         assert len(metrics.get_metrics()) == 0
 
 
+class TestQueuedLogging:
+    """Tests de la file des logs de production"""
+    
+    def make_logger(self, handler):
+        logger = logging.getLogger(f"test_queued_logging.{id(handler)}")
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        logger.addHandler(handler)
+        return logger
+    
+    def test_request_context_captured_before_queue(self, test_app, tmp_path):
+        """Test contexte de la requête et exception relevés dans le thread de la requête"""
+        path = tmp_path / 'app.log'
+        handler = QueuedLogHandler([log_file_handler(str(path), logging.INFO)])
+        logger = self.make_logger(handler)
+        
+        with test_app.test_request_context('/quiz/choix?theme=civil'):
+            try:
+                raise ValueError("boom")
+            except ValueError:
+                logger.exception("Échec %s", "quiz")
+        handler.close()
+        
+        entry = json.loads(path.read_text(encoding='utf-8'))
+        assert entry['message'] == "Échec quiz"
+        assert entry['url'] == 'http://localhost/quiz/choix?theme=civil'
+        assert entry['exception']['type'] == 'ValueError'
+    
+    def test_full_queue_drops_and_reports(self, tmp_path):
+        """Test logs abandonnés comptés quand l'écriture ne suit pas, puis signalés"""
+        release = threading.Event()
+        
+        class SlowHandler(logging.Handler):
+            def __init__(self):
+                super().__init__()
+                self.messages = []
+            
+            def emit(self, record):
+                release.wait(5)
+                self.messages.append(record.getMessage())
+        
+        slow = SlowHandler()
+        handler = QueuedLogHandler([slow], maxsize=2, block_timeout=0)
+        logger = self.make_logger(handler)
+        
+        for i in range(10):
+            logger.info("log %d", i)
+        dropped = handler.stats()['dropped']['INFO']
+        release.set()
+        handler.listener.queue.join()
+        logger.info("après")
+        handler.close()
+        
+        assert 7 <= dropped <= 8
+        assert f"{dropped} logs abandonnés (file de logs pleine)" in slow.messages
+        assert slow.messages[-1] == "après"
+    
+    def test_rotation_by_size(self, tmp_path):
+        """Test rotation du fichier au-delà de LOG_MAX_BYTES"""
+        path = tmp_path / 'app.log'
+        file_handler = RotatingLogFileHandler(str(path), maxBytes=500, backupCount=2)
+        file_handler.setFormatter(JSONFormatter())
+        logger = self.make_logger(file_handler)
+        
+        for i in range(20):
+            logger.info("message %d", i)
+        file_handler.close()
+        
+        assert (tmp_path / 'app.log.1').exists()
+        assert (tmp_path / 'app.log.2').exists()
+        assert not (tmp_path / 'app.log.3').exists()
+    
+    def test_rotation_by_other_worker_followed(self, tmp_path):
+        """Test nouveau fichier rouvert quand un autre worker a fait la rotation"""
+        path = tmp_path / 'app.log'
+        file_handler = RotatingLogFileHandler(str(path), maxBytes=10000, backupCount=2)
+        logger = self.make_logger(file_handler)
+        logger.info("avant")
+        
+        os.rename(path, tmp_path / 'app.log.1')  # rotation faite par un autre processus
+        file_handler._checked_at = 0
+        logger.info("après")
+        file_handler.close()
+        
+        assert path.read_text() == "après\n"
+        assert (tmp_path / 'app.log.1').read_text() == "avant\n"
+
+
 @pytest.mark.integration
 class TestDatabaseHelpers:
     """Tests d'intégration avec la base de données"""
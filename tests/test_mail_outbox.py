@@ -0,0 +1,209 @@
+"""
+Tests pour la boîte d'envoi des emails (helpers/mail_outbox.py)
+
+Les envois passent par un vrai serveur SMTP local (aiosmtpd, fixture smtp_server).
+"""
+import socket
+import time
+
+import pytest
+from flask import Flask
+from unittest.mock import patch
+
+pytest.importorskip('aiosmtpd')
+
+from helpers.mail_outbox import MailOutboxSender, build_message, enqueue_mail
+from helpers.smtp import SMTPPool
+
+
+class MemoryOutbox:
+    """Boîte d'envoi en mémoire, avec la même logique d'essais que la table mail_outbox"""
+
+    def __init__(self, messages):
+        self.rows = {i: {'recipient': r, 'attempts': 0, 'status': 'pending'} for i, r in enumerate(messages, 1)}
+
+    def claim(self, limit, lease):
+        due = [(i, row) for i, row in self.rows.items() if row['status'] == 'pending'][:limit]
+        return [(i, row['recipient'], 'Sujet', '<p>html</p>', 'texte', row['attempts']) for i, row in due]
+
+    def mark_sent(self, ids):
+        for i in ids:
+            self.rows[i]['status'] = 'sent'
+
+    def purge_sent(self, retention_days, limit=1000):
+        expired = [i for i, row in self.rows.items() if row['status'] == 'sent' and row.get('age', 0) > retention_days][:limit]
+        for i in expired:
+            del self.rows[i]
+        return len(expired)
+
+    def mark_failed(self, message_id, error, max_attempts, retry_base):
+        row = self.rows[message_id]
+        row['attempts'] += 1
+        row['error'] = error
+        row['status'] = 'dead' if row['attempts'] >= max_attempts else 'pending'
+        return row['status']
+
+
+def make_sender(store, port, **kwargs):
+    connection = SMTPPool('127.0.0.1', port, use_tls=False, size=1)
+    return MailOutboxSender(store, connection, 'noreply@lawandcode.fr', **kwargs)
+
+
+class TestMailOutboxSender:
+    """Tests du thread d'envoi"""
+
+    def test_batch_sent_on_one_connection(self, smtp_server):
+        """Test envoi d'un lot sur une seule connexion SMTP"""
+        handler, port = smtp_server
+        store = MemoryOutbox(['a@example.com', 'b@example.com', 'c@example.com'])
+        sender = make_sender(store, port)
+
+        assert sender.process_batch() == 3
+
+        assert [rcpt for rcpt, _ in handler.messages] == [['a@example.com'], ['b@example.com'], ['c@example.com']]
+        assert handler.connections == 1
+        assert all(row['status'] == 'sent' for row in store.rows.values())
+        sender.connection.close()
+
+    def test_failed_message_retried_then_dead(self, smtp_server):
+        """Test nouvel essai après un refus, puis abandon (dead letter) après le maximum d'essais"""
+        handler, port = smtp_server
+        store = MemoryOutbox(['inconnu@example.com', 'a@example.com'])
+        sender = make_sender(store, port, max_attempts=2)
+
+        sender.process_batch()
+        assert store.rows[1]['status'] == 'pending'
+        assert store.rows[2]['status'] == 'sent'
+
+        sender.process_batch()
+        assert store.rows[1]['status'] == 'dead'
+        assert 'SMTPRecipientsRefused' in store.rows[1]['error']
+        assert sender.stats() == {'sent': 1, 'failed': 2, 'dead': 1}
+        sender.connection.close()
+
+    def test_each_message_marked_sent_once_sent(self, smtp_server):
+        """Test message marqué envoyé dès son envoi, avant la fin du lot"""
+        handler, port = smtp_server
+        store = MemoryOutbox(['a@example.com', 'b@example.com'])
+        sender = make_sender(store, port)
+        send = sender.connection.send
+        statuses = []
+
+        def send_and_check(message):
+            statuses.append(store.rows[1]['status'])
+            send(message)
+        sender.connection.send = send_and_check
+        sender.process_batch()
+
+        assert statuses == ['pending', 'sent']
+        sender.connection.close()
+
+    def test_lease_covers_slow_batch(self, smtp_server):
+        """Test bail au moins égal au pire cas du lot (deux essais par message)"""
+        handler, port = smtp_server
+        sender = make_sender(MemoryOutbox([]), port, batch_size=50)
+
+        assert sender.lease >= 50 * sender.connection.timeout * 2
+        sender.connection.close()
+
+    def test_sent_messages_purged_after_retention(self, smtp_server):
+        """Test suppression des messages envoyés au-delà de la durée de conservation"""
+        handler, port = smtp_server
+        store = MemoryOutbox(['a@example.com', 'b@example.com', 'c@example.com'])
+        store.rows[1].update(status='sent', age=8)
+        store.rows[2].update(status='sent', age=1)
+        sender = make_sender(store, port, retention_days=7)
+
+        assert sender.purge_sent() == 1
+        assert sorted(store.rows) == [2, 3]
+        sender.connection.close()
+
+    def test_reconnect_after_server_closed_connection(self, smtp_server):
+        """Test réouverture de la connexion si le serveur l'a fermée entre deux lots"""
+        handler, port = smtp_server
+        sender = make_sender(MemoryOutbox(['a@example.com']), port)
+        sender.process_batch()
+
+        sender.connection._idle[-1][0].sock.shutdown(socket.SHUT_RDWR)  # connexion coupée sans QUIT
+        sender.store = MemoryOutbox(['b@example.com'])
+        sender.process_batch()
+
+        assert len(handler.messages) == 2
+        assert handler.connections == 2
+        sender.connection.close()
+
+    def test_background_thread_sends_and_stops(self, smtp_server):
+        """Test envoi par le thread d'arrière-plan, réveillé par une insertion"""
+        handler, port = smtp_server
+        store = MemoryOutbox(['a@example.com'])
+        sender = make_sender(store, port, poll_interval=60)
+
+        sender.wake()
+        for _ in range(100):
+            if handler.messages:
+                break
+            time.sleep(0.02)
+        sender.stop()
+
+        assert len(handler.messages) == 1
+        assert not sender._thread.is_alive()
+
+
+class TestEnqueue:
+    """Tests de l'insertion dans la boîte d'envoi"""
+
+    @patch('helpers.mail_outbox.db_request')
+    def test_enqueue_inserts_row(self, mock_db):
+        """Test que la requête HTTP ne fait qu'une insertion"""
+        mock_db.return_value = [(42,)]
+
+        assert enqueue_mail('a@example.com', 'Sujet', html='<p>html</p>', body='texte')
+        query, params = mock_db.call_args[0]
+        assert 'INSERT INTO mail_outbox' in query
+        assert params == ('a@example.com', 'Sujet', '<p>html</p>', 'texte')
+
+    @patch('helpers.mail_outbox.db_request')
+    def test_enqueue_failure(self, mock_db):
+        """Test échec de l'insertion signalé à l'appelant"""
+        mock_db.return_value = ("erreur", 400)
+
+        assert not enqueue_mail('a@example.com', 'Sujet')
+
+    @patch('helpers.mail_outbox.db_request')
+    def test_send_reset_email_queued(self, mock_db, test_app):
+        """Test que l'email de réinitialisation est mis en file, sans envoi SMTP dans la requête"""
+        from helpers.core import send_reset_email
+        mock_db.return_value = [(1,)]
+
+        with test_app.app_context(), patch.object(test_app, 'mail') as mock_mail, \
+                patch('helpers.mail_outbox.MAIL_OUTBOX', True), \
+                patch('helpers.mail_outbox.mail_sender') as mock_sender:
+            assert send_reset_email('a@example.com', 'testuser', 'reset_token')
+
+        mock_mail.send.assert_not_called()
+        mock_sender.wake.assert_called_once()
+        assert 'reset_token' in mock_db.call_args[0][1][3]
+
+    @patch('helpers.mail_outbox.db_request')
+    def test_send_reset_email_without_mail_server(self, mock_db, test_app):
+        """Test sans MAIL_SERVER : pas de thread d'envoi, donc pas de mise en file ; l'échec est signalé"""
+        from helpers.core import send_reset_email
+        from helpers.mail_outbox import setup_mail_outbox
+        app = Flask(__name__)
+
+        with patch('helpers.mail_outbox.MAIL_OUTBOX', True), patch('helpers.mail_outbox.mail_sender', None):
+            setup_mail_outbox(app)  # MAIL_SERVER absent : aucun thread créé
+            with test_app.app_context(), patch.object(test_app, 'mail') as mock_mail:
+                mock_mail.send.side_effect = ConnectionRefusedError("pas de serveur SMTP")
+                assert not send_reset_email('a@example.com', 'testuser', 'reset_token')
+
+        mock_db.assert_not_called()
+        mock_mail.send.assert_called_once()
+
+def test_build_message():
+    """Test message texte avec alternative HTML"""
+    message = build_message('noreply@lawandcode.fr', 'a@example.com', 'Sujet', html='<p>html</p>', body='texte')
+
+    assert message['To'] == 'a@example.com'
+    assert message.get_body(('html',)).get_content().strip() == '<p>html</p>'
+    assert message.get_body(('plain',)).get_content().strip() == 'texte'
@@ -0,0 +1,130 @@
+"""
+Tests pour l'exposition OpenMetrics des métriques (helpers/metrics_export.py)
+"""
+import os
+import pytest
+from unittest.mock import patch
+
+from helpers.metrics_export import (
+    MetricsFlusher, MmapedDict, collect_samples, flat_samples, mark_process_dead,
+    parse_tags, render_openmetrics
+)
+from helpers.monitoring import MetricsCollector
+
+
+def worker_metrics(requests, in_use):
+    collector = MetricsCollector()
+    for duration in requests:
+        tags = "endpoint=main.index,method=GET,status=200"
+        collector.increment('http_requests', tags=tags)
+        collector.timer('request_duration', duration, tags=tags)
+    collector.gauge('db_pool_in_use', in_use)
+    return collector
+
+
+@pytest.mark.unit
+class TestMmapedDict:
+    """Tests du fichier mappé en mémoire"""
+
+    def test_write_and_read(self, tmp_path):
+        """Test valeurs relues par un autre lecteur, mises à jour sur place"""
+        path = str(tmp_path / 'counter_1.db')
+        store = MmapedDict(path)
+        store.write('a', 1)
+        store.write('clé accentuée', 2.5)
+        store.write('a', 3)
+
+        assert MmapedDict.read(path) == {'a': 3.0, 'clé accentuée': 2.5}
+        store.close()
+
+    def test_grows_beyond_initial_size(self, tmp_path):
+        """Test agrandissement du fichier quand les clés ne tiennent plus"""
+        path = str(tmp_path / 'counter_1.db')
+        store = MmapedDict(path, initial_size=64)
+        for i in range(200):
+            store.write(f'metric_{i}', i)
+
+        values = MmapedDict.read(path)
+        assert len(values) == 200
+        assert values['metric_199'] == 199
+        store.close()
+
+
+@pytest.mark.unit
+class TestAggregation:
+    """Tests de l'agrégation entre workers"""
+
+    def test_counters_histograms_and_gauges_summed(self, tmp_path):
+        """Test somme des fichiers de deux workers"""
+        directory = str(tmp_path)
+        MetricsFlusher(directory, worker_metrics([0.01, 0.02], 3), pid=101).flush()
+        MetricsFlusher(directory, worker_metrics([0.5], 1), pid=102).flush()
+
+        text = render_openmetrics(collect_samples(directory))
+
+        assert 'law_quiz_http_requests_total{endpoint="main.index",method="GET",status="200"} 3' in text
+        assert 'law_quiz_request_duration_seconds_count{endpoint="main.index",method="GET",status="200"} 3' in text
+        assert 'law_quiz_db_pool_in_use 4' in text
+        assert text.endswith('# EOF\n')
+
+    def test_dead_worker_keeps_counters_drops_gauges(self, tmp_path):
+        """Test worker terminé : compteurs conservés, jauges retirées"""
+        directory = str(tmp_path)
+        MetricsFlusher(directory, worker_metrics([0.01], 3), pid=101).flush()
+        MetricsFlusher(directory, worker_metrics([0.01], 1), pid=102).flush()
+
+        mark_process_dead(101, directory=directory)
+        text = render_openmetrics(collect_samples(directory))
+
+        assert 'law_quiz_http_requests_total{endpoint="main.index",method="GET",status="200"} 2' in text
+        assert 'law_quiz_db_pool_in_use 1' in text
+        assert not os.path.exists(os.path.join(directory, 'counter_101.db'))
+
+
+@pytest.mark.unit
+class TestRender:
+    """Tests du format OpenMetrics"""
+
+    def test_histogram_buckets_cumulative(self):
+        """Test seaux cumulés, +Inf égal au nombre d'observations"""
+        collector = MetricsCollector()
+        for duration in (0.0001, 0.001, 0.01, 10.0):
+            collector.timer('request_duration', duration)
+        counters, gauges = flat_samples(collector)
+
+        lines = render_openmetrics({**counters, **gauges}).splitlines()
+
+        assert '# TYPE law_quiz_request_duration_seconds histogram' in lines
+        assert 'law_quiz_request_duration_seconds_bucket{le="0.0001"} 1' in lines
+        assert 'law_quiz_request_duration_seconds_bucket{le="0.0128"} 3' in lines
+        assert 'law_quiz_request_duration_seconds_bucket{le="+Inf"} 4' in lines
+        buckets = [int(line.rsplit(' ', 1)[1]) for line in lines if '_bucket' in line]
+        assert buckets == sorted(buckets)
+
+    def test_parse_tags(self):
+        """Test étiquettes à partir des tags existants"""
+        assert parse_tags('endpoint=quiz.quiz,method=POST,status=302') == {
+            'endpoint': 'quiz.quiz', 'method': 'POST', 'status': '302'}
+        assert parse_tags('404') == {'tag': '404'}
+        assert parse_tags('') == {}
+
+
+class TestMetricsEndpoint:
+    """Tests de la route /metrics"""
+
+    def test_requires_token(self, client):
+        """Test refus sans jeton ni session admin"""
+        response = client.get('/metrics', headers={'Authorization': 'Bearer mauvais'})
+        assert response.status_code == 401
+
+    def test_openmetrics_with_token(self, client):
+        """Test exposition avec le jeton de collecte, étiquetée par route"""
+        client.get('/about')
+        with patch('helpers.metrics_export.METRICS_TOKEN', 'secret'):
+            response = client.get('/metrics', headers={'Authorization': 'Bearer secret'})
+
+        assert response.status_code == 200
+        assert response.content_type.startswith('application/openmetrics-text')
+        body = response.get_data(as_text=True)
+        assert 'endpoint="main.about",method="GET",status="200"' in body
+        assert body.endswith('# EOF\n')
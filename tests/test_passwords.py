@@ -0,0 +1,77 @@
+"""
+Tests pour le hachage des mots de passe (helpers/passwords.py)
+"""
+import os
+import pytest
+from unittest.mock import patch
+from werkzeug.security import generate_password_hash
+
+from helpers.passwords import PasswordHasher, PasswordHasherBusy, hash_method
+
+# Coût réduit : les tests vérifient le fonctionnement, pas la résistance
+FAST_METHOD = 'pbkdf2:sha256:1000'
+
+
+class TestPasswordHasher:
+    """Tests du service de hachage"""
+
+    def test_inline_hash_and_verify(self):
+        """Test hachage dans le thread appelant (PASSWORD_HASH_WORKERS=0)"""
+        hasher = PasswordHasher(method=FAST_METHOD, workers=0)
+
+        password_hash = hasher.hash('Secret123!')
+
+        assert hash_method(password_hash) == FAST_METHOD
+        assert hasher.verify(password_hash, 'Secret123!')
+        assert not hasher.verify(password_hash, 'mauvais')
+
+    def test_process_pool_hash_and_verify(self):
+        """Test hachage et vérification dans le pool de processus"""
+        hasher = PasswordHasher(method=FAST_METHOD, workers=1)
+        try:
+            password_hash = hasher.hash('Secret123!')
+            assert hasher.verify(password_hash, 'Secret123!')
+            assert not hasher.verify(password_hash, 'mauvais')
+        finally:
+            hasher.shutdown()
+
+    def test_verify_hash_from_previous_method(self):
+        """Test qu'un hachage fait avec une autre méthode reste vérifiable"""
+        hasher = PasswordHasher(method=FAST_METHOD, workers=0)
+        old_hash = generate_password_hash('Secret123!', 'pbkdf2:sha256:2000')
+
+        assert hasher.verify(old_hash, 'Secret123!')
+
+    def test_needs_rehash(self):
+        """Test détection des hachages qui ne suivent plus la méthode configurée"""
+        hasher = PasswordHasher(method=FAST_METHOD, workers=0)
+
+        assert not hasher.needs_rehash(generate_password_hash('x', FAST_METHOD))
+        assert hasher.needs_rehash(generate_password_hash('x', 'pbkdf2:sha256:2000'))
+        assert hasher.needs_rehash('scrypt:32768:8:1$sel$hachage')
+
+    def test_needs_rehash_default_parameters(self):
+        """Test qu'une méthode sans coût explicite se compare aux paramètres par défaut de werkzeug"""
+        hasher = PasswordHasher(method='scrypt', workers=0)
+
+        assert not hasher.needs_rehash(generate_password_hash('x', 'scrypt'))
+
+    def test_busy_when_no_slot(self):
+        """Test refus (503) quand tous les hachages autorisés sont en attente"""
+        hasher = PasswordHasher(method=FAST_METHOD, workers=1, max_pending=1, timeout=0.01)
+        hasher._slots.acquire()  # un hachage déjà en cours
+
+        with pytest.raises(PasswordHasherBusy) as error:
+            hasher.hash('Secret123!')
+
+        assert error.value.code == 503
+        assert hasher.stats()['rejected'] == 1
+        hasher._slots.release()
+
+    def test_default_workers_shared_between_gunicorn_workers(self):
+        """Test cœurs partagés entre les workers gunicorn, au moins un processus chacun"""
+        with patch('helpers.passwords.os.cpu_count', return_value=8):
+            with patch.dict(os.environ, {'WEB_CONCURRENCY': '2'}):
+                assert PasswordHasher().workers == 4
+            with patch.dict(os.environ, {'WEB_CONCURRENCY': '16'}):
+                assert PasswordHasher().workers == 1
@@ -0,0 +1,219 @@
+"""
+Tests pour le pool de connexions borné (helpers/pool.py)
+"""
+import os
+import threading
+import time
+import pytest
+from unittest.mock import patch
+
+from helpers.pool import BoundedConnectionPool, PoolTimeout, pool_settings
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+
+    def close(self):
+        self.closed = 1
+
+
+class FakePool:
+    """Remplaçant de ThreadedConnectionPool : getconn lève PoolError au-delà de maxconn"""
+
+    def __init__(self, maxconn):
+        self.maxconn = maxconn
+        self._pool = []
+        self._used = set()
+
+    def getconn(self):
+        if len(self._used) >= self.maxconn:
+            from psycopg2.pool import PoolError
+            raise PoolError("connection pool exhausted")
+        conn = self._pool.pop() if self._pool else FakeConnection()
+        self._used.add(conn)
+        return conn
+
+    def putconn(self, conn, close=False):
+        self._used.discard(conn)
+        if close or conn.closed:
+            conn.close()
+        else:
+            self._pool.append(conn)
+
+    def closeall(self):
+        self._pool.clear()
+
+
+def make_pool(maxconn=2, **kwargs):
+    return BoundedConnectionPool(FakePool(maxconn), maxconn=maxconn, **kwargs)
+
+
+@pytest.mark.unit
+class TestBoundedConnectionPool:
+    """Tests de l'attente bornée, du recyclage et des statistiques"""
+
+    def test_checkout_and_return(self):
+        """Test emprunt et retour d'une connexion"""
+        pool = make_pool()
+
+        conn = pool.getconn()
+        assert pool.stats()['in_use'] == 1
+
+        pool.putconn(conn)
+        stats = pool.stats()
+        assert stats['in_use'] == 0
+        assert stats['idle'] == 1
+
+    def test_exhausted_pool_times_out(self):
+        """Test qu'un pool épuisé attend puis lève PoolTimeout au lieu d'échouer immédiatement"""
+        pool = make_pool(maxconn=1, checkout_timeout=0.05)
+        pool.getconn()
+
+        start = time.monotonic()
+        with pytest.raises(PoolTimeout):
+            pool.getconn()
+
+        assert time.monotonic() - start >= 0.05
+        stats = pool.stats()
+        assert stats['exhausted'] == 1
+        assert stats['timeouts'] == 1
+
+    def test_waiting_checkout_gets_returned_connection(self):
+        """Test qu'un emprunt en attente obtient la connexion dès qu'elle est rendue"""
+        pool = make_pool(maxconn=1, checkout_timeout=2)
+        conn = pool.getconn()
+
+        threading.Timer(0.05, pool.putconn, args=(conn,)).start()
+        second = pool.getconn()
+
+        assert second is conn
+        assert pool.stats()['exhausted'] == 1
+        assert pool.stats()['timeouts'] == 0
+
+    def test_idle_connection_is_recycled(self):
+        """Test remplacement d'une connexion inactive depuis trop longtemps"""
+        pool = make_pool(max_idle=0.01)
+        conn = pool.getconn()
+        pool.putconn(conn)
+
+        time.sleep(0.02)
+        fresh = pool.getconn()
+
+        assert fresh is not conn
+        assert conn.closed
+        assert pool.stats()['recycled'] == 1
+
+    def test_old_connection_is_recycled(self):
+        """Test remplacement d'une connexion ouverte depuis plus de max_lifetime"""
+        pool = make_pool(max_lifetime=0.01)
+        conn = pool.getconn()
+        pool.putconn(conn)
+
+        time.sleep(0.02)
+
+        assert pool.getconn() is not conn
+        assert pool.stats()['recycled'] == 1
+
+    def test_closed_connection_is_replaced(self):
+        """Test qu'une connexion fermée par le serveur n'est pas resservie"""
+        pool = make_pool()
+        conn = pool.getconn()
+        pool.putconn(conn)
+        conn.closed = 2  # connexion perdue pendant qu'elle était dans le pool
+
+        assert pool.getconn() is not conn
+
+    def test_every_idle_connection_stale(self):
+        """Test que la connexion de remplacement est vérifiée elle aussi"""
+        pool = make_pool(maxconn=3)
+        conns = [pool.getconn() for _ in range(2)]
+        for conn in conns:
+            pool.putconn(conn)
+            conn.closed = 2
+
+        fresh = pool.getconn()
+
+        assert fresh not in conns
+        assert not fresh.closed
+        assert pool.stats()['recycled'] == 2
+
+    def test_connection_metadata_released_with_connection(self):
+        """Test que les dates d'une connexion fermée par le pool psycopg2 ne restent pas en mémoire"""
+        pool = make_pool()
+        conn = pool.getconn()
+        pool.putconn(conn)
+        pool._pool._pool.clear()  # fermée au-delà de minconn, sans passer par _forget
+        del conn
+
+        assert len(pool._opened_at) == 0
+        assert len(pool._returned_at) == 0
+
+    def test_wait_histogram(self):
+        """Test que chaque emprunt alimente l'histogramme des temps d'attente"""
+        pool = make_pool()
+
+        pool.putconn(pool.getconn())
+        pool.putconn(pool.getconn())
+
+        histogram = pool.stats()['wait_histogram']
+        assert sum(histogram.values()) == 2
+        assert histogram['le_0.001'] == 2
+
+    def test_wait_histogram_exported(self):
+        """Test export OpenMetrics des temps d'attente : seaux le, +Inf, _sum et _count"""
+        from helpers.monitoring import metrics
+        from helpers.metrics_export import collect_samples, render_openmetrics
+        metrics.reset()
+        pool = make_pool()
+
+        pool.putconn(pool.getconn())
+
+        text = render_openmetrics(collect_samples(directory=None))
+        assert '# TYPE law_quiz_db_pool_wait_seconds histogram' in text
+        assert 'law_quiz_db_pool_wait_seconds_bucket{le="0.0001"} 1' in text
+        assert 'law_quiz_db_pool_wait_seconds_bucket{le="+Inf"} 1' in text
+        assert 'law_quiz_db_pool_wait_seconds_count 1' in text
+        assert 'law_quiz_db_pool_wait_seconds_sum ' in text
+        assert 'tag="le_' not in text
+
+    def test_metrics_published(self):
+        """Test publication de l'occupation et des épuisements dans les métriques"""
+        from helpers.monitoring import metrics
+        metrics.reset()
+        pool = make_pool(maxconn=1, checkout_timeout=0.01)
+
+        pool.getconn()
+        with pytest.raises(PoolTimeout):
+            pool.getconn()
+
+        collected = metrics.get_metrics()
+        assert collected['db_pool_in_use:'] == 1
+        assert collected['db_pool_exhausted:'] == 1
+        assert collected['db_pool_timeouts:'] == 1
+
+
+@pytest.mark.unit
+class TestPoolSettings:
+    """Tests de la lecture de la configuration du pool"""
+
+    @patch.dict(os.environ, {}, clear=True)
+    def test_defaults(self):
+        """Test valeurs par défaut"""
+        settings = pool_settings()
+
+        assert settings['minconn'] == 2
+        assert settings['maxconn'] == 10
+
+    @patch.dict(os.environ, {'DB_POOL_MAX': '20', 'DB_POOL_TIMEOUT': '1.5'})
+    def test_environment(self):
+        """Test lecture de l'environnement"""
+        settings = pool_settings()
+
+        assert settings['maxconn'] == 20
+        assert settings['checkout_timeout'] == 1.5
+
+    @patch.dict(os.environ, {'DB_POOL_MAX': '20'})
+    def test_config_overrides_environment(self):
+        """Test priorité de la configuration de l'application sur l'environnement"""
+        assert pool_settings({'DB_POOL_MAX': 4})['maxconn'] == 4
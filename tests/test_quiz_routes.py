@@ -14,16 +14,14 @@ class TestQuizChoixRoute:
 
     def test_choix_get_public_quizzes(self, client):
         """Test récupération des quiz publics"""
-        with patch('quiz.routes.db_request') as mock_db:
-            # Mock pour les quiz publics
-            mock_db.side_effect = [
-                [  # Premier appel - quiz publics avec COUNT et nombres
-                    ('Quiz Civil', 'author1', 'Droit Civil', 'L3', 10, 5),
-                    ('Quiz Pénal', 'author2', 'Droit Pénal', 'M1', 8, 3)
-                ],
-                [  # Deuxième appel - total results (liste de tuples avec quiz_id)
-                    ('quiz_1',), ('quiz_2',), ('quiz_3',)  # 3 quiz trouvés
-                ]
+        from helpers.catalog import invalidate_public_count
+        invalidate_public_count()
+
+        with patch('helpers.catalog.db_request') as mock_page:
+            # (titre, auteur, matière, niveau, nb questions, likes, quiz_id, total)
+            mock_page.return_value = [
+                ('Quiz Civil', 'author1', 'Droit Civil', 'L3', 10, 5, 2, 3),
+                ('Quiz Pénal', 'author2', 'Droit Pénal', 'M1', 8, 3, 1, 3)
             ]
 
             response = client.get('/quiz/choix?quiz_type=public&page=1')
@@ -34,34 +32,98 @@ class TestQuizChoixRoute:
             assert 'Quiz Civil' in content
             assert 'Quiz Pénal' in content
 
+            # Une seule requête sur le catalogue : page et nombre total, sans agrégation sur quiz_questions
+            mock_page.assert_called_once()
+            listing_query = mock_page.call_args[0][0]
+            assert 'FROM quiz_catalog' in listing_query
+            assert 'SELECT COUNT(*) FROM quiz_catalog' in listing_query
+            assert 'GROUP BY' not in listing_query
+            assert 'OFFSET' not in listing_query
+
+    def test_choix_get_public_count_is_cached(self, client):
+        """Test que le nombre de quiz publics n'est pas recalculé à chaque page"""
+        from helpers.catalog import invalidate_public_count
+        invalidate_public_count()
+
+        with patch('helpers.catalog.db_request') as mock_page:
+            mock_page.return_value = [('Quiz Civil', 'author1', 'Droit Civil', 'L3', 10, 5, 2, 25)]
+
+            client.get('/quiz/choix?quiz_type=public')
+            response = client.get('/quiz/choix?quiz_type=public')
+            assert response.status_code == 200
+
+            second_query = mock_page.call_args_list[1][0][0]
+            assert 'COUNT(*)' not in second_query
+
+            from helpers.catalog import fetch_public_page
+            assert fetch_public_page()[3] == 25  # Nombre mis en cache lors du premier appel
+
+        invalidate_public_count()
+
+    def test_choix_get_public_past_end_cursor_not_cached(self, client):
+        """Test qu'une page vide (curseur au-delà de la fin) ne met pas 0 en cache"""
+        from helpers.catalog import encode_cursor, fetch_public_page, invalidate_public_count
+        invalidate_public_count()
+
+        with patch('helpers.catalog.db_request') as mock_page:
+            mock_page.return_value = []
+            response = client.get(f'/quiz/choix?quiz_type=public&page=9&after={encode_cursor(0, 1)}')
+            assert response.status_code == 200
+
+            mock_page.return_value = [('Quiz Civil', 'author1', 'Droit Civil', 'L3', 10, 5, 2, 25)]
+            assert fetch_public_page()[3] == 25
+            assert 'COUNT(*)' in mock_page.call_args[0][0]  # nombre recalculé, pas 0 en cache
+
+        invalidate_public_count()
+
+    def test_choix_get_public_next_page_uses_cursor(self, client):
+        """Test que la page suivante reprend après le curseur (likes, quiz_id)"""
+        from helpers.catalog import encode_cursor, invalidate_public_count
+        invalidate_public_count()
+
+        with patch('helpers.catalog.db_request') as mock_page:
+            mock_page.return_value = [('Quiz Civil', 'author1', 'Droit Civil', 'L3', 10, 2, 7, 11)]
+
+            cursor = encode_cursor(5, 42)
+            response = client.get(f'/quiz/choix?quiz_type=public&page=2&after={cursor}')
+            assert response.status_code == 200
+
+            query, params = mock_page.call_args[0]
+            assert '(likes, quiz_id) < (%s, %s)' in query
+            assert params == (5, 42, 11)  # curseur puis taille de page + 1
+
+            # Page précédente disponible, pas de page suivante
+            content = response.data.decode('utf-8')
+            assert 'name="before"' in content
+            assert 'name="after"' not in content
+
+        invalidate_public_count()
+
     def test_choix_get_private_quizzes(self, client):
         """Test récupération des quiz privés (nécessite connexion)"""
         with client.session_transaction() as sess:
             sess['user_id'] = 1
             sess['username'] = 'testuser'
 
-        with patch('quiz.routes.db_request') as mock_db:
-            mock_db.side_effect = [
-                [  # Quiz privés
-                    ('Mon Quiz', 123, 6),
-                    ('Autre Quiz', 124, 8)
-                ],
-                [(2,)]  # Total count comme tuple dans une liste
+        with patch('helpers.catalog.db_request') as mock_page:
+            mock_page.return_value = [  # Quiz privés avec le nombre total en dernière colonne
+                ('Mon Quiz', 'testuser', 'Droit Civil', 'L1', 6, 0, 123, 2),
+                ('Autre Quiz', 'testuser', 'Droit Civil', 'L1', 8, 0, 124, 2)
             ]
 
             response = client.get('/quiz/choix?quiz_type=private&page=1')
             assert response.status_code == 200
 
+            mock_page.assert_called_once()
+            query, params = mock_page.call_args[0]
+            assert params == (1, 1, 11)  # user_id pour le comptage, user_id pour la page, limite
+
     def test_choix_post_search(self, client):
         """Test recherche de quiz"""
-        with patch('quiz.routes.db_request') as mock_db:
-            mock_db.side_effect = [
-                [  # Résultats de recherche
-                    ('Quiz trouvé', 'author1', 'Droit Civil', 'L3', 5, 2)
-                ],
-                [  # Total results comme liste de tuples
-                    ('quiz_1',)
-                ]
+        with patch('helpers.search.db_request') as mock_db:
+            # Une seule requête : page de résultats + rang + nombre total
+            mock_db.return_value = [
+                ('Quiz trouvé', 'author1', 'Droit Civil', 'L3', 5, 2, 9, 0.6, 1)
             ]
 
             response = client.post('/quiz/choix', data={
@@ -70,6 +132,43 @@ class TestQuizChoixRoute:
                 'page': '1'
             })
             assert response.status_code == 200
+            content = response.data.decode('utf-8')
+            assert 'Quiz trouvé' in content
+            assert '1 résultat(s)' in content
+
+            mock_db.assert_called_once()
+            query, params = mock_db.call_args[0]
+            assert 'ILIKE' not in query
+            assert 'search_vector @@ query' in query
+            assert params[0] == 'civil:*'
+
+    def test_choix_post_search_without_words(self, client):
+        """Test recherche ne contenant aucun mot exploitable"""
+        with patch('helpers.search.db_request') as mock_db:
+            response = client.post('/quiz/choix', data={
+                'query': '!!!',
+                'quiz_type': 'public'
+            })
+            assert response.status_code == 200
+            assert 'Aucun résultat' in response.data.decode('utf-8')
+            mock_db.assert_not_called()
+
+
+class TestQuizSearch:
+    """Tests pour la construction des requêtes plein texte"""
+
+    def test_build_tsquery_prefix_terms(self):
+        """Test que chaque mot devient un préfixe obligatoire"""
+        from helpers.search import build_tsquery
+
+        assert build_tsquery('Droit Pénal') == 'droit:* & pénal:*'
+
+    def test_build_tsquery_strips_operators(self):
+        """Test que les opérateurs tsquery saisis par l'utilisateur sont ignorés"""
+        from helpers.search import build_tsquery
+
+        assert build_tsquery("civil' | !(penal)") == 'civil:* & penal:*'
+        assert build_tsquery('   ') is None
 
 
 class TestQuizQuestionsRoutes:
@@ -78,12 +177,13 @@ class TestQuizQuestionsRoutes:
     def test_get_public_questions_success(self, client):
         """Test récupération questions quiz public"""
         with patch('quiz.routes.db_request') as mock_db:
+            # (version du contenu, réponse, question)
             mock_db.return_value = [
-                ('Réponse 1', 'Question 1'),
-                ('Réponse 2', 'Question 2'),
-                ('Réponse 3', 'Question 3'),
-                ('Réponse 4', 'Question 4'),
-                ('Réponse 5', 'Question 5')
+                (3, 'Réponse 1', 'Question 1'),
+                (3, 'Réponse 2', 'Question 2'),
+                (3, 'Réponse 3', 'Question 3'),
+                (3, 'Réponse 4', 'Question 4'),
+                (3, 'Réponse 5', 'Question 5')
             ]
 
             response = client.get('/quiz/get_public_questions?quiz_id=123')
@@ -92,13 +192,55 @@ class TestQuizQuestionsRoutes:
             data = response.get_json()
             assert len(data) == 5
             assert data[0] == ['Réponse 1', 'Question 1']
+            assert response.headers['ETag'] == '"123-3"'
+            assert 'no-cache' in response.headers['Cache-Control']
+
+    def test_get_public_questions_not_modified(self, client):
+        """Test qu'un quiz rejoué avec le même ETag renvoie 304 sans corps ni relecture des questions"""
+        with patch('quiz.routes.db_request') as mock_db:
+            mock_db.return_value = [(3, 'Réponse %d' % i, 'Question %d' % i) for i in range(4)]
+
+            first = client.get('/quiz/get_public_questions?quiz_id=123')
+            second = client.get('/quiz/get_public_questions?quiz_id=123',
+                                headers={'If-None-Match': first.headers['ETag']})
+
+            assert second.status_code == 304
+            assert second.data == b''
+            assert second.headers['ETag'] == '"123-3"'
+            # Seule la version du contenu est relue en base
+            assert [c[0][0].name for c in mock_db.call_args_list] == [
+                'quiz_content_version', 'quiz_questions', 'quiz_content_version']
+
+    def test_get_public_questions_changed_version(self, client):
+        """Test qu'un ETag obsolète renvoie le nouveau contenu"""
+        with patch('quiz.routes.db_request') as mock_db:
+            mock_db.return_value = [(4, 'Réponse %d' % i, 'Question %d' % i) for i in range(4)]
+
+            response = client.get('/quiz/get_public_questions?quiz_id=123',
+                                  headers={'If-None-Match': '"123-3"'})
+
+            assert response.status_code == 200
+            assert len(response.get_json()) == 4
+
+    def test_get_public_questions_etag_from_database_version(self, client):
+        """Test que l'ETag reprend la version en base et l'identifiant normalisé du quiz"""
+        with patch('quiz.routes.db_request') as mock_db, \
+                patch('quiz.routes.quiz_questions_cache') as mock_cache:
+            mock_db.return_value = [(5,)]  # content_version en base
+            mock_cache.get_or_load.return_value = {
+                "version": 4, "rows": [['Réponse %d' % i, 'Question %d' % i] for i in range(4)]}
+
+            response = client.get('/quiz/get_public_questions?quiz_id=0123')
+
+            assert response.status_code == 200
+            assert response.headers['ETag'] == '"123-5"'
 
     def test_get_public_questions_insufficient(self, client):
         """Test quiz public avec trop peu de questions"""
         with patch('quiz.routes.db_request') as mock_db:
             mock_db.return_value = [
-                ('Réponse 1', 'Question 1'),
-                ('Réponse 2', 'Question 2')
+                (1, 'Réponse 1', 'Question 1'),
+                (1, 'Réponse 2', 'Question 2')
             ]
 
             response = client.get('/quiz/get_public_questions?quiz_id=123')
@@ -117,14 +259,15 @@ class TestQuizQuestionsRoutes:
 
         with patch('quiz.routes.db_request') as mock_db:
             mock_db.return_value = [
-                ('Réponse 1', 'Question 1'),
-                ('Réponse 2', 'Question 2'),
-                ('Réponse 3', 'Question 3'),
-                ('Réponse 4', 'Question 4')
+                (1, 'Réponse 1', 'Question 1'),
+                (1, 'Réponse 2', 'Question 2'),
+                (1, 'Réponse 3', 'Question 3'),
+                (1, 'Réponse 4', 'Question 4')
             ]
 
             response = client.get('/quiz/get_private_questions?quiz_id=123')
             assert response.status_code == 200
+            assert response.headers['Cache-Control'] == 'private, no-cache'
 
 
 class TestQuizPlayRoute:
@@ -189,19 +332,14 @@ class TestStatsUpdate:
         })
         assert response.status_code == 302  # Redirection vers login
 
-    def test_update_stats_first_attempt(self, client):
-        """Test mise à jour stats première tentative"""
+    def test_update_stats_single_statement(self, client):
+        """Test que l'essai et les stats sont enregistrés en une seule requête"""
         with client.session_transaction() as sess:
             sess['user_id'] = 1
             sess['username'] = 'testuser'
 
-        with patch('helpers.core.db_request') as mock_db:
-            mock_db.side_effect = [
-                [],  # Pas d'attempt précédent
-                None,  # Insert attempt
-                [],  # Pas de stats pour cette matière
-                None  # Insert nouvelles stats
-            ]
+        with patch('quiz.routes.db_request') as mock_db:
+            mock_db.return_value = None
 
             response = client.post('/quiz/update_stats', data={
                 'matiere': 'Droit Civil',
@@ -211,36 +349,20 @@ class TestStatsUpdate:
             })
             assert response.status_code == 204
 
-    def test_update_stats_already_attempted(self, client):
-        """Test mise à jour stats déjà tenté"""
-        with client.session_transaction() as sess:
-            sess['user_id'] = 1
-            sess['username'] = 'testuser'
+            mock_db.assert_called_once()
+            query, params = mock_db.call_args[0]
+            assert 'ON CONFLICT (user_id, quiz_id) DO NOTHING' in query
+            assert 'ON CONFLICT (user_id, matiere) DO UPDATE' in query
+            assert params == (1, '123', 'Droit Civil', 10, 8)
 
-        with patch('helpers.core.db_request') as mock_db:
-            mock_db.return_value = [(1,)]  # Attempt existe déjà
-
-            response = client.post('/quiz/update_stats', data={
-                'matiere': 'Droit Civil',
-                'posées': '10',
-                'trouvées': '8',
-                'quiz_id': '123'
-            })
-            assert response.status_code == 204
-
-    def test_update_stats_existing_subject(self, client):
-        """Test mise à jour stats matière existante"""
+    def test_update_stats_already_attempted(self, client):
+        """Test mise à jour stats déjà tenté : la base ignore l'essai, la réponse reste 204"""
         with client.session_transaction() as sess:
             sess['user_id'] = 1
             sess['username'] = 'testuser'
 
-        with patch('helpers.core.db_request') as mock_db:
-            mock_db.side_effect = [
-                [],  # Pas d'attempt précédent
-                None,  # Insert attempt
-                [('Droit Civil',)],  # Stats existent pour cette matière
-                None  # Update stats
-            ]
+        with patch('quiz.routes.db_request') as mock_db:
+            mock_db.return_value = None  # Aucune ligne insérée : stats inchangées
 
             response = client.post('/quiz/update_stats', data={
                 'matiere': 'Droit Civil',
@@ -249,6 +371,7 @@ class TestStatsUpdate:
                 'quiz_id': '123'
             })
             assert response.status_code == 204
+            mock_db.assert_called_once()
 
 
 class TestQuizFileManagement:
@@ -334,6 +457,32 @@ class TestQuizQuestionManagement:
             })
             assert response.status_code == 302
 
+    def test_add_new_question_insert_failure(self, client):
+        """Test INSERT en échec : ni mise à jour du catalogue ni invalidation du cache"""
+        from helpers import DatabaseError
+        with client.session_transaction() as sess:
+            sess['user_id'] = 1
+            sess['username'] = 'testuser'
+
+        with patch('quiz.routes.db_request') as mock_db, \
+                patch('quiz.routes.refresh_quiz_catalog') as mock_refresh, \
+                patch('quiz.routes.invalidate_quiz_questions') as mock_invalidate:
+            mock_db.side_effect = [
+                [(123,)],  # quiz_id
+                [],  # La question n'existe pas encore
+                DatabaseError('duplicate key value violates unique constraint "quiz_questions_question_quiz_id_unique"')
+            ]
+
+            response = client.post('/quiz/add_new_question?dossier=Test&matiere=Droit Civil', data={
+                'question': 'Nouvelle question ?',
+                'réponse': 'Nouvelle réponse'
+            })
+
+            assert response.status_code == 302
+            assert 'error_msg' in response.location
+            mock_refresh.assert_not_called()
+            mock_invalidate.assert_not_called()
+
     def test_add_new_question_duplicate(self, client):
         """Test ajout question déjà existante"""
         with client.session_transaction() as sess:
@@ -388,6 +537,60 @@ class TestQuizQuestionManagement:
             assert response.status_code == 302
 
 
+class TestQuizCatalog:
+    """Tests pour la maintenance du catalogue de quiz"""
+
+    def test_refresh_quiz_catalog_upserts_one_quiz(self):
+        """Test que le rafraîchissement ne recalcule que la ligne du quiz modifié"""
+        from helpers.catalog import refresh_quiz_catalog
+
+        with patch('helpers.catalog.db_request') as mock_db:
+            refresh_quiz_catalog(456)
+
+            query, params = mock_db.call_args[0]
+            assert 'INSERT INTO quiz_catalog' in query
+            assert 'ON CONFLICT (quiz_id) DO UPDATE' in query
+            assert params == (456,)
+
+    def test_refresh_quiz_catalog_without_quiz_id(self):
+        """Test qu'aucune requête n'est faite sans quiz_id"""
+        from helpers.catalog import refresh_quiz_catalog
+
+        with patch('helpers.catalog.db_request') as mock_db:
+            refresh_quiz_catalog(None)
+            mock_db.assert_not_called()
+
+    def test_cursor_round_trip(self):
+        """Test encodage/décodage du curseur de pagination"""
+        from helpers.catalog import encode_cursor, decode_cursor
+
+        assert decode_cursor(encode_cursor(12, 345)) == (12, 345)
+        assert decode_cursor(None) is None
+        assert decode_cursor('pas-un-curseur') is None
+
+    def test_delete_question_refreshes_catalog(self, client):
+        """Test que la suppression d'une question met à jour le catalogue"""
+        with client.session_transaction() as sess:
+            sess['user_id'] = 1
+            sess['username'] = 'testuser'
+
+        with patch('quiz.routes.db_request') as mock_db, \
+                patch('quiz.routes.refresh_quiz_catalog') as mock_refresh:
+            mock_db.side_effect = [
+                [(123,)],  # quiz_id
+                None  # Delete successful
+            ]
+
+            response = client.post('/quiz/delete_quiz_questions', data={
+                'dossier': 'Test Quiz',
+                'question': 'Question à supprimer?',
+                'réponse': 'Réponse à supprimer',
+                'matiere': 'Droit Civil'
+            })
+            assert response.status_code == 302
+            mock_refresh.assert_called_once_with(123)
+
+
 class TestQuizLikes:
     """Tests pour le système de likes"""
 
@@ -403,13 +606,8 @@ class TestQuizLikes:
             sess['user_id'] = 1
             sess['username'] = 'testuser'
 
-        with patch('quiz.routes.db_request') as mock_db:
-            mock_db.side_effect = [
-                [],  # Pas encore liké
-                [(456,)],  # quiz_id
-                None,  # Insert like
-                None  # Update count
-            ]
+        with patch('helpers.likes.db_request') as mock_db:
+            mock_db.return_value = [(456, 456)]  # quiz trouvé, like inséré et compté
 
             response = client.post('/quiz/like_quiz', 
                                  json={'titre': 'Test Quiz', 'author_id': 123})
@@ -418,14 +616,20 @@ class TestQuizLikes:
             data = response.get_json()
             assert data['success'] is True
 
+            # Une seule requête : insertion du like et incrément conditionnel
+            mock_db.assert_called_once()
+            query, params = mock_db.call_args[0]
+            assert 'ON CONFLICT (quiz_id, user_id) DO NOTHING' in query
+            assert params == ('Test Quiz', 123, 1)
+
     def test_like_quiz_already_liked(self, client):
         """Test like quiz déjà liké"""
         with client.session_transaction() as sess:
             sess['user_id'] = 1
             sess['username'] = 'testuser'
 
-        with patch('helpers.core.db_request') as mock_db:
-            mock_db.return_value = [(1,)]  # Déjà liké
+        with patch('helpers.likes.db_request') as mock_db:
+            mock_db.return_value = [(456, None)]  # Déjà liké : rien d'inséré, compteur inchangé
 
             response = client.post('/quiz/like_quiz', 
                                  json={'titre': 'Test Quiz', 'author_id': 123})
@@ -435,6 +639,60 @@ class TestQuizLikes:
             assert data['success'] is False
             assert 'déjà aimé' in data['error']
 
+    def test_like_quiz_not_found(self, client):
+        """Test like d'un quiz inexistant"""
+        with client.session_transaction() as sess:
+            sess['user_id'] = 1
+            sess['username'] = 'testuser'
+
+        with patch('helpers.likes.db_request') as mock_db:
+            mock_db.return_value = [(None, None)]
+
+            response = client.post('/quiz/like_quiz', 
+                                 json={'titre': 'Inconnu', 'author_id': 123})
+
+            data = response.get_json()
+            assert data['success'] is False
+            assert data['error'] == "Quiz introuvable"
+
+    def test_like_quiz_sharded_counter(self, client):
+        """Test mode réparti : l'incrément va dans une ligne de quiz_like_shards"""
+        with client.session_transaction() as sess:
+            sess['user_id'] = 1
+            sess['username'] = 'testuser'
+
+        with patch('helpers.likes.LIKE_COUNTER_SHARDS', 8), \
+             patch('helpers.likes._ensure_rollup_thread'), \
+             patch('helpers.likes.db_request') as mock_db:
+            mock_db.return_value = [(456, 456)]
+
+            response = client.post('/quiz/like_quiz', 
+                                 json={'titre': 'Test Quiz', 'author_id': 123})
+
+            assert response.get_json()['success'] is True
+            query, params = mock_db.call_args[0]
+            assert 'quiz_like_shards' in query
+            assert 'UPDATE quiz_infos' not in query
+            assert 0 <= params[3] < 8
+
+
+    @patch('helpers.core.get_connection')
+    def test_reconcile_likes(self, mock_get_conn):
+        """Test recomptage des likes : lignes de compteur vidées et recomptage dans une transaction"""
+        from helpers.likes import reconcile_likes
+
+        mock_conn = MagicMock()
+        mock_cursor = mock_conn.cursor.return_value
+        mock_cursor.fetchall.return_value = [(3,)]
+        mock_get_conn.return_value = mock_conn
+
+        assert reconcile_likes() == 3
+
+        queries = [c[0][0] for c in mock_cursor.execute.call_args_list]
+        assert queries[0] == "DELETE FROM quiz_like_shards"
+        assert 'COUNT(ql.user_id)' in queries[1]
+        mock_conn.commit.assert_called_once()
+
 
 class TestQuizInfoModification:
     """Tests pour la modification des infos de quiz"""
@@ -459,6 +717,33 @@ class TestQuizInfoModification:
             })
             assert response.status_code == 302
 
+    def test_modify_quiz_infos_update_failure(self, client):
+        """Test UPDATE en échec : message d'erreur et cache non invalidé"""
+        from helpers import DatabaseError
+        with client.session_transaction() as sess:
+            sess['user_id'] = 1
+            sess['username'] = 'testuser'
+
+        with patch('quiz.routes.db_request') as mock_db, \
+                patch('quiz.routes.refresh_quiz_catalog') as mock_refresh, \
+                patch('quiz.routes.invalidate_quiz_questions') as mock_invalidate:
+            mock_db.side_effect = [
+                [(123,)],  # Quiz exists
+                DatabaseError('could not serialize access')
+            ]
+
+            response = client.post('/quiz/modify_quiz_infos', data={
+                'type': 'public',
+                'niveau': 'M1',
+                'matiere': 'Droit Pénal',
+                'titre': 'Mon Quiz'
+            })
+
+            assert response.status_code == 302
+            assert 'Erreur' in response.location
+            mock_refresh.assert_not_called()
+            mock_invalidate.assert_not_called()
+
     def test_modify_quiz_infos_invalid_type(self, client):
         """Test modification avec type invalide"""
         with client.session_transaction() as sess:
@@ -0,0 +1,124 @@
+"""
+Tests pour la limitation de débit des connexions (helpers/ratelimit.py)
+"""
+from unittest.mock import patch, MagicMock
+
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from helpers.ratelimit import TokenBucketLimiter, check_login_rate
+
+
+class TestTokenBucketLimiter:
+    """Tests des seaux à jetons"""
+
+    def test_burst_then_reject(self):
+        """Test refus une fois la capacité consommée"""
+        limiter = TokenBucketLimiter('test', capacity=3, per_minute=60)
+
+        assert [limiter.allow('1.2.3.4')[0] for _ in range(4)] == [True, True, True, False]
+        assert limiter.stats()['rejected'] == 1
+
+    def test_retry_after(self):
+        """Test délai annoncé avant le prochain jeton"""
+        limiter = TokenBucketLimiter('test', capacity=1, per_minute=6)
+        with patch('helpers.ratelimit.time.time', return_value=1000.0):
+            limiter.allow('ip')
+            allowed, retry_after = limiter.allow('ip')
+
+        assert not allowed
+        assert retry_after == 10
+
+    def test_refill_over_time(self):
+        """Test que les jetons reviennent au débit configuré"""
+        limiter = TokenBucketLimiter('test', capacity=2, per_minute=60)
+        with patch('helpers.ratelimit.time.time') as mock_time:
+            mock_time.return_value = 1000.0
+            limiter.allow('ip')
+            limiter.allow('ip')
+            assert not limiter.allow('ip')[0]
+
+            mock_time.return_value = 1001.0
+            assert limiter.allow('ip')[0]
+            assert not limiter.allow('ip')[0]
+
+    def test_keys_are_independent(self):
+        """Test qu'une clé bloquée n'affecte pas les autres"""
+        limiter = TokenBucketLimiter('test', capacity=1, per_minute=1)
+        limiter.allow('attaquant')
+
+        assert not limiter.allow('attaquant')[0]
+        assert limiter.allow('autre')[0]
+
+    def test_bounded_number_of_keys(self):
+        """Test que le nombre de seaux gardés en mémoire est borné"""
+        limiter = TokenBucketLimiter('test', capacity=5, per_minute=5, max_keys=100)
+        for i in range(1000):
+            limiter.allow(f"10.0.{i // 256}.{i % 256}")
+
+        assert limiter.stats()['keys'] == 100
+
+    def test_shared_store(self):
+        """Test que le seau partagé est consommé par le script du stockage partagé"""
+        store = MagicMock()
+        store.eval.return_value = [0, '0.5']
+        limiter = TokenBucketLimiter('login_ip', capacity=5, per_minute=60, store=store)
+
+        allowed, retry_after = limiter.allow('1.2.3.4')
+
+        assert not allowed
+        assert retry_after == 1
+        assert store.eval.call_args[0][2] == 'ratelimit:login_ip:1.2.3.4'
+
+    def test_shared_store_unavailable(self):
+        """Test repli sur le seau local si le stockage partagé ne répond pas"""
+        store = MagicMock()
+        store.eval.side_effect = ConnectionError("Redis injoignable")
+        limiter = TokenBucketLimiter('test', capacity=1, per_minute=1, store=store)
+
+        assert limiter.allow('ip')[0]
+        assert not limiter.allow('ip')[0]
+
+
+class TestCheckLoginRate:
+    """Tests de la combinaison IP / nom d'utilisateur"""
+
+    def test_username_limit_across_ips(self):
+        """Test qu'un même compte visé depuis plusieurs IP est limité"""
+        results = [check_login_rate(f"10.0.0.{i}", 'Victime')[0] for i in range(11)]
+
+        assert results[:10] == [None] * 10
+        assert results[10] == 'username'
+
+    def test_ip_limit_across_usernames(self):
+        """Test qu'une IP essayant de nombreux comptes est limitée"""
+        results = [check_login_rate('10.0.0.1', f"user{i}")[0] for i in range(21)]
+
+        assert results[20] == 'ip'
+
+    @patch('helpers.accounts.db_request', return_value=[])
+    def test_forwarded_for_ignored_without_trusted_proxy(self, mock_db, client):
+        """Test que X-Forwarded-For est ignoré par défaut (TRUSTED_PROXY_HOPS=0) : pas d'adresse choisie par le client"""
+        results = [client.post('/auth/login', data={'username': f"user{i}", 'password': 'wrongpass'},
+                               headers={'X-Forwarded-For': f"203.0.113.{i}"},
+                               environ_base={'REMOTE_ADDR': '10.0.0.253'}).status_code
+                   for i in range(21)]
+
+        assert results[20] == 429
+
+    @patch('helpers.accounts.db_request', return_value=[])
+    def test_forwarded_clients_behind_one_proxy(self, mock_db, client, test_app, monkeypatch):
+        """Test clients distincts derrière le même proxy (X-Forwarded-For) : un seau chacun"""
+        # Comme avec TRUSTED_PROXY_HOPS=1
+        monkeypatch.setattr(test_app, 'wsgi_app', ProxyFix(test_app.wsgi_app, x_for=1, x_proto=1))
+
+        def login(forwarded_for, username):
+            return client.post('/auth/login', data={'username': username, 'password': 'wrongpass'},
+                               headers={'X-Forwarded-For': forwarded_for},
+                               environ_base={'REMOTE_ADDR': '10.0.0.254'}).status_code
+
+        first_client = [login('203.0.113.7', f"user{i}") for i in range(21)]
+        other_client = login('198.51.100.23', 'user0')
+
+        assert first_client[:20] == [403] * 20
+        assert first_client[20] == 429
+        assert other_client == 403
@@ -0,0 +1,176 @@
+"""
+Tests pour le stockage des sessions (helpers/sessions.py)
+"""
+import pytest
+from unittest.mock import patch
+from flask import Flask, session
+from flask.sessions import SecureCookieSessionInterface
+
+from helpers.cache import InMemoryStore
+from helpers.sessions import (
+    StoreSessionInterface, RedisSessionStore, PostgresSessionStore, create_session_interface
+)
+
+
+@pytest.fixture
+def store():
+    return RedisSessionStore(InMemoryStore())
+
+
+@pytest.fixture
+def session_app(store):
+    """Application minimale dont les sessions sont stockées dans un faux Redis"""
+    app = Flask(__name__)
+    app.secret_key = 'test-secret-key'
+    app.session_interface = StoreSessionInterface(store)
+
+    @app.route('/login/<name>')
+    def login(name):
+        session.clear()
+        session['username'] = name
+        return 'ok'
+
+    @app.route('/whoami')
+    def whoami():
+        return session.get('username', 'anonyme')
+
+    @app.route('/logout')
+    def logout():
+        session.clear()
+        return 'ok'
+
+    return app
+
+
+class TestStoreSessionInterface:
+    """Tests de la session côté serveur"""
+
+    def test_session_roundtrip(self, session_app, store):
+        """Test que le contenu est stocké côté serveur et relu à la requête suivante"""
+        client = session_app.test_client()
+        client.get('/login/alice')
+
+        cookie = client.get_cookie('session').value
+        assert 'alice' not in cookie
+        assert client.get('/whoami').data == b'alice'
+        assert len(store.client._data) == 1
+
+    def test_forged_cookie_ignored(self, session_app):
+        """Test qu'un identifiant non signé ne donne accès à aucune session"""
+        client = session_app.test_client()
+        client.get('/login/alice')
+        sid = client.get_cookie('session').value.rsplit('.', 1)[0]
+
+        client.set_cookie('session', sid + '.signature-invalide')
+        assert client.get('/whoami').data == b'anonyme'
+
+    def test_clear_rotates_session_id(self, session_app, store):
+        """Test qu'une nouvelle connexion change l'identifiant et supprime l'ancienne session"""
+        client = session_app.test_client()
+        client.get('/login/alice')
+        first_cookie = client.get_cookie('session').value
+
+        client.get('/login/bob')
+
+        assert client.get_cookie('session').value != first_cookie
+        assert len(store.client._data) == 1
+        client.set_cookie('session', first_cookie)
+        assert client.get('/whoami').data == b'anonyme'
+
+    def test_logout_deletes_session(self, session_app, store):
+        """Test que la déconnexion supprime la session stockée et le cookie"""
+        client = session_app.test_client()
+        client.get('/login/alice')
+
+        client.get('/logout')
+
+        assert store.client._data == {}
+        assert client.get_cookie('session') is None
+
+    def test_anonymous_request_not_stored(self, session_app, store):
+        """Test qu'une session vide n'est pas stockée"""
+        client = session_app.test_client()
+        client.get('/whoami')
+
+        assert store.client._data == {}
+        assert client.get_cookie('session') is None
+
+    def test_unmodified_session_not_rewritten(self, session_app):
+        """Test qu'une requête qui ne fait que lire la session ne l'écrit pas"""
+        client = session_app.test_client()
+        client.get('/login/alice')
+        interface = session_app.session_interface
+
+        for _ in range(10):
+            response = client.get('/whoami')
+            assert 'Set-Cookie' not in response.headers
+
+        assert interface.stats() == {'writes': 1, 'deletes': 0}
+
+    def test_anonymous_logout_writes_nothing(self, session_app):
+        """Test qu'une déconnexion sans session ne touche ni le stockage ni le cookie"""
+        client = session_app.test_client()
+
+        response = client.get('/logout')
+
+        assert 'Set-Cookie' not in response.headers
+        assert session_app.session_interface.stats() == {'writes': 0, 'deletes': 0}
+
+
+class TestPostgresSessionStore:
+    """Tests du stockage PostgreSQL"""
+
+    @patch('helpers.sessions.db_request')
+    def test_load(self, mock_db):
+        """Test lecture d'une session non expirée"""
+        mock_db.return_value = [('{"username": "alice"}',)]
+
+        assert PostgresSessionStore().load('sid') == '{"username": "alice"}'
+        assert 'expires_at > now()' in mock_db.call_args[0][0]
+
+    @patch('helpers.sessions.db_request')
+    def test_load_missing(self, mock_db):
+        """Test session absente ou expirée"""
+        mock_db.return_value = []
+
+        assert PostgresSessionStore().load('sid') is None
+
+    @patch('helpers.sessions._ensure_sweeper')
+    @patch('helpers.sessions.db_request')
+    def test_save_upsert(self, mock_db, mock_sweeper):
+        """Test écriture en une requête avec la date d'expiration"""
+        PostgresSessionStore().save('sid', '{}', 3600)
+
+        query, params = mock_db.call_args[0]
+        assert 'ON CONFLICT (sid) DO UPDATE' in query
+        assert params == ('sid', '{}', 3600)
+
+    @patch('helpers.sessions.db_request')
+    def test_sweep_in_batches(self, mock_db):
+        """Test balayage par lots jusqu'à épuisement des sessions expirées"""
+        mock_db.side_effect = [[('a',), ('b',)], [('c',)]]
+
+        assert PostgresSessionStore(sweep_batch=2).sweep() == 3
+        assert mock_db.call_count == 2
+
+
+class TestCreateSessionInterface:
+    """Tests du choix du stockage"""
+
+    def test_cookie_backend(self):
+        assert isinstance(create_session_interface('cookie'), SecureCookieSessionInterface)
+
+    def test_postgres_backend(self):
+        interface = create_session_interface('postgres')
+        assert isinstance(interface.store, PostgresSessionStore)
+
+    def test_redis_without_store_falls_back_to_cookie(self):
+        with patch('helpers.cache.shared_store', None):
+            assert isinstance(create_session_interface('redis'), SecureCookieSessionInterface)
+
+    def test_redis_backend(self):
+        with patch('helpers.cache.shared_store', InMemoryStore()):
+            assert isinstance(create_session_interface('redis').store, RedisSessionStore)
+
+    def test_filesystem_backend(self):
+        assert create_session_interface('filesystem') is None
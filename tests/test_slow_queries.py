@@ -0,0 +1,147 @@
+"""
+Tests pour le journal des requêtes lentes (helpers/slow_queries.py)
+"""
+import json
+import pytest
+from unittest.mock import MagicMock, patch
+
+from helpers.slow_queries import SlowQueryRecorder, normalize_sql, params_shape
+
+
+def read_entries(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def fake_connection(plan=('Seq Scan on quiz_catalog',)):
+    conn = MagicMock()
+    conn.cursor.return_value.fetchall.return_value = [(line,) for line in plan]
+    release = MagicMock()
+    return conn, release
+
+
+@pytest.mark.unit
+class TestNormalization:
+    """Tests de la normalisation des requêtes"""
+
+    def test_literals_and_placeholders_removed(self):
+        """Test même forme pour deux exécutions aux valeurs différentes"""
+        first = normalize_sql("SELECT *  FROM quiz\n WHERE theme ILIKE '%droit%' AND id = 12 LIMIT %s")
+        second = normalize_sql("SELECT * FROM quiz WHERE theme ILIKE 'civil' AND id = 7 LIMIT %s")
+
+        assert first == second == "SELECT * FROM quiz WHERE theme ILIKE ? AND id = ? LIMIT ?"
+
+    def test_in_lists_collapsed(self):
+        """Test listes IN de longueur variable regroupées"""
+        assert normalize_sql("DELETE FROM t WHERE id IN (%s, %s, %s)") == "DELETE FROM t WHERE id IN (?)"
+
+    def test_params_shape_hides_values(self):
+        """Test types et longueurs des paramètres, sans les valeurs"""
+        assert params_shape(('secret@example.com', 3, [1, 2])) == ['str(18)', 'int', 'list[2]']
+
+
+@pytest.mark.unit
+class TestSlowQueryRecorder:
+    """Tests de l'enregistrement"""
+
+    def test_fast_query_ignored(self, tmp_path):
+        """Test rien d'écrit sous le seuil"""
+        recorder = SlowQueryRecorder(str(tmp_path / 'slow.log'), threshold_ms=100)
+        recorder.observe("SELECT 1", (), 0.01)
+        recorder.flush()
+
+        assert not (tmp_path / 'slow.log').exists()
+
+    def test_slow_select_logged_with_plan(self, tmp_path):
+        """Test entrée JSON avec plan EXPLAIN (ANALYZE, BUFFERS) pour un SELECT"""
+        conn, release = fake_connection()
+        recorder = SlowQueryRecorder(str(tmp_path / 'slow.log'), threshold_ms=100, explain_sample=1,
+                                     connect=lambda: (conn, release))
+
+        recorder.observe("SELECT * FROM quiz_catalog WHERE theme = %s", ('Droit civil',), 0.25, endpoint='quiz.choix')
+        recorder.flush()
+
+        [entry] = read_entries(tmp_path / 'slow.log')
+        assert entry['sql'] == "SELECT * FROM quiz_catalog WHERE theme = ?"
+        assert entry['params'] == ['str(11)']
+        assert entry['duration_ms'] == 250.0
+        assert entry['endpoint'] == 'quiz.choix'
+        assert entry['explain'] == 'Seq Scan on quiz_catalog'
+        explain_sql, explain_params = conn.cursor.return_value.execute.call_args[0]
+        assert explain_sql.startswith('EXPLAIN (ANALYZE, BUFFERS) SELECT')
+        assert explain_params == ('Droit civil',)
+        conn.rollback.assert_called_once()
+        release.assert_called_once_with(conn)
+
+    def test_update_not_analyzed(self, tmp_path):
+        """Test EXPLAIN sans ANALYZE pour une modification (pas de réexécution)"""
+        conn, release = fake_connection()
+        recorder = SlowQueryRecorder(str(tmp_path / 'slow.log'), threshold_ms=100, explain_sample=1,
+                                     connect=lambda: (conn, release))
+
+        recorder.observe("UPDATE user_stats SET score = score + %s WHERE user_id = %s", (1, 2), 0.3)
+        recorder.flush()
+
+        explain_sql = conn.cursor.return_value.execute.call_args[0][0]
+        assert explain_sql.startswith('EXPLAIN UPDATE')
+
+    def test_write_cte_not_analyzed(self, tmp_path):
+        """Test EXPLAIN sans ANALYZE pour un WITH ... INSERT (écriture dans une CTE)"""
+        conn, release = fake_connection()
+        recorder = SlowQueryRecorder(str(tmp_path / 'slow.log'), threshold_ms=100, explain_sample=1,
+                                     connect=lambda: (conn, release))
+
+        recorder.observe("WITH result AS (INSERT INTO user_stats (user_id, score) VALUES (%s, %s) RETURNING quiz_id) "
+                         "SELECT quiz_id FROM result", (1, 2), 0.3)
+        recorder.flush()
+
+        explain_sql = conn.cursor.return_value.execute.call_args[0][0]
+        assert explain_sql.startswith('EXPLAIN WITH')
+
+    def test_explain_rate_limited_per_statement(self, tmp_path):
+        """Test au plus un plan par requête et par intervalle"""
+        conn, release = fake_connection()
+        recorder = SlowQueryRecorder(str(tmp_path / 'slow.log'), threshold_ms=100, explain_sample=1,
+                                     explain_interval=60, connect=lambda: (conn, release))
+
+        for theme in ('a', 'b', 'c'):
+            recorder.observe(f"SELECT * FROM quiz WHERE theme = '{theme}'", (), 0.2)
+        recorder.flush()
+
+        entries = read_entries(tmp_path / 'slow.log')
+        assert len(entries) == 3
+        assert len({entry['fingerprint'] for entry in entries}) == 1
+        assert sum('explain' in entry for entry in entries) == 1
+
+    @patch('helpers.core.get_connection')
+    def test_db_request_reports_slow_statement(self, mock_get_conn):
+        """Test que db_request signale une requête au-dessus du seuil"""
+        from helpers.core import db_request
+        mock_get_conn.return_value = MagicMock()
+
+        with patch('helpers.core.slow_queries') as mock_recorder:
+            mock_recorder.threshold = 0
+            db_request("SELECT * FROM quiz WHERE id = %s", (1,))
+
+        text, params, duration, endpoint = mock_recorder.observe.call_args[0]
+        assert text == "SELECT * FROM quiz WHERE id = %s"
+        assert params == (1,)
+        assert duration >= 0
+        assert endpoint is None
+
+
+def test_dashboard_ranks_by_total_time(tmp_path):
+    """Test classement du résumé de monitoring_dashboard.py par temps total"""
+    from monitoring_dashboard import HealthMonitor
+    recorder = SlowQueryRecorder(str(tmp_path / 'slow.log'), threshold_ms=1, explain_sample=0)
+    for _ in range(5):
+        recorder.write({'fingerprint': 'a', 'sql': 'SELECT ? FROM quiz_catalog', 'statement': None,
+                        'duration_ms': 300, 'endpoint': 'quiz.choix'})
+    recorder.write({'fingerprint': 'b', 'sql': 'SELECT ? FROM users', 'statement': 'login_state',
+                    'duration_ms': 1000, 'endpoint': 'auth.login'})
+
+    report = HealthMonitor().analyze_slow_queries(str(tmp_path / 'slow.log'))
+
+    assert [stats['fingerprint'] for stats in report['ranking']] == ['a', 'b']
+    assert report['ranking'][0]['total_ms'] == 1500
+    assert report['ranking'][0]['endpoints'] == {'quiz.choix': 5}
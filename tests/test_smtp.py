@@ -0,0 +1,176 @@
+"""
+Tests pour le transport SMTP à connexions réutilisées (helpers/smtp.py)
+
+Les envois passent par un vrai serveur SMTP local (aiosmtpd, fixture smtp_server).
+"""
+import smtplib
+import socket
+
+import pytest
+from unittest.mock import patch
+from flask import Flask
+from flask_mail import Message
+
+pytest.importorskip('aiosmtpd')
+
+from helpers.mail_outbox import build_message
+from helpers.smtp import PooledMail, SMTPPool, SMTPPoolTimeout, smtp_pool_status
+
+
+def make_pool(port, **kwargs):
+    return SMTPPool('127.0.0.1', port, use_tls=False, **kwargs)
+
+
+def make_mail_app(port, **config):
+    app = Flask(__name__)
+    app.config.update(MAIL_SERVER='127.0.0.1', MAIL_PORT=port, MAIL_USE_TLS=False,
+                      MAIL_DEFAULT_SENDER='noreply@lawandcode.fr', **config)
+    return app, PooledMail(app)
+
+
+class TestSMTPPool:
+    """Tests du pool de connexions"""
+
+    def test_connection_reused_between_messages(self, smtp_server):
+        """Test une seule ouverture de connexion pour plusieurs envois"""
+        handler, port = smtp_server
+        pool = make_pool(port)
+
+        for recipient in ('a@example.com', 'b@example.com', 'c@example.com'):
+            pool.send(build_message('noreply@lawandcode.fr', recipient, 'Sujet', body='texte'))
+
+        assert len(handler.messages) == 3
+        assert handler.connections == 1
+        assert pool.stats()['opened'] == 1
+        assert pool.stats()['reused'] == 2
+        pool.close()
+
+    def test_refused_recipient_keeps_connection(self, smtp_server):
+        """Test qu'un refus du serveur ne fait pas jeter la connexion"""
+        handler, port = smtp_server
+        pool = make_pool(port)
+
+        with pytest.raises(smtplib.SMTPRecipientsRefused):
+            pool.send(build_message('noreply@lawandcode.fr', 'inconnu@example.com', 'Sujet', body='texte'))
+        pool.send(build_message('noreply@lawandcode.fr', 'a@example.com', 'Sujet', body='texte'))
+
+        assert handler.connections == 1
+        assert pool.stats()['idle'] == 1
+        pool.close()
+
+    def test_refused_recipient_not_retried(self, smtp_server):
+        """Test qu'un refus 5xx donne un seul essai d'envoi, sans reconnexion"""
+        handler, port = smtp_server
+        pool = make_pool(port)
+        send_message = smtplib.SMTP.send_message
+
+        with patch.object(smtplib.SMTP, 'send_message', autospec=True, side_effect=send_message) as mock_send:
+            with pytest.raises(smtplib.SMTPRecipientsRefused):
+                pool.send(build_message('noreply@lawandcode.fr', 'inconnu@example.com', 'Sujet', body='texte'))
+
+        assert mock_send.call_count == 1
+        assert pool.stats()['reconnects'] == 0
+        pool.close()
+
+    def test_timeout_not_retried(self, smtp_server):
+        """Test délai dépassé : pas de nouvel essai (le message a peut-être été reçu)"""
+        handler, port = smtp_server
+        pool = make_pool(port)
+
+        with patch.object(smtplib.SMTP, 'send_message', autospec=True, side_effect=TimeoutError) as mock_send:
+            with pytest.raises(TimeoutError):
+                pool.send(build_message('noreply@lawandcode.fr', 'a@example.com', 'Sujet', body='texte'))
+
+        assert mock_send.call_count == 1
+        assert pool.stats()['reconnects'] == 0
+        assert pool.stats()['idle'] == 0  # connexion dans un état inconnu : jetée
+        pool.close()
+
+    def test_idle_connection_checked_before_reuse(self, smtp_server):
+        """Test NOOP après inactivité : une connexion fermée par le serveur est remplacée"""
+        handler, port = smtp_server
+        pool = make_pool(port, idle_check=0)
+        pool.send(build_message('noreply@lawandcode.fr', 'a@example.com', 'Sujet', body='texte'))
+
+        pool._idle[-1][0].sock.shutdown(socket.SHUT_RDWR)  # connexion coupée sans QUIT
+        pool.send(build_message('noreply@lawandcode.fr', 'b@example.com', 'Sujet', body='texte'))
+
+        assert len(handler.messages) == 2
+        assert handler.connections == 2
+        assert pool.stats()['reconnects'] == 1
+        pool.close()
+
+    def test_checkout_timeout(self, smtp_server):
+        """Test attente bornée quand toutes les connexions sont empruntées"""
+        handler, port = smtp_server
+        pool = make_pool(port, size=1, checkout_timeout=0.05)
+        smtp = pool.acquire()
+
+        with pytest.raises(SMTPPoolTimeout):
+            pool.acquire()
+
+        pool.release(smtp)
+        assert pool.stats()['timeouts'] == 1
+        assert pool.stats()['in_use'] == 0
+        pool.close()
+
+
+class TestPooledMail:
+    """Tests de Flask-Mail sur le pool"""
+
+    def test_mail_send_reuses_connection(self, smtp_server):
+        """Test que mail.send() ne rouvre pas de connexion à chaque email"""
+        handler, port = smtp_server
+        app, mail = make_mail_app(port)
+
+        with app.app_context():
+            mail.send(Message(subject='Sujet', recipients=['a@example.com'], body='texte'))
+            mail.send(Message(subject='Sujet', recipients=['b@example.com'], body='texte'))
+            stats = smtp_pool_status()
+
+        assert [rcpt for rcpt, _ in handler.messages] == [['a@example.com'], ['b@example.com']]
+        assert handler.connections == 1
+        assert stats['opened'] == 1 and stats['idle'] == 1
+        app.extensions['mail'].pool.close()
+
+    def test_mail_send_reconnects_once(self, smtp_server):
+        """Test nouvel essai sur une nouvelle connexion si celle du pool a été coupée"""
+        handler, port = smtp_server
+        app, mail = make_mail_app(port)
+        pool = app.extensions['mail'].pool
+
+        with app.app_context():
+            mail.send(Message(subject='Sujet', recipients=['a@example.com'], body='texte'))
+            pool._idle[-1][0].sock.shutdown(socket.SHUT_RDWR)
+            mail.send(Message(subject='Sujet', recipients=['b@example.com'], body='texte'))
+
+        assert len(handler.messages) == 2
+        assert handler.connections == 2
+        assert pool.stats()['in_use'] == 0
+        pool.close()
+
+    def test_mail_send_refused_recipient_not_retried(self, smtp_server):
+        """Test refus du destinataire par Flask-Mail : un seul essai, connexion gardée"""
+        handler, port = smtp_server
+        app, mail = make_mail_app(port)
+        pool = app.extensions['mail'].pool
+
+        with app.app_context():
+            with pytest.raises(smtplib.SMTPRecipientsRefused):
+                mail.send(Message(subject='Sujet', recipients=['inconnu@example.com'], body='texte'))
+
+        assert handler.connections == 1
+        assert pool.stats()['reconnects'] == 0
+        assert pool.stats()['idle'] == 1
+        pool.close()
+
+    def test_suppressed_send_opens_no_connection(self, smtp_server):
+        """Test MAIL_SUPPRESS_SEND (mode test de Flask-Mail) : aucune connexion"""
+        handler, port = smtp_server
+        app, mail = make_mail_app(port, MAIL_SUPPRESS_SEND=True)
+
+        with app.app_context(), mail.record_messages() as outbox:
+            mail.send(Message(subject='Sujet', recipients=['a@example.com'], body='texte'))
+
+        assert len(outbox) == 1
+        assert handler.connections == 0
@@ -0,0 +1,166 @@
+"""
+Tests pour l'écriture différée des résultats de quiz (helpers/stats_queue.py)
+"""
+import threading
+import time
+import pytest
+from unittest.mock import patch, MagicMock
+
+from helpers.stats_queue import StatsWriteBehind, write_stats_batch
+
+
+class RecordingWriter:
+    """Enregistre les lots écrits ; peut échouer sur certaines lignes"""
+
+    def __init__(self, failing_rows=()):
+        self.batches = []
+        self.failing_rows = set(failing_rows)
+        self.written = threading.Event()
+
+    def __call__(self, rows):
+        if any(row in self.failing_rows for row in rows):
+            raise Exception("foreign key violation")
+        self.batches.append(list(rows))
+        self.written.set()
+
+
+def row(user_id, quiz_id=1):
+    return (user_id, quiz_id, 'Droit Civil', 10, 8)
+
+
+class TestStatsWriteBehind:
+    """Tests de la file d'écriture différée"""
+
+    def test_flush_when_batch_is_full(self):
+        """Test écriture d'un lot dès que la taille maximale est atteinte"""
+        writer = RecordingWriter()
+        queue = StatsWriteBehind(writer, batch_size=3, flush_interval=60)
+
+        for user_id in range(3):
+            assert queue.submit(row(user_id))
+
+        assert writer.written.wait(2)
+        assert writer.batches == [[row(0), row(1), row(2)]]
+        queue.stop()
+
+    def test_flush_after_interval(self):
+        """Test écriture d'un lot incomplet après le délai maximal"""
+        writer = RecordingWriter()
+        queue = StatsWriteBehind(writer, batch_size=100, flush_interval=0.05)
+
+        queue.submit(row(1))
+
+        assert writer.written.wait(2)
+        assert writer.batches == [[row(1)]]
+        queue.stop()
+
+    def test_stop_drains_pending_results(self):
+        """Test que l'arrêt du worker écrit tout ce qui est en attente"""
+        writer = RecordingWriter()
+        queue = StatsWriteBehind(writer, batch_size=2, flush_interval=60)
+
+        for user_id in range(5):
+            queue.submit(row(user_id))
+        queue.stop()
+
+        assert sum(len(batch) for batch in writer.batches) == 5
+        assert queue.stats()['pending'] == 0
+        assert queue.stats()['written'] == 5
+
+    def test_full_queue_rejects(self):
+        """Test refus quand la file est pleine : la route écrit alors elle-même"""
+        blocked = threading.Event()
+        queue = StatsWriteBehind(lambda rows: blocked.wait(2), batch_size=1, flush_interval=60, max_pending=1)
+
+        assert queue.submit(row(1))
+        time.sleep(0.05)  # le premier résultat est en cours d'écriture
+        assert queue.submit(row(2))
+        assert not queue.submit(row(3))
+        assert queue.stats()['rejected'] == 1
+
+        blocked.set()
+        queue.stop()
+
+    def test_rejects_after_stop(self):
+        """Test qu'une file arrêtée n'accepte plus de résultat"""
+        queue = StatsWriteBehind(RecordingWriter())
+        queue.stop()
+
+        assert not queue.submit(row(1))
+
+    def test_failed_batch_retried_row_by_row(self):
+        """Test qu'une ligne invalide est écartée sans perdre le reste du lot"""
+        writer = RecordingWriter(failing_rows=[row(2)])
+        queue = StatsWriteBehind(writer, batch_size=3, flush_interval=60)
+
+        for user_id in range(1, 4):
+            queue.submit(row(user_id))
+        queue.stop()
+
+        assert writer.batches == [[row(1)], [row(3)]]
+        assert queue.stats()['dropped'] == 1
+        assert queue.stats()['written'] == 2
+
+
+class TestWriteStatsBatch:
+    """Tests de l'upsert multi-lignes"""
+
+    @patch('helpers.stats_queue.execute_values')
+    @patch('helpers.core.get_connection')
+    def test_single_statement_per_batch(self, mock_get_conn, mock_execute_values):
+        """Test qu'un lot est écrit en une requête et une transaction"""
+        mock_conn = MagicMock()
+        mock_get_conn.return_value = mock_conn
+        rows = [row(1), row(2)]
+
+        write_stats_batch(rows)
+
+        mock_execute_values.assert_called_once()
+        query = mock_execute_values.call_args[0][1]
+        assert 'ON CONFLICT (user_id, quiz_id) DO NOTHING' in query
+        assert 'GROUP BY user_id, matiere' in query
+        assert mock_execute_values.call_args[0][2] == rows
+        mock_conn.commit.assert_called_once()
+
+
+class TestUpdateStatsWriteBehind:
+    """Tests de la route /quiz/update_stats en écriture différée"""
+
+    def test_result_queued(self, client):
+        """Test que le résultat est mis en file sans écriture synchrone"""
+        with client.session_transaction() as sess:
+            sess['user_id'] = 1
+            sess['username'] = 'testuser'
+
+        queue = MagicMock()
+        queue.submit.return_value = True
+        with patch('quiz.routes.stats_write_behind', queue), patch('quiz.routes.db_request') as mock_db:
+            response = client.post('/quiz/update_stats', data={
+                'matiere': 'Droit Civil',
+                'posées': '10',
+                'trouvées': '8',
+                'quiz_id': '123'
+            })
+
+        assert response.status_code == 204
+        queue.submit.assert_called_once_with((1, '123', 'Droit Civil', 10, 8))
+        mock_db.assert_not_called()
+
+    def test_full_queue_falls_back_to_direct_write(self, client):
+        """Test écriture synchrone quand la file refuse le résultat"""
+        with client.session_transaction() as sess:
+            sess['user_id'] = 1
+            sess['username'] = 'testuser'
+
+        queue = MagicMock()
+        queue.submit.return_value = False
+        with patch('quiz.routes.stats_write_behind', queue), patch('quiz.routes.db_request') as mock_db:
+            response = client.post('/quiz/update_stats', data={
+                'matiere': 'Droit Civil',
+                'posées': '10',
+                'trouvées': '8',
+                'quiz_id': '123'
+            })
+
+        assert response.status_code == 204
+        mock_db.assert_called_once()